@@ -0,0 +1,261 @@
+"""All-pairs shortest path result of a graph."""
+import numpy as np
+from typing import Any, Optional, Union, Collection
+from engines import walk_path
+from graph import LinkedGraph
+from labelindex import LabelIndex
+from sparse import dijkstra_adjacency, dijkstra_rows
+
+
+class AllPairs:
+    """Represent the shortest path weights between all the vertices of a
+    graph and the successor matrix to restore the paths from.
+    """
+
+    def __init__(self, matrix: np.array, next_hop: np.array,
+                 labels: LabelIndex):
+        """Create the result.
+
+        :param matrix: 2D matrix of shortest path weights
+        :param next_hop: successor matrix filled by the engine
+        :param labels: label index of the rows
+        """
+        self._matrix = matrix
+        self._next_hop = next_hop
+        self._labels = labels
+
+    def get_matrix(self) -> np.array:
+        """Return the matrix of shortest path weights."""
+        return self._matrix
+
+    def get_next_hop(self) -> np.array:
+        """Return the successor matrix."""
+        return self._next_hop
+
+    def get_label_index(self) -> LabelIndex:
+        """Return the label index of the rows."""
+        return self._labels
+
+    def get_row(self, label: Any) -> int:
+        """Return the matrix row of the vertex with label.
+
+        :raise AttributeError: if there is no vertex with label.
+        """
+        return self._labels.get_row(label)
+
+    def distance(self, from_label: Any, to_label: Any) -> float:
+        """Return the shortest path weight between the vertices.
+
+        :raise AttributeError: if the vertices are not in the graph.
+        """
+        return self._matrix[self.get_row(from_label), self.get_row(to_label)]
+
+    def distances(self, from_labels: Collection,
+                  to_labels: Collection) -> np.array:
+        """Return the shortest path weights between the pairs of vertices,
+        the i-th weight being the one from from_labels[i] to to_labels[i].
+
+        :raise AttributeError: if a vertex is not in the graph.
+        """
+        return self._matrix[self._labels.rows_of(from_labels),
+                            self._labels.rows_of(to_labels)]
+
+    def path(self, from_label: Any, to_label: Any) -> Optional[list]:
+        """Return the labels on the shortest path between the vertices.
+
+        Walks the successor matrix in O(path length).
+        Return None if there is no path.
+        :raise AttributeError: if the vertices are not in the graph.
+        """
+        rows = walk_path(self._next_hop, self.get_row(from_label),
+                         self.get_row(to_label))
+        if not rows:
+            return None
+        return self._labels.labels_of(rows).tolist()
+
+
+class DynamicAllPairs(AllPairs):
+    """Represent the all-pairs result kept up to date with its graph.
+
+    The edges are changed through this object. An edge insertion or a weight
+    decrease is applied in O(V²) by relaxing every pair through the edge.
+    An edge removal or a weight increase marks the rows whose shortest paths
+    may use the edge as stale, they are recomputed with Dijkstra only when
+    they are read. The vertices of the graph must not change.
+    """
+
+    def __init__(self, graph: LinkedGraph, matrix: np.array,
+                 next_hop: np.array, labels: LabelIndex, round_pos: int):
+        """Create the result.
+
+        :param graph: the graph the result is computed for
+        :param matrix: 2D matrix of shortest path weights
+        :param next_hop: successor matrix filled by the engine
+        :param labels: label index of the rows
+        :param round_pos: number of positions to round every sum to
+        """
+        super().__init__(matrix, next_hop, labels)
+        self._graph = graph
+        self._round_pos = round_pos
+        self._stale = set()
+        # adjacency and potentials for Dijkstra, None if the graph changed
+        self._adjacency = None
+
+    # Methods for changing the edges
+
+    def add_edge(self, from_label: Any, to_label: Any,
+                 weight: Union[int, float]):
+        """Add the edge to the graph and update the weights.
+
+        :raise AttributeError: if the vertices are not in the graph or they
+        are already connected.
+        :raise ValueError: if the edge makes a negative cycle.
+        """
+        if self._graph.contains_edge(from_label, to_label):
+            raise AttributeError(f"An edge already connects "
+                                 f"{from_label} and {to_label}")
+        self._check_cycle(from_label, to_label, weight)
+        self._graph.add_edge(from_label, to_label, weight)
+        self._adjacency = None
+        self._relax_edge(from_label, to_label, weight)
+
+    def set_weight(self, from_label: Any, to_label: Any,
+                   weight: Union[int, float]):
+        """Set the weight of the edge and update the weights.
+
+        :raise AttributeError: if the vertices are not in the graph or they
+        are not connected.
+        :raise ValueError: if the edge makes a negative cycle.
+        """
+        edge = self._graph.get_edge(from_label, to_label)
+        if edge is None:
+            raise AttributeError(f"No edge connects "
+                                 f"{from_label} and {to_label}")
+        old_weight = edge.get_weight()
+        if weight <= old_weight:
+            self._check_cycle(from_label, to_label, weight)
+            edge.set_weight(weight)
+            self._adjacency = None
+            self._relax_edge(from_label, to_label, weight)
+        else:
+            self._invalidate_edge(from_label, to_label, old_weight)
+            edge.set_weight(weight)
+            self._adjacency = None
+
+    def remove_edge(self, from_label: Any, to_label: Any) -> bool:
+        """Return True if the edge was removed, False otherwise.
+
+        :raise AttributeError: if the vertices are not in the graph.
+        """
+        edge = self._graph.get_edge(from_label, to_label)
+        if edge is None:
+            return False
+        self._invalidate_edge(from_label, to_label, edge.get_weight())
+        self._graph.remove_edge(from_label, to_label)
+        self._adjacency = None
+        return True
+
+    def _directions(self, from_label: Any, to_label: Any) -> list:
+        """Return the (tail row, head row) pairs the edge can be walked in."""
+        tail, head = self.get_row(from_label), self.get_row(to_label)
+        if self._graph.is_directed():
+            return [(tail, head)]
+        return [(tail, head), (head, tail)]
+
+    def _check_cycle(self, from_label: Any, to_label: Any,
+                     weight: Union[int, float]):
+        """Raise ValueError if an edge with weight would make a negative
+        cycle (any negative undirected edge does)."""
+        self._refresh()
+        for tail, head in self._directions(from_label, to_label):
+            if (round(self._matrix[head, tail] + weight, self._round_pos) < 0
+                    or (weight < 0 and tail != head and
+                        not self._graph.is_directed())):
+                raise ValueError("The edge makes a negative cycle.")
+
+    def _relax_edge(self, from_label: Any, to_label: Any,
+                    weight: Union[int, float]):
+        """Relax every pair through the new or cheaper edge in O(V²)."""
+        self._refresh()
+        for tail, head in self._directions(from_label, to_label):
+            to_tail = np.round(self._matrix[:, tail] + weight,
+                               self._round_pos)
+            new_sums = np.round(to_tail[:, np.newaxis] +
+                                self._matrix[np.newaxis, head],
+                                self._round_pos)
+            improved = new_sums < self._matrix
+            via_hops = self._next_hop[:, tail].copy()
+            via_hops[tail] = head
+            np.copyto(self._matrix, new_sums, where=improved)
+            np.copyto(self._next_hop, via_hops[:, np.newaxis],
+                      where=improved)
+
+    def _invalidate_edge(self, from_label: Any, to_label: Any,
+                         weight: Union[int, float]):
+        """Mark the rows whose shortest paths may use the edge as stale.
+
+        A shortest path from row i can only use the edge if it is tight for
+        i, that is the weight to its head is the weight to its tail plus the
+        edge weight.
+        """
+        for tail, head in self._directions(from_label, to_label):
+            through = np.round(self._matrix[:, tail] + weight,
+                               self._round_pos)
+            tight = (through == self._matrix[:, head]) & \
+                (through != np.inf)
+            self._stale.update(np.nonzero(tight)[0].tolist())
+
+    def _refresh(self, rows: Collection = None):
+        """Recompute the stale rows (of the given ones, all by default)."""
+        rows = self._stale if rows is None else self._stale & set(rows)
+        if not rows:
+            return
+        if self._adjacency is None:
+            self._adjacency = dijkstra_adjacency(self._graph,
+                                                 self._round_pos)[:2]
+        rows = sorted(rows)
+        hops = np.empty((len(rows), len(self._matrix)),
+                        dtype=self._next_hop.dtype)
+        self._matrix[rows] = dijkstra_rows(*self._adjacency, rows,
+                                           self._round_pos, hops)
+        self._next_hop[rows] = hops
+        self._stale.difference_update(rows)
+
+    # Queries, recomputing the stale rows they depend on
+
+    def get_matrix(self) -> np.array:
+        """Return the matrix of shortest path weights."""
+        self._refresh()
+        return super().get_matrix()
+
+    def get_next_hop(self) -> np.array:
+        """Return the successor matrix."""
+        self._refresh()
+        return super().get_next_hop()
+
+    def distance(self, from_label: Any, to_label: Any) -> float:
+        """Return the shortest path weight between the vertices.
+
+        :raise AttributeError: if the vertices are not in the graph.
+        """
+        self._refresh([self.get_row(from_label)])
+        return super().distance(from_label, to_label)
+
+    def distances(self, from_labels: Collection,
+                  to_labels: Collection) -> np.array:
+        """Return the shortest path weights between the pairs of vertices,
+        the i-th weight being the one from from_labels[i] to to_labels[i].
+
+        :raise AttributeError: if a vertex is not in the graph.
+        """
+        self._refresh(self._labels.rows_of(from_labels).tolist())
+        return super().distances(from_labels, to_labels)
+
+    def path(self, from_label: Any, to_label: Any) -> Optional[list]:
+        """Return the labels on the shortest path between the vertices.
+
+        Return None if there is no path.
+        :raise AttributeError: if the vertices are not in the graph.
+        """
+        self._refresh()
+        return super().path(from_label, to_label)
@@ -0,0 +1,925 @@
+"""Benchmark the shortest path engines.
+
+Run with: python benchmark.py <benchmark name> [<benchmark name> ...]
+"""
+import asyncio
+import contextlib
+import json
+import os
+import random as rd
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from math import inf
+from typing import Callable, Any
+from engines import (floyd_reference, floyd_vectorized, floyd_blocked,
+                     floyd_parallel, floyd_out_of_core, out_of_core_tile,
+                     band_rows, init_next_hop, DTYPES, cast_matrix,
+                     NegativeCycleError, stack_matrices, batch_chunk,
+                     floyd_batched)
+from floyd import (MAX_WEIGHT, MIN_WEIGHT, ROUND_POS, NODE_SPACE, BAD_COL,
+                   GOOD_COL, NEUT_COL, DISPLAY_VERTICES, graph_matrix,
+                   all_pairs, batch, initialize_graph, print_matrix,
+                   random_weight_matrix, random_edges, shortest_paths_from,
+                   shortest_path, floyd, all_pairs_batch)
+from graphio import create_matrix, load_graph, save_matrix
+from graph import LinkedGraph, LinkedDirectedGraph, LinkedDirectedEdge
+from sparse import all_pairs_sparse
+from compactgraph import CompactGraph
+from cache import ResultCache, fingerprint
+from closure import pack_adjacency, warshall_closure, condensed_closure
+from components import ComponentAllPairs
+from labelindex import LabelIndex
+from loadtest import load_test
+
+# probability of an edge in the generated graphs
+CONNECTIVITY = 0.3
+# runs of the compared timings, the fastest of which is kept
+TIMING_RUNS = 3
+# share of a timing which may be noise between two runs of the same work
+TIMING_NOISE = 0.1
+
+
+def random_matrix(vert_n: int, connectivity: float = CONNECTIVITY,
+                  seed: int = 0) -> np.array:
+    """Generate a random weight matrix with the USER_RANDOM generator.
+
+    :param vert_n: number of vertices
+    :param connectivity: probability of an edge connecting two vertices
+    :param seed: seed of the random generator
+    :return: 2D weight matrix with zeros on the diagonal
+    """
+    matrix = random_weight_matrix(vert_n, connectivity * 100, seed=seed)
+    np.fill_diagonal(matrix, 0)
+    return matrix
+
+
+def time_call(func: Callable, *args) -> float:
+    """Return the wall time of func(*args) in seconds."""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def bench_vectorized():
+    """Compare the vectorized engine to the reference loop."""
+    print(f"{'V':>6} {'reference, s':>14} {'vectorized, s':>14} "
+          f"{'speedup':>9}")
+    for vert_n in (25, 50, 100):
+        matrix = random_matrix(vert_n)
+        expected = matrix.copy()
+        reference = time_call(floyd_reference, expected, ROUND_POS)
+        result = matrix.copy()
+        vectorized = time_call(floyd_vectorized, result, ROUND_POS)
+        assert np.array_equal(result, expected), "results differ"
+        print(f"{vert_n:>6} {reference:>14.4f} {vectorized:>14.4f} "
+              f"{reference / vectorized:>9.1f}")
+
+    # the reference loop is too slow to run at these sizes
+    for vert_n in (500, 1000, 2000):
+        vectorized = time_call(floyd_vectorized, random_matrix(vert_n),
+                               ROUND_POS)
+        print(f"{vert_n:>6} {'-':>14} {vectorized:>14.4f} {'-':>9}")
+
+
+def dense_graph(vert_n: int) -> LinkedDirectedGraph:
+    """Build a complete directed graph with vert_n vertices."""
+    graph = LinkedDirectedGraph()
+    for label in range(vert_n):
+        graph.add_vertex(label)
+    for vertex in graph.vertices():
+        for other in graph.vertices():
+            if vertex is not other:
+                vertex.add_edge_to(other, 1.0)
+                graph._edge_count += 1
+    return graph
+
+
+def scan_matrix(graph: LinkedDirectedGraph):
+    """Build the Floyd matrix finding edges by a linear scan as before."""
+    vertices = list(graph.vertices())
+    for vertex in vertices:
+        edge_list = list(vertex.incident_edges())
+        for other in vertices:
+            probe = LinkedDirectedEdge(vertex, other)
+            try:
+                edge_list.index(probe)
+            except ValueError:
+                pass
+
+
+def bench_edge_index():
+    """Compare building the matrix with edge index and linear scan lookups."""
+    print(f"{'V':>6} {'scan, s':>10} {'scan/V^3, ns':>13} {'index, s':>10} "
+          f"{'index/V^2, ns':>14}")
+    for vert_n in (100, 200, 400):
+        graph = dense_graph(vert_n)
+        scan = time_call(scan_matrix, graph)
+        index = time_call(graph_matrix, graph)
+        print(f"{vert_n:>6} {scan:>10.3f} {scan / vert_n ** 3 * 1e9:>13.2f} "
+              f"{index:>10.3f} {index / vert_n ** 2 * 1e9:>14.1f}")
+
+
+def bench_blocked():
+    """Compare the blocked engine to the untiled vectorized one."""
+    print(f"{'V':>6} {'rows':>5} {'vectorized, s':>14} {'blocked, s':>11} "
+          f"{'speedup':>9}")
+    for vert_n in (1000, 4000, 8000):
+        matrix = random_matrix(vert_n)
+        expected = matrix.copy()
+        vectorized = time_call(floyd_vectorized, expected, ROUND_POS)
+        blocked = time_call(floyd_blocked, matrix, ROUND_POS)
+        assert np.array_equal(matrix, expected), "results differ"
+        print(f"{vert_n:>6} {band_rows(vert_n):>5} {vectorized:>14.2f} "
+              f"{blocked:>11.2f} {vectorized / blocked:>9.2f}")
+
+
+def bench_parallel():
+    """Measure the scaling of the parallel engine with the worker count."""
+    vert_n = 2000
+    matrix = random_matrix(vert_n)
+    expected = floyd_vectorized(matrix.copy(), ROUND_POS)
+    print(f"V: {vert_n}, CPUs: {os.cpu_count()}")
+    print(f"{'workers':>8} {'time, s':>9} {'speedup':>9}")
+    single = None
+    for workers in (1, 2, 4, 8, 16):
+        result = matrix.copy()
+        parallel = time_call(floyd_parallel, result, ROUND_POS, None,
+                             workers)
+        assert np.array_equal(result, expected), "results differ"
+        single = single or parallel
+        print(f"{workers:>8} {parallel:>9.2f} {single / parallel:>9.2f}")
+
+
+def matrix_graph(matrix: np.array) -> LinkedDirectedGraph:
+    """Build a directed graph out of the weight matrix."""
+    graph = LinkedDirectedGraph()
+    for label in range(len(matrix)):
+        graph.add_vertex(label)
+    for i, ii in zip(*np.nonzero(matrix != inf)):
+        if i != ii:
+            graph.add_edge(i, ii, matrix[i, ii])
+    return graph
+
+
+def bench_sparse():
+    """Find where repeated Dijkstra and the dense engine cross over."""
+    print(f"{'V':>6} {'E/V^2':>8} {'dense, s':>9} {'sparse, s':>10} "
+          f"{'speedup':>9}")
+    for vert_n in (500, 1000, 2000):
+        for connectivity in (0.001, 0.003, 0.01, 0.03):
+            graph = matrix_graph(random_matrix(vert_n, connectivity))
+            matrix = graph_matrix(graph)[0]
+            dense = time_call(floyd_vectorized, matrix, ROUND_POS)
+            start = time.perf_counter()
+            result = all_pairs_sparse(graph, ROUND_POS)[0]
+            sparse = time.perf_counter() - start
+            assert np.array_equal(result, matrix), "results differ"
+            print(f"{vert_n:>6} {graph.size_edges() / vert_n ** 2:>8.4f} "
+                  f"{dense:>9.2f} {sparse:>10.2f} {dense / sparse:>9.2f}")
+
+
+def bench_next_hop():
+    """Measure the cost of filling the successor matrix."""
+    print(f"{'V':>6} {'matrix, MB':>11} {'next_hop, MB':>13} "
+          f"{'plain, s':>9} {'next_hop, s':>12} {'slowdown':>9}")
+    for vert_n in (250, 500, 1000):
+        matrix = random_matrix(vert_n)
+        plain = time_call(floyd_vectorized, matrix.copy(), ROUND_POS)
+        next_hop = init_next_hop(matrix)
+        hops = time_call(floyd_vectorized, matrix, ROUND_POS, next_hop)
+        print(f"{vert_n:>6} {matrix.nbytes / 2 ** 20:>11.2f} "
+              f"{next_hop.nbytes / 2 ** 20:>13.2f} {plain:>9.2f} "
+              f"{hops:>12.2f} {hops / plain:>9.2f}")
+
+
+def bench_dynamic():
+    """Apply a stream of edge updates incrementally and by full reruns."""
+    vert_n, updates = 300, 10000
+    graph = matrix_graph(random_matrix(vert_n, 0.02))
+    result = all_pairs(graph, "vectorized", dynamic=True)
+    rerun = time_call(all_pairs, graph, "vectorized")
+    rd.seed(0)
+    start = time.perf_counter()
+    for update in range(updates):
+        from_label, to_label = rd.randrange(vert_n), rd.randrange(vert_n)
+        weight = round(rd.uniform(MIN_WEIGHT, MAX_WEIGHT), ROUND_POS)
+        if not graph.contains_edge(from_label, to_label):
+            result.add_edge(from_label, to_label, weight)
+        elif rd.random() < 0.3:
+            result.remove_edge(from_label, to_label)
+        else:
+            result.set_weight(from_label, to_label, weight)
+        # read a row now and then, as queries between the updates would
+        if update % 10 == 0:
+            result.distance(rd.randrange(vert_n), 0)
+    result.get_matrix()
+    dynamic = time.perf_counter() - start
+
+    expected = all_pairs(graph, "vectorized").get_matrix()
+    assert np.array_equal(result.get_matrix(), expected), "results differ"
+    print(f"V: {vert_n}, updates: {updates}, edges at the end: "
+          f"{graph.size_edges()}")
+    print(f"incremental: {dynamic:.2f} s, full reruns (estimated): "
+          f"{rerun * updates:.2f} s, speedup: "
+          f"{rerun * updates / dynamic:.1f}")
+
+
+def traced_call(func: Callable, *args) -> (Any, int):
+    """Return the result of func(*args) and the bytes it left allocated."""
+    tracemalloc.start()
+    result = func(*args)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, allocated
+
+
+def sum_weights(graph: LinkedGraph) -> float:
+    """Iterate over all the edges of the graph summing their weights."""
+    return sum(edge.get_weight() for edge in graph.edges())
+
+
+def bench_compact():
+    """Compare the memory and iteration speed of linked and compact graphs."""
+    vert_n = 2000
+    matrix = random_matrix(vert_n, 0.25)
+    linked, linked_bytes = traced_call(matrix_graph, matrix)
+    compact, compact_bytes = traced_call(CompactGraph.from_linked, linked)
+    edge_n = linked.size_edges()
+    print(f"V: {vert_n}, E: {edge_n}")
+    print(f"{'graph':>8} {'bytes/edge':>11} {'edges(), s':>11}")
+    for name, graph, allocated in (("linked", linked, linked_bytes),
+                                   ("compact", compact, compact_bytes)):
+        print(f"{name:>8} {allocated / edge_n:>11.1f} "
+              f"{time_call(sum_weights, graph):>11.2f}")
+    print(f"compact csr() weight sum, s: "
+          f"{time_call(lambda: compact.csr()[2].sum()):.4f}")
+
+
+def linked_graph(vert_n: int, edges: list) -> LinkedDirectedGraph:
+    """Build a directed graph with vert_n vertices and the (from, to,
+    weight) edges."""
+    graph = LinkedDirectedGraph()
+    for label in range(vert_n):
+        graph.add_vertex(label)
+    for from_label, to_label, weight in edges:
+        graph.add_edge(from_label, to_label, weight)
+    return graph
+
+
+def bench_memory():
+    """Measure the bytes per vertex and per edge of a 1M-edge linked graph."""
+    vert_n = 2000
+    matrix = random_matrix(vert_n, 0.25)
+    np.fill_diagonal(matrix, inf)
+    rows, columns = np.nonzero(matrix != inf)
+    edges = list(zip(rows.tolist(), columns.tolist(),
+                     matrix[rows, columns].tolist()))
+    vertices_bytes = traced_call(linked_graph, vert_n, [])[1]
+    graph, graph_bytes = traced_call(linked_graph, vert_n, edges)
+    # the weights are the same float objects in both, not counted
+    print(f"V: {vert_n}, E: {graph.size_edges()}")
+    print(f"bytes/vertex: {vertices_bytes / vert_n:.1f}, bytes/edge: "
+          f"{(graph_bytes - vertices_bytes) / len(edges):.1f}")
+
+
+def bench_batch():
+    """Measure the end-to-end wall time of the batch mode (read, run, write)
+    for dense weight matrices and sparse edge lists."""
+    print(f"{'V':>6} {'input':>12} {'E':>9} {'batch, s':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for vert_n in (1000, 5000):
+            dense_path = os.path.join(directory, f"{vert_n}.npy")
+            matrix = random_matrix(vert_n)
+            np.fill_diagonal(matrix, inf)
+            np.save(dense_path, matrix)
+            dense_n = np.count_nonzero(matrix != inf)
+
+            edges_path = os.path.join(directory, f"{vert_n}.txt")
+            matrix = random_matrix(vert_n, 0.002)
+            np.fill_diagonal(matrix, inf)
+            rows, columns = np.nonzero(matrix != inf)
+            np.savetxt(edges_path, np.column_stack(
+                (rows, columns, matrix[rows, columns])), fmt="%.15g")
+
+            output_path = os.path.join(directory, "out.npy")
+            for name, path, edge_n, edge_list in (
+                    ("matrix .npy", dense_path, dense_n, False),
+                    ("edge list", edges_path, len(rows), True)):
+                wall = time_call(batch, path, output_path, "auto", 1,
+                                 edge_list, True)
+                print(f"{vert_n:>6} {name:>12} {edge_n:>9} {wall:>9.2f}")
+
+
+def proc_counter(path: str, name: str) -> int:
+    """Return the counter of this process from a /proc/self file (the
+    kB values of the status file in bytes), 0 if it is unavailable."""
+    try:
+        with open(path) as file:
+            for line in file:
+                if line.startswith(name + ":"):
+                    value = line.split()[1:]
+                    return int(value[0]) * (1024 if value[1:] == ["kB"]
+                                            else 1)
+    except OSError:
+        pass
+    return 0
+
+
+def bench_out_of_core():
+    """Measure the peak RSS and the disk throughput of the out-of-core engine
+    on a memory-mapped matrix about twice its memory budget."""
+    budget = 16 * 1024 * 1024
+    vert_n = int((2 * budget / 8) ** 0.5)
+    with tempfile.TemporaryDirectory() as directory:
+        matrix = create_matrix(os.path.join(directory, "matrix.npy"), vert_n)
+        matrix[:] = random_matrix(vert_n)
+        matrix.flush()
+        del matrix
+        matrix = np.load(os.path.join(directory, "matrix.npy"),
+                         mmap_mode="r+")
+
+        # reset the peak RSS to the current one (Linux only)
+        try:
+            with open("/proc/self/clear_refs", "w") as file:
+                file.write("5")
+        except OSError:
+            pass
+        rss = proc_counter("/proc/self/status", "VmRSS")
+        read = proc_counter("/proc/self/io", "read_bytes")
+        written = proc_counter("/proc/self/io", "write_bytes")
+        wall = time_call(floyd_out_of_core, matrix, ROUND_POS, None, budget)
+        peak = proc_counter("/proc/self/status", "VmHWM") - rss
+        read = proc_counter("/proc/self/io", "read_bytes") - read
+        written = proc_counter("/proc/self/io", "write_bytes") - written
+
+    # every block K reads two tiles and writes one for each tile
+    tile = min(out_of_core_tile(budget), vert_n)
+    moved = -(-vert_n // tile) * 3 * matrix.nbytes
+    mb = 1024 * 1024
+    print(f"V: {vert_n}, matrix: {matrix.nbytes / mb:.0f} MB, budget: "
+          f"{budget / mb:.0f} MB, tile: {tile}")
+    print(f"time: {wall:.1f} s, peak RSS growth: {peak / mb:.1f} MB")
+    print(f"tile traffic: {moved / mb / wall:.1f} MB/s, disk read: "
+          f"{read / mb:.1f} MB, disk written: {written / mb:.1f} MB")
+
+
+def bench_ingest(edge_n: int = 10 ** 7):
+    """Measure the wall time and the peak RSS per edge of streaming an edge
+    list file into a linked graph."""
+    vert_n = edge_n // 10
+    connectivity = edge_n / vert_n / (vert_n - 1) * 100
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "edges.txt")
+        with open(path, "w") as file:
+            file.writelines(f"{from_label} {to_label} {weight}\n"
+                            for from_label, to_label, weight in
+                            random_edges(vert_n, connectivity, seed=0))
+
+        try:
+            with open("/proc/self/clear_refs", "w") as file:
+                file.write("5")
+        except OSError:
+            pass
+        rss = proc_counter("/proc/self/status", "VmRSS")
+        start = time.perf_counter()
+        graph = load_graph(path, True)
+        wall = time.perf_counter() - start
+        peak = proc_counter("/proc/self/status", "VmHWM") - rss
+
+    mb = 1024 * 1024
+    print(f"V: {graph.size_vertices()}, E: {graph.size_edges()}, "
+          f"dense matrix: {vert_n ** 2 * 8 / mb:.0f} MB")
+    edge_n = graph.size_edges()
+    print(f"time: {wall:.1f} s ({edge_n / wall:.0f} edges/s), peak RSS "
+          f"growth: {peak / mb:.0f} MB ({peak / edge_n:.0f} bytes/edge)")
+
+
+def loop_weight_matrix(vert_n: int, connectivity: int) -> np.array:
+    """Generate a random weight matrix cell by cell as USER_RANDOM did."""
+    matrix = np.empty((vert_n, vert_n))
+    for i in range(vert_n):
+        for j in range(vert_n):
+            if rd.randint(0, 99) < connectivity:
+                val = rd.random() * rd.randint(MIN_WEIGHT, MAX_WEIGHT-1)
+                matrix[i, j] = round(val, ROUND_POS)
+            else:
+                matrix[i, j] = inf
+    return matrix
+
+
+def bench_random():
+    """Compare the vectorized random generator to the cell by cell loop and
+    measure the edge generator of sparse graphs."""
+    print(f"{'V':>8} {'output':>10} {'loop, s':>8} {'vectorized, s':>14}")
+    for vert_n in (1000, 5000):
+        loop = time_call(loop_weight_matrix, vert_n, 30)
+        vectorized = time_call(random_weight_matrix, vert_n, 30)
+        print(f"{vert_n:>8} {'matrix':>10} {loop:>8.2f} {vectorized:>14.2f}")
+    vert_n = 10 ** 6
+    wall = time_call(lambda: sum(1 for _ in random_edges(vert_n, 0.001)))
+    print(f"{vert_n:>8} {'10M edges':>10} {'-':>8} {wall:>14.2f}")
+
+
+def loop_initialize_graph(weight_matrix: np.array, label_map: dict,
+                          directed: bool) -> LinkedGraph:
+    """Build the graph adding the edges cell by cell as before."""
+    graph = LinkedDirectedGraph() if directed else LinkedGraph()
+    vert_n = len(weight_matrix)
+    for i in range(vert_n):
+        graph.add_vertex(label_map[i])
+    for i in range(vert_n):
+        for ii in range(vert_n if directed else i):
+            if weight_matrix[i, ii] != inf:
+                try:
+                    graph.add_edge(label_map[i], label_map[ii],
+                                   weight_matrix[i, ii])
+                except AttributeError:
+                    continue
+    return graph
+
+
+def bench_initialize():
+    """Compare building the graph out of a dense weight matrix in bulk and
+    cell by cell, next to the shortest paths of the same matrix."""
+    vert_n = 3000
+    print(f"V: {vert_n}")
+    print(f"{'graph':>10} {'E':>9} {'loop, s':>8} {'bulk, s':>8} "
+          f"{'paths, s':>9}")
+    for directed in (True, False):
+        matrix = random_matrix(vert_n)
+        if not directed:
+            matrix = np.minimum(matrix, matrix.T)
+        np.fill_diagonal(matrix, inf)
+        labels = LabelIndex(range(vert_n))
+        loop = time_call(loop_initialize_graph, matrix, labels, directed)
+        start = time.perf_counter()
+        graph = initialize_graph(matrix, labels, directed)
+        bulk = time.perf_counter() - start
+        np.fill_diagonal(matrix, 0)
+        paths = time_call(floyd_vectorized, matrix, ROUND_POS)
+        name = "directed" if directed else "undirected"
+        print(f"{name:>10} {graph.size_edges():>9} {loop:>8.2f} "
+              f"{bulk:>8.2f} {paths:>9.2f}")
+
+
+def loop_color_print(*args: Any, fg: (int, int, int) = None, end: Any = "\n"):
+    """Print in color with three print calls as before."""
+    print(f"\33[38;2;{fg[0]};{fg[1]};{fg[2]}m", end="")
+    print(*args, end="")
+    print("\33[0m", end=end)
+
+
+def loop_print_matrix(matrix: np.array, label_map: dict):
+    """Print the matrix cell by cell as before."""
+    dimension = len(matrix)
+    print(" " * NODE_SPACE, end="")
+    for i in range(dimension):
+        loop_color_print(f"{label_map[i]}".ljust(NODE_SPACE, " "), end="",
+                         fg=NEUT_COL)
+    print()
+    for i in range(dimension):
+        loop_color_print(f"{label_map[i]}".ljust(NODE_SPACE, " "), end="",
+                         fg=BAD_COL)
+        for ii in range(dimension):
+            loop_color_print(f"{matrix[i, ii]}".ljust(NODE_SPACE, " "),
+                             fg=GOOD_COL, end="")
+        print()
+    print()
+
+
+def bench_output():
+    """Compare the output time of the buffered matrix printing to the cell
+    by cell one and to the file writers, by the number of vertices."""
+    print(f"{'V':>6} {'loop, s':>8} {'buffered, s':>12} {'truncated, s':>13} "
+          f"{'.npy, s':>8} {'.csv, s':>8}")
+    with tempfile.TemporaryDirectory() as directory, \
+            open(os.devnull, "w") as devnull:
+        for vert_n in (100, 300, 1000):
+            matrix = random_matrix(vert_n)
+            labels = LabelIndex(range(vert_n))
+            with contextlib.redirect_stdout(devnull):
+                loop = time_call(loop_print_matrix, matrix, labels)
+            buffered = time_call(print_matrix, matrix, labels, None,
+                                 devnull, True)
+            truncated = time_call(print_matrix, matrix, labels,
+                                  DISPLAY_VERTICES, devnull, True)
+            npy = time_call(save_matrix, os.path.join(directory, "out.npy"),
+                            matrix)
+            csv = time_call(save_matrix, os.path.join(directory, "out.csv"),
+                            matrix)
+            print(f"{vert_n:>6} {loop:>8.2f} {buffered:>12.3f} "
+                  f"{truncated:>13.4f} {npy:>8.3f} {csv:>8.2f}")
+
+
+def bench_cache():
+    """Compare cold runs to warm ones served by the result cache from
+    memory and from disk, next to the cost of the fingerprint alone."""
+    print(f"{'V':>6} {'cold, s':>8} {'memory, s':>10} {'disk, s':>8} "
+          f"{'hash, s':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for vert_n in (200, 500, 1000):
+            matrix = random_matrix(vert_n)
+            np.fill_diagonal(matrix, inf)
+            graph = matrix_graph(matrix)
+            cache = ResultCache(directory=directory)
+            cold = time_call(all_pairs, graph, "vectorized", 1, False, cache)
+            memory = time_call(all_pairs, graph, "vectorized", 1, False,
+                               cache)
+            cache = ResultCache(directory=directory)
+            disk = time_call(all_pairs, graph, "vectorized", 1, False, cache)
+            hashing = time_call(fingerprint, graph)
+            print(f"{vert_n:>6} {cold:>8.2f} {memory:>10.3f} "
+                  f"{disk:>8.3f} {hashing:>8.3f}")
+
+
+def bench_queries():
+    """Compare single-source and point-to-point queries to slicing the
+    result of a full all-pairs run, on sparse and dense graphs."""
+    vert_n = 1000
+    queries = 20
+    rd.seed(0)
+    print(f"V: {vert_n}, {queries} queries each")
+    print(f"{'graph':>18} {'all-pairs, s':>13} {'from, ms':>9} "
+          f"{'path, ms':>9}")
+    for directed in (True, False):
+        for connectivity in (0.005, 0.3):
+            matrix = random_matrix(vert_n, connectivity)
+            if not directed:
+                matrix = np.minimum(matrix, matrix.T)
+            np.fill_diagonal(matrix, inf)
+            labels = LabelIndex(range(vert_n))
+            graph = initialize_graph(matrix, labels, directed)
+            full = time_call(all_pairs, graph, "auto")
+            pairs = [(rd.randrange(vert_n), rd.randrange(vert_n))
+                     for _ in range(queries)]
+            start = time.perf_counter()
+            for source, _ in pairs:
+                shortest_paths_from(graph, source, False)
+            single = (time.perf_counter() - start) / queries
+            start = time.perf_counter()
+            for source, destination in pairs:
+                shortest_path(graph, source, destination, False)
+            point = (time.perf_counter() - start) / queries
+            name = f"{'directed' if directed else 'undirected'}, " \
+                   f"{connectivity:g}"
+            print(f"{name:>18} {full:>13.2f} {single * 1000:>9.2f} "
+                  f"{point * 1000:>9.2f}")
+
+
+def bench_dtypes():
+    """Compare the speed and the accuracy of the engines across the dtypes
+    of the distance matrix, on whole and on fractional weights."""
+    vert_n = 600
+    whole = np.floor(random_matrix(vert_n))
+    fractional = random_matrix(vert_n)
+    print(f"V: {vert_n}")
+    print(f"{'weights':>10} {'dtype':>8} {'vectorized, s':>14} "
+          f"{'blocked, s':>11} {'max error':>10}")
+    for name, matrix in (("whole", whole), ("fractional", fractional)):
+        expected = floyd_vectorized(matrix.copy(), ROUND_POS)
+        finite = expected != inf
+        for dtype_name, dtype in DTYPES.items():
+            try:
+                cast = cast_matrix(matrix, dtype)
+            except ValueError:
+                continue
+            result = cast.copy()
+            vectorized = time_call(floyd_vectorized, result, ROUND_POS)
+            blocked = time_call(floyd_blocked, cast.copy(), ROUND_POS)
+            result = cast_matrix(result, np.float64)
+            assert np.array_equal(result == inf, ~finite), "paths differ"
+            error = np.abs(result[finite] - expected[finite]).max()
+            print(f"{name:>10} {dtype_name:>8} {vectorized:>14.2f} "
+                  f"{blocked:>11.2f} {error:>10.2g}")
+
+
+def bench_negative():
+    """Compare the time to stop at a negative cycle, by the position of its
+    last vertex, and to mark the pairs through it to a full run with no
+    cycle."""
+    vert_n = 1000
+    matrix = random_matrix(vert_n)
+    full = time_call(floyd_vectorized, matrix.copy(), ROUND_POS,
+                     init_next_hop(matrix))
+    print(f"V: {vert_n}, no cycle (with the successors): {full:.2f} s")
+    print(f"{'last vertex':>12} {'vectorized, s':>14} {'blocked, s':>11} "
+          f"{'marked, s':>10} {'cycle':>6}")
+    for last in (vert_n // 10, vert_n // 2, vert_n - 1):
+        cyclic = matrix.copy()
+        # a cycle of three vertices with a negative total weight
+        cycle = (last - 2, last - 1, last)
+        for from_row, to_row in zip(cycle, cycle[1:] + cycle[:1]):
+            cyclic[from_row, to_row] = -MAX_WEIGHT
+        times = []
+        for engine in (floyd_vectorized, floyd_blocked):
+            start = time.perf_counter()
+            try:
+                engine(cyclic.copy(), ROUND_POS, init_next_hop(cyclic))
+            except NegativeCycleError as error:
+                found = error.cycle
+            times.append(time.perf_counter() - start)
+        with np.errstate(invalid="ignore", over="ignore"):
+            marked = time_call(floyd_vectorized, cyclic.copy(), ROUND_POS,
+                               None, True)
+        print(f"{last:>12} {times[0]:>14.2f} {times[1]:>11.2f} "
+              f"{marked:>10.2f} {len(found):>6}")
+
+
+def matrix_csr(matrix: np.array) -> (np.array, np.array):
+    """Return the CSR row pointers and column indices of the edges of the
+    weight matrix."""
+    rows, columns = np.nonzero(matrix != inf)
+    return np.searchsorted(rows, np.arange(len(matrix) + 1)), columns
+
+
+def bench_reachability():
+    """Compare the packed transitive closure, with and without the
+    condensation, to the distance engine on large graphs."""
+    vert_n, sample_n = 10000, 2500
+    # the distance engine is too slow to run at vert_n, it is cubic
+    distance = time_call(floyd_vectorized, random_matrix(sample_n),
+                         ROUND_POS) * (vert_n / sample_n) ** 3
+    print(f"V: {vert_n}, distance matrix: {vert_n ** 2 * 8 / 2 ** 20:.0f} "
+          f"MB, distance engine (estimated from V = {sample_n}): "
+          f"{distance:.0f} s")
+    print(f"{'graph, %':>14} {'E':>9} {'closure, MB':>12} {'warshall, s':>12} "
+          f"{'condensed, s':>13} {'speedup':>9}")
+    # the connectivity is in percents
+    for name, connectivity in (("random", 0.01), ("random", 0.1),
+                               ("random", 1), ("acyclic", 0.1)):
+        matrix = random_weight_matrix(vert_n, connectivity, seed=0)
+        if name == "acyclic":
+            matrix[np.tril_indices(vert_n)] = inf
+        np.fill_diagonal(matrix, inf)
+        indptr, indices = matrix_csr(matrix)
+        del matrix
+        start = time.perf_counter()
+        packed = warshall_closure(pack_adjacency(indptr, indices))
+        warshall = time.perf_counter() - start
+        start = time.perf_counter()
+        condensed = condensed_closure(indptr, indices)
+        condensing = time.perf_counter() - start
+        assert np.array_equal(packed, condensed), "closures differ"
+        print(f"{name + f', {connectivity:g}':>14} {len(indices):>9} "
+              f"{packed.nbytes / 2 ** 20:>12.1f} {warshall:>12.2f} "
+              f"{condensing:>13.2f} {distance / warshall:>9.0f}")
+
+
+def bench_components():
+    """Compare solving the graph component by component to the dense engine
+    over all the vertices, on graphs of several components."""
+    vert_n, cross_edges = 2000, 50
+    print(f"V: {vert_n}")
+    print(f"{'graph':>10} {'components':>11} {'dense, s':>9} "
+          f"{'components, s':>14} {'matrix, s':>10} {'speedup':>9}")
+    for directed in (False, True):
+        for count in (4, 20):
+            size = vert_n // count
+            matrix = np.full((vert_n, vert_n), inf)
+            for start in range(0, vert_n, size):
+                block = slice(start, start + size)
+                matrix[block, block] = random_weight_matrix(
+                    size, 5, seed=start, symmetric=not directed)
+            if directed:
+                # edges forward only, from a component to a later one
+                rng = np.random.default_rng(0)
+                rows = rng.integers(0, vert_n - size, cross_edges)
+                columns = rng.integers(rows // size * size + size, vert_n)
+                matrix[rows, columns] = MAX_WEIGHT
+            np.fill_diagonal(matrix, inf)
+            graph = initialize_graph(matrix, LabelIndex(range(vert_n)),
+                                     directed)
+            np.fill_diagonal(matrix, 0)
+            dense = time_call(floyd_vectorized, matrix, ROUND_POS)
+            start = time.perf_counter()
+            result = ComponentAllPairs(graph, ROUND_POS)
+            split = time.perf_counter() - start
+            start = time.perf_counter()
+            assert np.allclose(result.get_matrix(), matrix), "results differ"
+            assembled = time.perf_counter() - start
+            name = "directed" if directed else "undirected"
+            print(f"{name:>10} {len(result.get_components()):>11} "
+                  f"{dense:>9.2f} {split:>14.2f} {assembled:>10.2f} "
+                  f"{dense / split:>9.1f}")
+
+
+def loop_vectorized(batch_matrix: np.array):
+    """Run the vectorized engine on the graphs of a batch one by one."""
+    for matrix in batch_matrix:
+        floyd_vectorized(matrix, ROUND_POS)
+
+
+def bench_batched():
+    """Compare the throughput of the batched engine on many small graphs to
+    looping floyd() (with the graphs built, printing to nowhere) and to
+    looping the vectorized engine, which it must not fall behind."""
+    graph_n, looped_n = 1000, 20
+    print(f"{graph_n} graphs (floyd() looped over {looped_n} of them), the "
+          f"best of {TIMING_RUNS} runs")
+    print(f"{'V':>6} {'chunk':>6} {'floyd(), 1/s':>13} "
+          f"{'vectorized, 1/s':>16} {'batched, 1/s':>13} {'speedup':>9}")
+    for vert_n in (50, 100, 150, 300):
+        matrices = [random_matrix(vert_n, seed=seed)
+                    for seed in range(graph_n)]
+        for matrix in matrices:
+            np.fill_diagonal(matrix, inf)
+        labels = LabelIndex(range(vert_n))
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(devnull):
+            for matrix in matrices[:looped_n]:
+                floyd(initialize_graph(matrix, labels, True))
+        looped = looped_n / (time.perf_counter() - start)
+        batch_matrix, _ = stack_matrices(matrices)
+        vectorized = graph_n / min(time_call(loop_vectorized,
+                                             batch_matrix.copy())
+                                   for _ in range(TIMING_RUNS))
+        batched = graph_n / min(time_call(floyd_batched, batch_matrix.copy(),
+                                          ROUND_POS)
+                                for _ in range(TIMING_RUNS))
+        result = all_pairs_batch(matrices)
+        assert np.array_equal(result[0], floyd_vectorized(batch_matrix[0],
+                                                          ROUND_POS)), \
+            "results differ"
+        print(f"{vert_n:>6} {batch_chunk(vert_n):>6} {looped:>13.1f} "
+              f"{vectorized:>16.1f} {batched:>13.1f} "
+              f"{batched / looped:>9.1f}")
+        assert batched >= vectorized * (1 - TIMING_NOISE), \
+            "batched slower than the vectorized loop"
+
+
+def loop_graph_matrix(graph: LinkedGraph) -> np.array:
+    """Build the Floyd matrix of the graph looking the edge of every pair up
+    by the labels as before."""
+    label_map = dict(enumerate(graph.vertices()))
+    vert_n = len(label_map)
+    matrix = np.empty((vert_n, vert_n))
+    for i in range(vert_n):
+        for ii in range(vert_n):
+            edge = graph.get_edge(label_map[i].get_label(),
+                                  label_map[ii].get_label())
+            if i == ii:
+                matrix[i, ii] = 0
+            elif edge is not None:
+                matrix[i, ii] = edge.get_weight()
+            else:
+                matrix[i, ii] = inf
+    return matrix
+
+
+def bench_labels():
+    """Compare building the Floyd matrix of a graph and translating many
+    labels and pairs of labels with the label index to the lookups of every
+    label (or pair) one by one."""
+    vert_n, count = 1500, 10 ** 6
+    rng = np.random.default_rng(0)
+    labels = LabelIndex(f"v{row}" for row in range(vert_n))
+    graph = initialize_graph(random_weight_matrix(vert_n, 5, seed=0),
+                             labels, True)
+    rows = rng.integers(0, vert_n, count)
+    names = labels.labels_of(rows).tolist()
+    result = all_pairs(graph, "vectorized")
+    print(f"V: {vert_n}, {count} labels, {count // 10} pairs")
+    print(f"{'task':>14} {'loop, s':>8} {'index, s':>9} {'speedup':>8}")
+
+    start = time.perf_counter()
+    looped = loop_graph_matrix(graph)
+    loop = time.perf_counter() - start
+    start = time.perf_counter()
+    matrix = graph_matrix(graph)[0]
+    index = time.perf_counter() - start
+    assert np.array_equal(matrix, looped), "matrices differ"
+    print(f"{'graph matrix':>14} {loop:>8.2f} {index:>9.3f} "
+          f"{loop / index:>8.1f}")
+
+    by_label = {label: row for row, label in enumerate(labels)}
+    in_order = list(labels)
+    cases = (("labels->rows", lambda: np.array([by_label[name]
+                                                for name in names]),
+              lambda: labels.rows_of(names)),
+             ("rows->labels", lambda: [in_order[row]
+                                       for row in rows.tolist()],
+              lambda: labels.labels_of(rows).tolist()),
+             ("distances", lambda: [result.distance(*pair) for pair in
+                                    zip(names[:count // 10],
+                                        names[count // 10:count // 5])],
+              lambda: result.distances(names[:count // 10],
+                                       names[count // 10:count // 5])))
+    for name, looped, indexed in cases:
+        assert np.array_equal(looped(), indexed()), "results differ"
+        loop, index = time_call(looped), time_call(indexed)
+        print(f"{name:>14} {loop:>8.2f} {index:>9.3f} {loop / index:>8.1f}")
+
+
+async def _updating(path: str, vert_n: int, count: int) -> float:
+    """Send count updates of a random edge one after another and return the
+    seconds they took."""
+    reader, writer = await asyncio.open_unix_connection(path)
+    start = time.perf_counter()
+    for update in range(count):
+        edge = [update % vert_n, (update + 1) % vert_n, MAX_WEIGHT]
+        writer.write(json.dumps({"op": "update",
+                                 "edges": [edge]}).encode() + b"\n")
+        assert "result" in json.loads(await reader.readline()), \
+            "update failed"
+    writer.close()
+    return time.perf_counter() - start
+
+
+def bench_server():
+    """Measure the throughput and the latencies of the query service over a
+    Unix socket, with no requests pipelined and with 16 of them, and of the
+    distance queries while updates are recomputed."""
+    vert_n, connections, requests = 2000, 8, 2000
+    print(f"V: {vert_n}, {connections} connections, "
+          f"{requests} requests each")
+    print(f"{'ops':>10} {'pipeline':>9} {'QPS':>8} {'p50, ms':>8} "
+          f"{'p99, ms':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "weights.npy")
+        path = os.path.join(directory, "server.sock")
+        np.save(input_path, random_weight_matrix(vert_n, 5, seed=0))
+        server = subprocess.Popen(
+            [sys.executable, "server.py", input_path, "--unix", path],
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        try:
+            # the socket accepts connections once the first result is found
+            while True:
+                try:
+                    with socket.socket(socket.AF_UNIX) as probe:
+                        probe.connect(path)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    time.sleep(0.1)
+            for ops in ("dist", "path", "k_nearest", "row"):
+                for pipeline in (1, 16):
+                    stats = asyncio.run(load_test(
+                        path=path, connections=connections,
+                        requests=requests, pipeline=pipeline, ops=(ops,)))
+                    print(f"{ops:>10} {pipeline:>9} {stats['qps']:>8.0f} "
+                          f"{stats['p50'] * 1000:>8.3f} "
+                          f"{stats['p99'] * 1000:>8.3f}")
+
+            async def during_updates():
+                updates = asyncio.create_task(_updating(path, vert_n, 1))
+                stats = await load_test(path=path, connections=connections,
+                                        requests=requests * 5, pipeline=16,
+                                        ops=("dist",))
+                return stats, await updates
+
+            stats, seconds = asyncio.run(during_updates())
+            print(f"{'dist':>10} {16:>9} {stats['qps']:>8.0f} "
+                  f"{stats['p50'] * 1000:>8.3f} {stats['p99'] * 1000:>8.3f}"
+                  f"  while an update took {seconds:.2f} s")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+BENCHMARKS = {
+    "vectorized": bench_vectorized,
+    "edge_index": bench_edge_index,
+    "blocked": bench_blocked,
+    "parallel": bench_parallel,
+    "sparse": bench_sparse,
+    "next_hop": bench_next_hop,
+    "dynamic": bench_dynamic,
+    "compact": bench_compact,
+    "memory": bench_memory,
+    "batch": bench_batch,
+    "out_of_core": bench_out_of_core,
+    "dtypes": bench_dtypes,
+    "ingest": bench_ingest,
+    "random": bench_random,
+    "initialize": bench_initialize,
+    "output": bench_output,
+    "cache": bench_cache,
+    "queries": bench_queries,
+    "negative": bench_negative,
+    "reachability": bench_reachability,
+    "components": bench_components,
+    "batched": bench_batched,
+    "server": bench_server,
+    "labels": bench_labels,
+}
+
+
+def main():
+    """Run the benchmarks given on the command line (all by default)."""
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark {name}, choose from: "
+                  f"{', '.join(BENCHMARKS)}")
+            continue
+        print(f"\n{name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main()
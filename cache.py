@@ -0,0 +1,198 @@
+"""Cache of all-pairs results keyed by the content of the graph.
+
+A graph is fingerprinted by its directedness, the labels of its vertices in
+order (the rows of the result follow it) and its edges with their weights,
+a weight matrix by its dtype, shape and values. The results are kept in a
+least recently used map in memory and, optionally, as .npy files in a
+directory which is trimmed to a size limit by the oldest use.
+
+The cached arrays are read-only, copy them to change them.
+"""
+import hashlib
+import os
+import numpy as np
+from collections import OrderedDict
+from typing import Optional, Union
+from engines import row_bands
+from graph import LinkedGraph
+from sparse import csr_adjacency
+
+# results kept in memory
+CACHE_ENTRIES = 16
+# size of the results kept on disk in bytes
+CACHE_DISK_BYTES = 1024 * 1024 * 1024
+# suffixes of the files of an entry
+MATRIX_FILE = ".npy"
+NEXT_HOP_FILE = ".next.npy"
+
+
+def fingerprint(source: Union[LinkedGraph, np.array],
+                dtype: np.dtype = np.float64) -> str:
+    """Return the hex digest of the content of a graph or a weight matrix.
+
+    The order of the edges of a vertex does not change the digest, the
+    order of the vertices does.
+
+    :param source: graph (linked or compact) or 2D weight matrix
+    :param dtype: dtype the result is found in
+    :return: the digest
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(np.dtype(dtype).str.encode())
+    if not isinstance(source, np.ndarray):
+        indptr, indices, weights, labels = csr_adjacency(source)
+        rows = np.repeat(np.arange(len(labels)), np.diff(indptr))
+        order = np.lexsort((indices, rows))
+        digest.update(b"graph directed" if source.is_directed()
+                      else b"graph undirected")
+        digest.update(repr(labels.get_labels().tolist()).encode())
+        for array in (indptr, indices[order], weights[order]):
+            digest.update(array.tobytes())
+    else:
+        digest.update(f"matrix {source.dtype.str} {source.shape}".encode())
+        for band in row_bands(source):
+            digest.update(np.ascontiguousarray(source[band]).data)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Represent the cache of the shortest path weights (and optionally the
+    successor matrices) by the fingerprints of the graphs.
+    """
+
+    def __init__(self, entries: int = CACHE_ENTRIES, directory: str = None,
+                 disk_bytes: int = CACHE_DISK_BYTES):
+        """Create the cache.
+
+        :param entries: number of results kept in memory
+        :param directory: directory to keep the results in as .npy files
+        too (created if needed), None for the memory only
+        :param disk_bytes: size of the files kept in the directory in bytes
+        """
+        self._entries = entries
+        self._directory = directory
+        self._disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get_hits(self) -> int:
+        """Return the number of lookups which found a result."""
+        return self._hits
+
+    def get_misses(self) -> int:
+        """Return the number of lookups which found none."""
+        return self._misses
+
+    def __len__(self) -> int:
+        """Return the number of results in memory."""
+        return len(self._memory)
+
+    def _path(self, key: str, suffix: str) -> str:
+        """Return the path of a file of the entry."""
+        return os.path.join(self._directory, key + suffix)
+
+    def get(self, key: str, next_hop: bool = False) -> Optional[tuple]:
+        """Return the cached result.
+
+        :param key: fingerprint of the graph
+        :param next_hop: whether the successor matrix is needed too
+        :return: a tuple of the matrix of shortest path weights and the
+        successor matrix (None if it was not cached), None if there is no
+        such result
+        """
+        result = self._memory.get(key)
+        if result is not None:
+            self._memory.move_to_end(key)
+            self._touch(key)
+        elif self._directory is not None and \
+                os.path.exists(self._path(key, MATRIX_FILE)):
+            hop_path = self._path(key, NEXT_HOP_FILE)
+            result = (np.load(self._path(key, MATRIX_FILE), mmap_mode="r"),
+                      np.load(hop_path, mmap_mode="r")
+                      if os.path.exists(hop_path) else None)
+            self._touch(key)
+            self._remember(key, result)
+
+        if result is None or (next_hop and result[1] is None):
+            self._misses += 1
+            return None
+        self._hits += 1
+        return result
+
+    def _touch(self, key: str):
+        """Mark the files of the entry as just used, the modification time
+        orders them by their last use."""
+        if self._directory is None:
+            return
+        for suffix in (MATRIX_FILE, NEXT_HOP_FILE):
+            path = self._path(key, suffix)
+            if os.path.exists(path):
+                os.utime(path)
+
+    def put(self, key: str, matrix: np.array, next_hop: np.array = None):
+        """Cache the result, replacing the one of the key.
+
+        :param key: fingerprint of the graph
+        :param matrix: matrix of shortest path weights
+        :param next_hop: successor matrix if it was filled
+        """
+        result = []
+        for array in (matrix, next_hop):
+            if array is not None:
+                array = np.array(array)
+                array.flags.writeable = False
+            result.append(array)
+        self._remember(key, tuple(result))
+
+        if self._directory is None:
+            return
+        np.save(self._path(key, MATRIX_FILE), result[0])
+        if next_hop is not None:
+            np.save(self._path(key, NEXT_HOP_FILE), result[1])
+        elif os.path.exists(self._path(key, NEXT_HOP_FILE)):
+            os.remove(self._path(key, NEXT_HOP_FILE))
+        self._trim()
+
+    def _remember(self, key: str, result: tuple):
+        """Keep the result in memory, evicting the least recently used."""
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._entries:
+            self._memory.popitem(last=False)
+
+    def _trim(self):
+        """Remove the files of the least recently used entries over the size
+        limit, those of an entry together."""
+        entries = {}
+        for entry in os.scandir(self._directory):
+            if not entry.is_file():
+                continue
+            # the successor file ends with the suffix of the matrix too
+            for suffix in (NEXT_HOP_FILE, MATRIX_FILE):
+                if entry.name.endswith(suffix):
+                    key = entry.name[:-len(suffix)]
+                    break
+            else:
+                continue
+            stat = entry.stat()
+            last_use, size, paths = entries.get(key, (0, 0, []))
+            entries[key] = (max(last_use, stat.st_mtime), size + stat.st_size,
+                            paths + [entry.path])
+        size = sum(entry_size for _, entry_size, _ in entries.values())
+        for _, entry_size, paths in sorted(entries.values()):
+            if size <= self._disk_bytes:
+                break
+            for path in paths:
+                os.remove(path)
+            size -= entry_size
+
+    def clear(self):
+        """Remove all the results from memory and from the directory."""
+        self._memory.clear()
+        if self._directory is not None:
+            for entry in os.scandir(self._directory):
+                if entry.name.endswith(MATRIX_FILE) and entry.is_file():
+                    os.remove(entry.path)
@@ -0,0 +1,233 @@
+"""Reachability between all the vertices of a graph as its transitive
+closure over rows of bits.
+
+Row i of the closure has bit j set if there is a path from vertex i to
+vertex j (every vertex reaches itself, like the zero diagonal of the
+distance matrix). The rows are packed into little-endian 64 bit words, so
+the closure takes 64 times less memory than a float64 distance matrix and
+Warshall's algorithm ORs whole words at a time: every row which reaches k
+gets the row of k.
+
+Optionally the graph is condensed to its strongly connected components
+first: the vertices of a component reach the same ones, so a single row per
+component is found, by ORing the rows of the components it leads to in
+reverse topological order, with no cubic pass at all.
+"""
+import numpy as np
+from typing import Any
+from graph import LinkedGraph
+from labelindex import LabelIndex
+from sparse import csr_adjacency
+
+# bits in a word of a packed row
+WORD_BITS = 64
+# dtype of the words, little-endian so that bit j of a row is bit j of its
+# bytes unpacked with bitorder="little"
+WORD = np.dtype("<u8")
+
+
+def row_words(vert_n: int) -> int:
+    """Return the number of words in a packed row of vert_n bits."""
+    return (vert_n + WORD_BITS - 1) // WORD_BITS
+
+
+def _bits(columns: np.array) -> (np.array, np.array):
+    """Return the words and the masks of the bits of the columns."""
+    columns = np.asarray(columns, dtype=np.int64)
+    masks = np.left_shift(np.ones(len(columns), dtype=WORD),
+                          (columns % WORD_BITS).astype(WORD))
+    return columns // WORD_BITS, masks
+
+
+def pack_adjacency(indptr: np.array, indices: np.array) -> np.array:
+    """Pack the adjacency of the graph in the CSR form into rows of bits,
+    with every vertex reaching itself.
+
+    :param indptr: CSR row pointers
+    :param indices: CSR column indices
+    :return: 2D array of the packed rows (vertices by words)
+    """
+    vert_n = len(indptr) - 1
+    packed = np.zeros((vert_n, row_words(vert_n)), dtype=WORD)
+    rows = np.repeat(np.arange(vert_n), np.diff(indptr))
+    words, masks = _bits(indices)
+    np.bitwise_or.at(packed, (rows, words), masks)
+    diagonal = np.arange(vert_n)
+    words, masks = _bits(diagonal)
+    packed[diagonal, words] |= masks
+    return packed
+
+
+def warshall_closure(packed: np.array) -> np.array:
+    """Run Warshall's algorithm on the packed rows in place.
+
+    :param packed: packed rows of the adjacency (see pack_adjacency)
+    :return: the packed rows of the transitive closure
+    """
+    for k in range(len(packed)):
+        word, mask = k // WORD_BITS, WORD.type(1 << (k % WORD_BITS))
+        reaching = np.flatnonzero(packed[:, word] & mask)
+        if len(reaching) > 1:
+            packed[reaching] |= packed[k]
+    return packed
+
+
+def strong_components(indptr: np.array,
+                      indices: np.array) -> (np.array, int):
+    """Find the strongly connected components with Tarjan's algorithm.
+
+    The depth-first search keeps its own stack, so long paths do not hit
+    the recursion limit. The components are numbered in the order they are
+    completed, which is a reverse topological order of the condensation:
+    every edge leads to a component with the same or a lower number.
+
+    :param indptr: CSR row pointers
+    :param indices: CSR column indices
+    :return: a tuple of the component number of every row and the number
+    of components
+    """
+    vert_n = len(indptr) - 1
+    # lists are indexed much faster than arrays
+    indptr, indices = indptr.tolist(), indices.tolist()
+    order = [-1] * vert_n
+    low = [0] * vert_n
+    component = [-1] * vert_n
+    visited = []
+    counter = count = 0
+    for root in range(vert_n):
+        if order[root] != -1:
+            continue
+        order[root] = low[root] = counter
+        counter += 1
+        visited.append(root)
+        # the vertices being searched with the positions of their next edges
+        calls = [[root, indptr[root]]]
+        while calls:
+            call = calls[-1]
+            vertex, position = call
+            if position < indptr[vertex + 1]:
+                call[1] += 1
+                other = indices[position]
+                if order[other] == -1:
+                    order[other] = low[other] = counter
+                    counter += 1
+                    visited.append(other)
+                    calls.append([other, indptr[other]])
+                elif component[other] == -1 and order[other] < low[vertex]:
+                    # still on the stack of visited vertices
+                    low[vertex] = order[other]
+                continue
+            calls.pop()
+            if calls and low[vertex] < low[calls[-1][0]]:
+                low[calls[-1][0]] = low[vertex]
+            if low[vertex] == order[vertex]:
+                while True:
+                    member = visited.pop()
+                    component[member] = count
+                    if member == vertex:
+                        break
+                count += 1
+    return np.array(component, dtype=np.int64), count
+
+
+def condensed_closure(indptr: np.array, indices: np.array) -> np.array:
+    """Find the packed rows of the transitive closure through the
+    condensation of the graph to its strongly connected components.
+
+    :param indptr: CSR row pointers
+    :param indices: CSR column indices
+    :return: 2D array of the packed rows of the closure
+    """
+    vert_n = len(indptr) - 1
+    component, count = strong_components(indptr, indices)
+    reach = np.zeros((count, row_words(vert_n)), dtype=WORD)
+    words, masks = _bits(np.arange(vert_n))
+    np.bitwise_or.at(reach, (component, words), masks)
+
+    # the edges between the components, grouped by the one they leave
+    rows = np.repeat(np.arange(vert_n), np.diff(indptr))
+    sources, targets = component[rows], component[indices]
+    between = sources != targets
+    pairs = np.unique(np.column_stack((sources[between], targets[between])),
+                      axis=0)
+    starts = np.searchsorted(pairs[:, 0], np.arange(count + 1))
+    for source in range(count):
+        # the components it leads to have lower numbers, so are final
+        targets = pairs[starts[source]:starts[source + 1], 1]
+        if len(targets):
+            reach[source] |= np.bitwise_or.reduce(reach[targets], axis=0)
+    return reach[component]
+
+
+class Reachability:
+    """Represent the transitive closure of a graph: which vertices every
+    vertex reaches.
+    """
+
+    def __init__(self, packed: np.array, labels: LabelIndex):
+        """Create the result.
+
+        :param packed: packed rows of the closure
+        :param labels: label index of the rows
+        """
+        self._packed = packed
+        self._labels = labels
+
+    def get_packed(self) -> np.array:
+        """Return the packed rows of the closure."""
+        return self._packed
+
+    def get_label_index(self) -> LabelIndex:
+        """Return the label index of the rows."""
+        return self._labels
+
+    def get_row(self, label: Any) -> int:
+        """Return the row of the vertex with label.
+
+        :raise AttributeError: if there is no vertex with label.
+        """
+        return self._labels.get_row(label)
+
+    def get_matrix(self) -> np.array:
+        """Return the closure unpacked into a 2D bool matrix."""
+        bits = np.unpackbits(self._packed.view(np.uint8), axis=1,
+                             count=len(self._packed), bitorder="little")
+        return bits.view(bool)
+
+    def reachable(self, from_label: Any, to_label: Any) -> bool:
+        """Return True if there is a path between the vertices, False
+        otherwise.
+
+        :raise AttributeError: if the vertices are not in the graph.
+        """
+        to_row = self.get_row(to_label)
+        word = self._packed[self.get_row(from_label), to_row // WORD_BITS]
+        return bool(word >> WORD.type(to_row % WORD_BITS) & WORD.type(1))
+
+    def reachable_from(self, label: Any) -> list:
+        """Return the labels of the vertices the vertex reaches, in the
+        order of the rows.
+
+        :raise AttributeError: if the vertex is not in the graph.
+        """
+        row = self._packed[self.get_row(label)]
+        bits = np.unpackbits(row.view(np.uint8), count=len(self._packed),
+                             bitorder="little")
+        return self._labels.labels_of(np.flatnonzero(bits)).tolist()
+
+
+def transitive_closure(graph: LinkedGraph,
+                       condense: bool = False) -> Reachability:
+    """Find which vertices every vertex of the graph reaches.
+
+    :param graph: the graph (linked or compact)
+    :param condense: whether to condense the strongly connected components
+    first instead of running Warshall's algorithm over all the vertices
+    :return: the closure to query
+    """
+    indptr, indices, _, labels = csr_adjacency(graph)
+    if condense:
+        packed = condensed_closure(indptr, indices)
+    else:
+        packed = warshall_closure(pack_adjacency(indptr, indices))
+    return Reachability(packed, labels)
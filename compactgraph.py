@@ -0,0 +1,648 @@
+"""Array-backed graphs with the interface of the linked graphs.
+
+The vertices are rows numbered in the order of addition, the labels are
+mapped to them by a dict. The edges are kept in the CSR form: the edges
+leaving row i are at positions indptr[i]:indptr[i + 1] of the indices (rows
+of the other vertices, sorted) and the weights arrays. New edges are staged
+in a dict and merged into the arrays when the graph is read in bulk.
+Undirected edges are kept in both directions (self loops once). The weights
+are int64 while all of them are integers and float64 otherwise, so integer
+weights stay integers through a conversion.
+
+Vertices and edges are returned as lightweight views which hold the graph
+and the rows only. Removing a vertex renumbers the rows after it, so the
+views taken before that are invalid.
+"""
+from __future__ import annotations
+import numpy as np
+from abstractcollection import AbstractCollection
+from graph import LinkedGraph, LinkedDirectedGraph
+from typing import Union, Any, Iterator, Optional, Collection, Iterable
+
+
+def weight_array(weights: Iterable) -> np.array:
+    """Return the array of the weights, int64 if all of them are integers
+    (or there are none) and float64 otherwise."""
+    weights = list(weights)
+    if all(isinstance(weight, (int, np.integer)) for weight in weights):
+        return np.array(weights, dtype=np.int64)
+    return np.array(weights, dtype=np.float64)
+
+
+class CompactEdge:
+    """Represent a view of an undirected edge of a compact graph."""
+
+    def __init__(self, graph: CompactGraph, from_row: int, to_row: int,
+                 pos: int = None):
+        """Create an edge view.
+
+        :param graph: the graph of the edge
+        :param from_row: row of one of the vertices
+        :param to_row: row of another vertex
+        :param pos: position of the edge in the arrays if known
+        """
+        self._graph = graph
+        self._from_row = from_row
+        self._to_row = to_row
+        # the position is valid while the arrays keep their layout
+        self._pos = pos
+        self._layout = graph._layout
+
+    def _key(self) -> (int, int):
+        """Return the rows identifying the edge in the graph."""
+        return self._graph._edge_key(self._from_row, self._to_row)
+
+    def clear_mark(self):
+        """Clears the mark on the edge."""
+        self._graph._edge_marks.discard(self._key())
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __eq__(self, other: CompactEdge) -> bool:
+        """Return True if vertices of the edges match, False otherwise."""
+        if self is other:
+            return True
+        if type(self) != type(other):
+            return False
+        return self._graph is other._graph and self._key() == other._key()
+
+    def get_vertices(self) -> (CompactVertex, CompactVertex):
+        """Return the tuple of vertices."""
+        return (self._graph._vertex_view(self._from_row),
+                self._graph._vertex_view(self._to_row))
+
+    def get_other_vertex(self, this_vertex: CompactVertex) -> CompactVertex:
+        """Return the vertex opposite this_vertex."""
+        if this_vertex is None or this_vertex._row == self._to_row:
+            return self._graph._vertex_view(self._from_row)
+        return self._graph._vertex_view(self._to_row)
+
+    def get_weight(self) -> Union[int, float]:
+        """Return the edge's weight."""
+        if self._pos is not None and self._layout == self._graph._layout:
+            return self._graph._weights[self._pos].item()
+        return self._graph._get_weight(self._from_row, self._to_row)
+
+    def is_marked(self) -> bool:
+        """Returns True if the edge is marked, False otherwise."""
+        return self._key() in self._graph._edge_marks
+
+    def set_mark(self):
+        """Set the mark on the edge."""
+        self._graph._edge_marks.add(self._key())
+
+    def set_weight(self, weight: Union[int, float]):
+        """Set the weight on the edge to given weight."""
+        self._graph._set_weight(self._from_row, self._to_row, weight)
+
+    def __repr__(self) -> str:
+        """Return the string representation of the edge."""
+        from_vertex, to_vertex = self.get_vertices()
+        return f"{from_vertex} -- {to_vertex} : {self.get_weight()}"
+
+
+class CompactDirectedEdge(CompactEdge):
+    """Represent a view of a directed edge of a compact graph."""
+
+    def get_to_vertex(self) -> CompactVertex:
+        """Return the edge's destination vertex."""
+        return self._graph._vertex_view(self._to_row)
+
+    def __repr__(self) -> str:
+        """Return the string representation of the edge."""
+        from_vertex, to_vertex = self.get_vertices()
+        return f"{from_vertex} -> {to_vertex} : {self.get_weight()}"
+
+
+class CompactVertex:
+    """Represent a view of a vertex of a compact graph."""
+
+    def __init__(self, graph: CompactGraph, row: int):
+        """Create a vertex view.
+
+        :param graph: the graph of the vertex
+        :param row: row of the vertex
+        """
+        self._graph = graph
+        self._row = row
+
+    def __hash__(self):
+        return (hash(self.get_label()) << 5) ^ hash(self.__class__.__name__)
+
+    def clear_mark(self):
+        """Clear the mark on the vertex."""
+        self._graph._vertex_marks.discard(self._row)
+
+    def get_label(self) -> Any:
+        """Get the label of the vertex."""
+        return self._graph._labels[self._row]
+
+    def is_marked(self) -> bool:
+        """Return True if the vertex is marked or False otherwise."""
+        return self._row in self._graph._vertex_marks
+
+    def set_label(self, label: Any, g: CompactGraph):
+        """Set the vertex's label to label."""
+        g._rows.pop(self.get_label(), None)
+        g._rows[label] = self._row
+        g._labels[self._row] = label
+
+    def set_mark(self):
+        """Set the mark on the vertex."""
+        self._graph._vertex_marks.add(self._row)
+
+    def __repr__(self) -> str:
+        """Return the string representation of the vertex."""
+        return f"v({self.get_label()})"
+
+    def __eq__(self, other: CompactVertex) -> bool:
+        """Return True if the labels are equal, False otherwise."""
+        if self is other:
+            return True
+        elif type(self) != type(other):
+            return False
+        return self.get_label() == other.get_label()
+
+    # methods for interacting with edges
+
+    def add_edge_to(self, to_vertex: CompactVertex,
+                    weight: Union[int, float]):
+        """Connect two vertices with an edge.
+
+        :param to_vertex: vertex to connect to
+        :param weight: weight of the edge
+        """
+        self._graph._stage_edge(self._row, to_vertex._row, weight)
+
+    def get_edge_to(self, to_vertex: CompactVertex) -> Optional[CompactEdge]:
+        """Return the connecting edge if it exists, None otherwise."""
+        if self._graph._get_weight(self._row, to_vertex._row) is None:
+            return None
+        return self._graph._edge_view(self._row, to_vertex._row)
+
+    def incident_edges(self) -> Iterator:
+        """Generate the incident edges for this vertex."""
+        for to_row, pos in self._graph._neighbour_rows(self._row):
+            yield self._graph._edge_view(self._row, to_row, pos)
+
+    def neighboring_vertices(self) -> Iterator:
+        """Generate the neighboring vertices for this vertex."""
+        for to_row, _ in self._graph._neighbour_rows(self._row):
+            yield self._graph._vertex_view(to_row)
+
+    def remove_edge_to(self, to_vertex: CompactVertex) -> bool:
+        """Return True if the edge exists and is removed, False otherwise."""
+        return self._graph._remove_edge(self._row, to_vertex._row)
+
+
+class CompactDirectedVertex(CompactVertex):
+    """Represent a view of a vertex of a compact directed graph."""
+
+
+class CompactGraph(AbstractCollection):
+    """Represent an undirected graph kept in arrays.
+
+    A graph has a count of vertices, a count of edges, a list of labels by
+    row, a dictionary of label/row pairs and the CSR arrays of the edges.
+    """
+
+    _vertex_type = CompactVertex
+    _edge_type = CompactEdge
+
+    def __init__(self, source_collection: Collection = None):
+        self._edge_count = 0
+        self._labels = []
+        self._rows = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.empty(0, dtype=np.int32)
+        self._weights = np.empty(0, dtype=np.int64)
+        # (from row, to row): weight of the edges not merged into the arrays
+        self._staged = {}
+        # changes whenever the positions in the arrays change
+        self._layout = 0
+        self._vertex_marks = set()
+        self._edge_marks = set()
+        AbstractCollection.__init__(self, source_collection)
+
+    def __len__(self) -> int:
+        """Return number of the vertices."""
+        return self._size
+
+    def is_directed(self) -> bool:
+        """Return True if the edges of the graph are directed."""
+        return False
+
+    # Methods for the arrays
+
+    def _edge_key(self, from_row: int, to_row: int) -> (int, int):
+        """Return the rows identifying the edge (sorted if undirected)."""
+        if self.is_directed() or from_row <= to_row:
+            return from_row, to_row
+        return to_row, from_row
+
+    def _vertex_view(self, row: int) -> CompactVertex:
+        """Return the view of the vertex in the row."""
+        return self._vertex_type(self, row)
+
+    def _edge_view(self, from_row: int, to_row: int,
+                   pos: int = None) -> CompactEdge:
+        """Return the view of the edge between the rows."""
+        return self._edge_type(self, from_row, to_row, pos)
+
+    def _flush(self):
+        """Merge the staged edges and the new vertices into the arrays."""
+        vert_n = len(self._labels)
+        if not self._staged and len(self._indptr) == vert_n + 1:
+            return
+        keys = np.array(list(self._staged), dtype=np.int64).reshape(-1, 2)
+        rows = np.concatenate((np.repeat(np.arange(len(self._indptr) - 1),
+                                         np.diff(self._indptr)), keys[:, 0]))
+        indices = np.concatenate((self._indices, keys[:, 1]))
+        weights = np.concatenate((self._weights,
+                                  weight_array(self._staged.values())))
+        self._set_arrays(rows, indices, weights)
+        self._staged = {}
+
+    def _set_arrays(self, rows: np.array, indices: np.array,
+                    weights: np.array):
+        """Set the CSR arrays from the unsorted rows, indices and weights."""
+        order = np.lexsort((indices, rows))
+        self._indptr = np.zeros(len(self._labels) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(self._labels)),
+                  out=self._indptr[1:])
+        self._indices = indices[order].astype(np.int32)
+        self._weights = weights[order]
+        self._layout += 1
+
+    def _position(self, from_row: int, to_row: int) -> Optional[int]:
+        """Return the position of the merged edge in the arrays or None."""
+        if from_row >= len(self._indptr) - 1:
+            return None
+        start, stop = self._indptr[from_row], self._indptr[from_row + 1]
+        pos = start + np.searchsorted(self._indices[start:stop], to_row)
+        if pos < stop and self._indices[pos] == to_row:
+            return pos
+        return None
+
+    def _get_weight(self, from_row: int, to_row: int) -> Optional[float]:
+        """Return the weight of the edge between the rows or None."""
+        weight = self._staged.get((from_row, to_row))
+        if weight is not None:
+            return weight
+        pos = self._position(from_row, to_row)
+        return None if pos is None else self._weights[pos].item()
+
+    def _set_weight(self, from_row: int, to_row: int,
+                    weight: Union[int, float]):
+        """Set the weight of the existing edge between the rows."""
+        directions = [(from_row, to_row)]
+        if not self.is_directed():
+            directions.append((to_row, from_row))
+        for one_row, other_row in directions:
+            if (one_row, other_row) in self._staged:
+                self._staged[one_row, other_row] = weight
+            else:
+                pos = self._position(one_row, other_row)
+                if pos is not None:
+                    # a fractional weight turns the integer weights to float
+                    dtype = np.result_type(self._weights, weight)
+                    if dtype != self._weights.dtype:
+                        self._weights = self._weights.astype(dtype)
+                    self._weights[pos] = weight
+
+    def _stage_edge(self, from_row: int, to_row: int,
+                    weight: Union[int, float]):
+        """Stage a new edge between the rows."""
+        self._staged[from_row, to_row] = weight
+        if not self.is_directed():
+            self._staged[to_row, from_row] = weight
+        self._edge_count += 1
+
+    def _remove_edge(self, from_row: int, to_row: int) -> bool:
+        """Return True if the edge existed and is removed, False otherwise."""
+        if self._get_weight(from_row, to_row) is None:
+            return False
+        self._edge_marks.discard(self._edge_key(from_row, to_row))
+        self._flush()
+        positions = {self._position(from_row, to_row)}
+        if not self.is_directed():
+            positions.add(self._position(to_row, from_row))
+        positions = np.array(sorted(positions), dtype=np.int64)
+        self._indices = np.delete(self._indices, positions)
+        self._weights = np.delete(self._weights, positions)
+        # every row pointer moves back by the removed positions before it
+        self._indptr -= np.searchsorted(positions, self._indptr)
+        self._layout += 1
+        self._edge_count -= 1
+        return True
+
+    def _neighbour_rows(self, row: int) -> Iterator:
+        """Generate the rows connected to the row by an edge and the
+        positions of the edges."""
+        self._flush()
+        start, stop = self._indptr[row], self._indptr[row + 1]
+        yield from zip(self._indices[start:stop].tolist(),
+                       range(start, stop))
+
+    def csr(self) -> (np.array, np.array, np.array):
+        """Return the CSR arrays (indptr, indices, weights) of the edges.
+
+        The arrays are shared with the graph, do not change them. The
+        weights are int64 if all of them are integers, float64 otherwise.
+        """
+        self._flush()
+        return self._indptr, self._indices, self._weights
+
+    # Methods for clearing, marks, sizes, string rep
+
+    def clear(self):
+        """Clear the graph (revert to initial state)."""
+        self._size = 0
+        self._edge_count = 0
+        self._labels = []
+        self._rows = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.empty(0, dtype=np.int32)
+        self._weights = np.empty(0, dtype=np.int64)
+        self._staged = {}
+        self._layout += 1
+        self._vertex_marks = set()
+        self._edge_marks = set()
+
+    def clear_edge_marks(self):
+        """Clear all the edge marks."""
+        self._edge_marks = set()
+
+    def clear_vertex_marks(self):
+        """Clear all the vertex marks."""
+        self._vertex_marks = set()
+
+    def size_edges(self) -> int:
+        """Return the number of edges."""
+        return self._edge_count
+
+    def size_vertices(self) -> int:
+        """Return the number of vertices."""
+        return len(self)
+
+    def __str__(self) -> str:
+        """Return the string representation of the graph."""
+        return (f"    {self.__class__.__name__.replace('Compact', '')}:\n"
+                f"{len(self)} Vertices: "
+                f"{', '.join(str(v) for v in self._labels)}\n"
+                f"{self.size_edges()} Edges:\n"
+                f"{chr(10).join(str(e) for e in self.edges())}")
+
+    def add(self, label: Any):
+        """For compatibility with other collections."""
+        self.add_vertex(label)
+
+    # Vertex related methods
+
+    def add_vertex(self, label: Any):
+        """Add a vertex to the graph.
+
+        :param label: label of the added vertex
+        :raise AttributeError: if a vertex with label
+        is already in the graph."""
+        if self.contains_vertex(label):
+            raise AttributeError(f"Label {label} already in the graph.")
+        self._rows[label] = len(self._labels)
+        self._labels.append(label)
+        self._size += 1
+
+    def contains_vertex(self, label: Any) -> bool:
+        """Return True if vertex with the label is in the graph, else False."""
+        return label in self._rows
+
+    def get_vertex(self, label: Any) -> CompactVertex:
+        """Get the vertex with label from the graph.
+
+        :param label: label of the desired vertex
+        :raise AttributeError: if a vertex with label is not already in the
+        graph."""
+        if not self.contains_vertex(label):
+            raise AttributeError(f"Label {label} not in the graph.")
+        return self._vertex_view(self._rows[label])
+
+    def remove_vertex(self, label: Any) -> bool:
+        """Return True if the vertex was removed, False otherwise.
+
+        Renumbers the rows after the vertex in O(V + E).
+        """
+        if not self.contains_vertex(label):
+            return False
+        self._flush()
+        removed = self._rows[label]
+        rows = np.repeat(np.arange(len(self._labels)), np.diff(self._indptr))
+        indices = self._indices.astype(np.int64)
+        kept = (rows != removed) & (indices != removed)
+        if self.is_directed():
+            self._edge_count -= int(np.count_nonzero(~kept))
+        else:
+            self._edge_count -= int(np.count_nonzero(~kept &
+                                                     (rows <= indices)))
+
+        # shift the rows after the removed one
+        rows, indices = rows[kept], indices[kept]
+        rows[rows > removed] -= 1
+        indices[indices > removed] -= 1
+        self._labels.pop(removed)
+        self._rows = {label: row for row, label in enumerate(self._labels)}
+        self._set_arrays(rows, indices, self._weights[kept])
+        self._vertex_marks = {row - (row > removed)
+                              for row in self._vertex_marks
+                              if row != removed}
+        self._edge_marks = {(one - (one > removed), other - (other > removed))
+                            for one, other in self._edge_marks
+                            if removed not in (one, other)}
+        self._size -= 1
+        return True
+
+    # Methods related to edges
+
+    def add_edge(self, from_label: Any, to_label: Any,
+                 weight: Union[int, float]):
+        """Connect the vertices with an edge with the given weight.
+
+        :param from_label:
+        :param to_label:
+        :param weight:
+
+        :raise AttributeError: if the vertices are not already in the graph
+        or they are already connected.
+        """
+        from_vertex = self.get_vertex(from_label)
+        to_vertex = self.get_vertex(to_label)
+        if self.get_edge(from_label, to_label):
+            raise AttributeError(f"An edge already connects "
+                                 f"{from_label} and {to_label}")
+        from_vertex.add_edge_to(to_vertex, weight)
+
+    def add_edges(self, edges: Iterable):
+        """Connect the vertices of every edge, adding the vertices which are
+        not in the graph yet.
+
+        The edges are merged into the arrays at once, with no staging.
+
+        :param edges: iterable of (from label, to label, weight) tuples
+        :raise AttributeError: if the vertices of an edge are already
+        connected (no edge is added then, the new vertices stay).
+        """
+        from_rows, to_rows, weights = [], [], []
+        for from_label, to_label, weight in edges:
+            for label in (from_label, to_label):
+                if label not in self._rows:
+                    self.add_vertex(label)
+            from_rows.append(self._rows[from_label])
+            to_rows.append(self._rows[to_label])
+            weights.append(weight)
+        from_rows = np.array(from_rows, dtype=np.int64)
+        to_rows = np.array(to_rows, dtype=np.int64)
+        weights = weight_array(weights)
+        edge_n = len(weights)
+        if not self.is_directed():
+            # the other direction of every edge but the self loops
+            loops = from_rows == to_rows
+            from_rows, to_rows = (np.concatenate((from_rows, to_rows[~loops])),
+                                  np.concatenate((to_rows, from_rows[~loops])))
+            weights = np.concatenate((weights, weights[~loops]))
+
+        self._flush()
+        rows = np.concatenate((np.repeat(np.arange(len(self._labels)),
+                                         np.diff(self._indptr)), from_rows))
+        indices = np.concatenate((self._indices, to_rows))
+        keys = rows * len(self._labels) + indices
+        if len(np.unique(keys)) < len(keys):
+            raise AttributeError("An edge connects already connected "
+                                 "vertices.")
+        self._set_arrays(rows, indices,
+                         np.concatenate((self._weights, weights)))
+        self._edge_count += edge_n
+
+    def contains_edge(self, from_label: Any, to_label: Any) -> bool:
+        """Return True if an edge connects the vertices, False otherwise."""
+        return self.get_edge(from_label, to_label) is not None
+
+    def get_edge(self, from_label: Any, to_label: Any) -> CompactEdge:
+        """Return the edge connecting the two vertices.
+
+        Return None if no edge exists.
+        :raise AttributeError: if the vertices are not already in the graph.
+        """
+        from_vertex = self.get_vertex(from_label)
+        to_vertex = self.get_vertex(to_label)
+        return from_vertex.get_edge_to(to_vertex)
+
+    def remove_edge(self, from_label: Any, to_label: Any) -> bool:
+        """Return True if the edge was removed, False otherwise.
+
+        :raise AttributeError: if the vertices are not already in the graph.
+        """
+        from_vertex = self.get_vertex(from_label)
+        to_vertex = self.get_vertex(to_label)
+        return from_vertex.remove_edge_to(to_vertex)
+
+    # Iterators
+
+    def __iter__(self) -> Iterator:
+        """Iterate over a view of self (the vertices)."""
+        return self.vertices()
+
+    def edges(self) -> Iterator:
+        """Iterate over the edges in the graph (each one once)."""
+        self._flush()
+        directed = self.is_directed()
+        rows = np.repeat(np.arange(len(self._labels)), np.diff(self._indptr))
+        for pos, (row, to_row) in enumerate(zip(rows.tolist(),
+                                                self._indices.tolist())):
+            if directed or row <= to_row:
+                yield self._edge_view(row, to_row, pos)
+
+    def vertices(self) -> Iterator:
+        """Iterate over the vertices in the graph."""
+        return map(self._vertex_view, range(len(self._labels)))
+
+    def incident_edges(self, label: Any) -> Iterator:
+        """Iterate over the incident edges of the given vertex.
+
+        :raise AttributeError: if a vertex with label is not already in the
+        graph.
+        """
+        return self.get_vertex(label).incident_edges()
+
+    def neighboring_vertices(self, label: Any) -> Iterator:
+        """Iterate over the neighboring vertices of the given vertex.
+
+        :raise AttributeError: if a vertex with label is not already in the
+        graph.
+        """
+        return self.get_vertex(label).neighboring_vertices()
+
+    # Conversion
+
+    @staticmethod
+    def from_linked(graph: LinkedGraph) -> CompactGraph:
+        """Convert the linked graph to the compact graph of the same kind.
+
+        The labels, their order, the edges, the weights and the marks are
+        kept.
+        """
+        compact = CompactDirectedGraph() if graph.is_directed() \
+            else CompactGraph()
+        for vertex in graph.vertices():
+            compact.add_vertex(vertex.get_label())
+            if vertex.is_marked():
+                compact._vertex_marks.add(len(compact) - 1)
+
+        rows, indices, weights = [], [], []
+        for row, vertex in enumerate(graph.vertices()):
+            for edge in vertex.incident_edges():
+                to_row = compact._rows[edge.get_other_vertex(vertex)
+                                       .get_label()]
+                rows.append(row)
+                indices.append(to_row)
+                weights.append(edge.get_weight())
+                if edge.is_marked():
+                    compact._edge_marks.add(compact._edge_key(row, to_row))
+        compact._set_arrays(np.array(rows, dtype=np.int64),
+                            np.array(indices, dtype=np.int64),
+                            weight_array(weights))
+        compact._edge_count = graph.size_edges()
+        return compact
+
+    def to_linked(self) -> LinkedGraph:
+        """Convert the graph to the linked graph of the same kind.
+
+        The labels, their order, the edges, the weights and the marks are
+        kept.
+        """
+        graph = LinkedDirectedGraph() if self.is_directed() else LinkedGraph()
+        for row, label in enumerate(self._labels):
+            graph.add_vertex(label)
+            if row in self._vertex_marks:
+                graph.get_vertex(label).set_mark()
+        for edge in self.edges():
+            from_vertex, to_vertex = edge.get_vertices()
+            graph.add_edge(from_vertex.get_label(), to_vertex.get_label(),
+                           edge.get_weight())
+            if edge.is_marked():
+                graph.get_edge(from_vertex.get_label(),
+                               to_vertex.get_label()).set_mark()
+        return graph
+
+
+class CompactDirectedGraph(CompactGraph):
+    """Represent a directed graph kept in arrays.
+
+    A graph has a count of vertices, a count of edges, a list of labels by
+    row, a dictionary of label/row pairs and the CSR arrays of the edges.
+    """
+
+    _vertex_type = CompactDirectedVertex
+    _edge_type = CompactDirectedEdge
+
+    def is_directed(self) -> bool:
+        """Return True if the edges of the graph are directed."""
+        return True
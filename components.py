@@ -0,0 +1,186 @@
+"""All-pairs shortest paths split by the components of the graph.
+
+The vertices are split into the strongly connected components of a directed
+graph (the connected ones of an undirected graph) and every component is
+solved on its own by a dense engine, so the work is the sum of the cubes of
+their sizes instead of the cube of the number of vertices, and the
+components can be solved by a pool of processes at once.
+
+No path leads back from a component to one it was reached from, so the
+components form an acyclic graph (the condensation). The weights between
+the components are found from it on demand, for the rows of one component
+at a time, in its topological order: the paths entering a component over
+its incoming edges are extended by the weights inside it. In an undirected
+graph there are no such paths, those weights are all inf.
+"""
+import numpy as np
+from multiprocessing import Pool
+from typing import Any
+from closure import strong_components
+from engines import ENGINES, DEFAULT_ENGINE
+from graph import LinkedGraph
+from labelindex import LabelIndex
+from sparse import csr_adjacency
+
+
+def _solve_block(engine: str, block: np.array, round_pos: int) -> np.array:
+    """Run the engine on the weight matrix of a component."""
+    return ENGINES[engine](block, round_pos)
+
+
+class ComponentAllPairs:
+    """Represent the shortest path weights of a graph as the dense weights
+    inside every component, the weights between the components are found
+    when they are first read.
+    """
+
+    def __init__(self, graph: LinkedGraph, round_pos: int,
+                 engine: str = DEFAULT_ENGINE, workers: int = 1):
+        """Split the graph into its components and solve each of them.
+
+        :param graph: the graph (linked or compact)
+        :param round_pos: number of positions to round every sum to
+        :param engine: name of one of engines.ENGINES to solve the
+        components with
+        :param workers: number of processes solving the components at once
+        :raise ValueError: if there is no engine with such name
+        :raise NegativeCycleError: if the graph has a negative cycle
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine}, choose one of: "
+                             f"{', '.join(ENGINES)}")
+        indptr, indices, weights, self._labels = csr_adjacency(graph)
+        self._round_pos = round_pos
+        vert_n = len(self._labels)
+        self._component, count = strong_components(indptr, indices)
+
+        # the rows of every component and the positions of the rows in them
+        order = np.argsort(self._component, kind="stable")
+        starts = np.searchsorted(self._component[order],
+                                 np.arange(count + 1))
+        self._members = [order[starts[i]:starts[i + 1]]
+                         for i in range(count)]
+        self._local = np.empty(vert_n, dtype=np.int64)
+        for members in self._members:
+            self._local[members] = np.arange(len(members))
+
+        # the edges inside the components, grouped by the component
+        sources = np.repeat(np.arange(vert_n), np.diff(indptr))
+        inside = self._component[sources] == self._component[indices]
+        by_component = np.argsort(self._component[sources[inside]],
+                                  kind="stable")
+        inner = [array[inside][by_component]
+                 for array in (sources, indices, weights)]
+        inner_starts = np.searchsorted(self._component[inner[0]],
+                                       np.arange(count + 1))
+        blocks = []
+        for component, members in enumerate(self._members):
+            edges = slice(inner_starts[component],
+                          inner_starts[component + 1])
+            block = np.full((len(members), len(members)), np.inf)
+            block[self._local[inner[0][edges]],
+                  self._local[inner[1][edges]]] = inner[2][edges]
+            np.fill_diagonal(block, 0)
+            blocks.append(block)
+        if workers > 1 and count > 1:
+            with Pool(workers) as pool:
+                blocks = pool.starmap(_solve_block, [
+                    (engine, block, round_pos) for block in blocks])
+        else:
+            blocks = [_solve_block(engine, block, round_pos)
+                      for block in blocks]
+        self._blocks = blocks
+
+        # the edges between the components, grouped by the one they enter
+        between = ~inside
+        targets = indices[between]
+        by_target = np.argsort(self._component[targets], kind="stable")
+        self._entering = (sources[between][by_target], targets[by_target],
+                          weights[between][by_target])
+        self._entering_starts = np.searchsorted(
+            self._component[targets][by_target], np.arange(count + 1))
+        self._entered = np.flatnonzero(np.diff(self._entering_starts))
+        # the rows of the components whose weights to others were found
+        self._found = {}
+
+    def get_label_index(self) -> LabelIndex:
+        """Return the label index of the rows."""
+        return self._labels
+
+    def get_row(self, label: Any) -> int:
+        """Return the row of the vertex with label.
+
+        :raise AttributeError: if there is no vertex with label.
+        """
+        return self._labels.get_row(label)
+
+    def get_components(self) -> list:
+        """Return the arrays of the rows of every component, in a reverse
+        topological order of the condensation."""
+        return self._members
+
+    def get_block(self, component: int) -> np.array:
+        """Return the shortest path weights inside the component, its rows
+        in the order of get_components."""
+        return self._blocks[component]
+
+    def _find_rows(self, component: int) -> np.array:
+        """Return the shortest path weights from the vertices of the
+        component to all the vertices."""
+        members = self._members[component]
+        rows = np.full((len(members), len(self._labels)), np.inf)
+        rows[:, members] = self._blocks[component]
+        sources, targets, weights = self._entering
+        # the components it leads to have lower numbers, only the entered
+        # ones may be reached
+        entered = self._entered[:np.searchsorted(self._entered, component)]
+        for other in entered[::-1].tolist():
+            edges = slice(*self._entering_starts[other:other + 2])
+            sums = np.round(rows[:, sources[edges]] + weights[edges],
+                            self._round_pos)
+            if np.isinf(sums).all():
+                continue
+            # the best weight of entering every vertex of the other one
+            entries = np.full((len(members), len(self._members[other])),
+                              np.inf)
+            np.minimum.at(entries.T, self._local[targets[edges]], sums.T)
+            block = self._blocks[other]
+            through = rows[:, self._members[other]]
+            for entry in np.flatnonzero(np.isfinite(entries).any(axis=0)):
+                np.minimum(through, np.round(
+                    entries[:, entry, np.newaxis] + block[entry],
+                    self._round_pos), out=through)
+            rows[:, self._members[other]] = through
+        return rows
+
+    def _component_rows(self, component: int) -> np.array:
+        """Return the rows of the component found at the first call."""
+        rows = self._found.get(component)
+        if rows is None:
+            rows = self._found[component] = self._find_rows(component)
+        return rows
+
+    def distance(self, from_label: Any, to_label: Any) -> float:
+        """Return the shortest path weight between the vertices.
+
+        The first weight from a component to another one finds the weights
+        of all its vertices to all the vertices in O(V² + E) at most.
+        :raise AttributeError: if the vertices are not in the graph.
+        """
+        from_row, to_row = self.get_row(from_label), self.get_row(to_label)
+        component = self._component[from_row]
+        if self._component[to_row] == component:
+            return self._blocks[component][self._local[from_row],
+                                           self._local[to_row]]
+        return self._component_rows(component)[self._local[from_row], to_row]
+
+    def get_matrix(self) -> np.array:
+        """Return the shortest path weights between all the vertices as a
+        dense matrix (finding all of them)."""
+        vert_n = len(self._labels)
+        matrix = np.empty((vert_n, vert_n))
+        for component, members in enumerate(self._members):
+            rows = self._found.get(component)
+            matrix[members] = rows if rows is not None \
+                else self._find_rows(component)
+        return matrix
@@ -0,0 +1,996 @@
+"""Floyd-Warshall engines working on dense weight matrices.
+
+Every engine takes a square weight matrix (inf for no connection, 0 on the
+diagonal), relaxes it in place and returns it. The sums are rounded to
+round_pos positions on every relaxation, as the original algorithm does.
+
+The matrix can be of any of DTYPES. An integer matrix represents no
+connection by a saturating sentinel (see infinity) and is relaxed exactly,
+with no rounding.
+
+Optionally an engine fills a successor matrix during the same relaxation:
+next_hop[i, j] is the row of the vertex following i on the shortest path
+from i to j (-1 if there is no path), see init_next_hop and walk_path.
+
+A negative cycle shows up as a negative weight on the diagonal of its last
+vertex by the step of that vertex, so the engines check the diagonal during
+the run and stop there with NegativeCycleError. Optionally the run goes on
+instead and the pairs with a path through a negative cycle are marked -inf
+at its end (for float matrices).
+"""
+import mmap
+import numpy as np
+import os
+import tempfile
+from typing import Iterable, Iterator
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+
+# L2 cache size to assume when it can not be found out
+DEFAULT_L2_SIZE = 1024 * 1024
+# smallest tile worth the Python overhead of the blocked engine
+MIN_TILE = 32
+# successor of a vertex with no path to the destination
+NO_HOP = -1
+# dtypes a weight matrix can be of
+DTYPES = {
+    "float64": np.float64,
+    "float32": np.float32,
+    "int32": np.int32,
+    "uint16": np.uint16,
+}
+# memory the out-of-core engine may keep resident by default, in bytes
+MEMORY_BUDGET = 256 * 1024 * 1024
+# rows of a tile copied between releases of the mapped pages (the system
+# maps up to 64 kB of cached pages around every page touched)
+MAPPED_ROWS = 16
+
+
+class NegativeCycleError(ValueError):
+    """Raised when the graph has a negative cycle.
+
+    The rows of the vertices on the cycle are in its cycle attribute (only
+    the one found on the diagonal without a successor matrix, None if they
+    are not known), the number of the graph in a batch in its graph
+    attribute.
+    """
+
+    def __init__(self, cycle: list = None, graph: int = None):
+        """Create the error.
+
+        :param cycle: rows of the vertices on the cycle if known
+        :param graph: number of the graph in a batch (see floyd_batched)
+        """
+        where = "The graph" if graph is None else f"Graph {graph} of the batch"
+        if cycle is None:
+            super().__init__(f"{where} has a negative cycle.")
+        else:
+            super().__init__(f"{where} has a negative cycle through the "
+                             f"rows {cycle}.")
+        self.cycle = cycle
+        self.graph = graph
+
+    def __reduce__(self):
+        """Pickle the error by its attributes, so that it keeps them when
+        raised in a worker process."""
+        return NegativeCycleError, (self.cycle, self.graph)
+
+
+def infinity(dtype: np.dtype) -> float:
+    """Return the value representing no connection in a matrix of dtype.
+
+    That is inf for floats and half of the largest integer for integers, so
+    that the sum of two never overflows and is saturated back to it.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == "f":
+        return np.inf
+    return dtype.type(np.iinfo(dtype).max // 2)
+
+
+def cast_matrix(matrix: np.array, dtype: np.dtype) -> np.array:
+    """Return a copy of the weight matrix converted to dtype, with no
+    connections represented by the infinity of dtype.
+
+    :param matrix: 2D weight matrix
+    :param dtype: one of DTYPES
+    :raise ValueError: if a weight can not be represented exactly in an
+    integer dtype (is a fraction or out of range)
+    """
+    dtype = np.dtype(dtype)
+    missing = matrix == infinity(matrix.dtype)
+    if dtype.kind == "f":
+        result = matrix.astype(dtype)
+        result[missing] = np.inf
+        return result
+
+    present = matrix[~missing]
+    if present.size and (not np.array_equal(present, np.round(present)) or
+                         present.min() < np.iinfo(dtype).min or
+                         present.max() >= infinity(dtype)):
+        raise ValueError(f"The weights can not be represented as {dtype}, "
+                         f"they must be whole numbers between "
+                         f"{np.iinfo(dtype).min} and {infinity(dtype)}.")
+    result = np.empty(matrix.shape, dtype=dtype)
+    np.copyto(result, matrix, where=~missing, casting="unsafe")
+    result[missing] = infinity(dtype)
+    return result
+
+
+def init_next_hop(matrix: np.array) -> np.array:
+    """Create the successor matrix for the initial weight matrix.
+
+    It is int16 for less than 32767 vertices and int32 otherwise.
+
+    :param matrix: 2D weight matrix
+    :return: the successor matrix of the direct edges
+    """
+    vert_n = len(matrix)
+    dtype = np.int16 if vert_n < np.iinfo(np.int16).max else np.int32
+    next_hop = np.empty(matrix.shape, dtype=dtype)
+    next_hop[:] = np.arange(vert_n, dtype=dtype)
+    next_hop[matrix == infinity(matrix.dtype)] = NO_HOP
+    return next_hop
+
+
+def walk_path(next_hop: np.array, source: int, destination: int) -> list:
+    """Return the rows on the shortest path between two rows.
+
+    Takes O(path length) time.
+
+    :param next_hop: the successor matrix filled by an engine
+    :param source: row of the source vertex
+    :param destination: row of the destination vertex
+    :return: the list of rows from the source to the destination inclusive,
+    empty if there is no path
+    :raise ValueError: if the path runs into a negative cycle
+    """
+    if next_hop[source, destination] == NO_HOP:
+        return []
+    path = [source]
+    while source != destination:
+        source = int(next_hop[source, destination])
+        path.append(source)
+        if len(path) > len(next_hop):
+            raise ValueError("The path runs into a negative cycle.")
+    return path
+
+
+def negative_cycle(next_hop: np.array, vertex: int) -> list:
+    """Return the rows on the negative cycle through the vertex, following
+    the successors towards it.
+
+    :param next_hop: the successor matrix filled by an engine
+    :param vertex: row of a vertex with a negative diagonal weight
+    :return: the list of rows on the cycle, starting with vertex if the
+    successors lead back to it
+    """
+    path = [vertex]
+    positions = {vertex: 0}
+    row = int(next_hop[vertex, vertex])
+    while row != vertex and row != NO_HOP:
+        # the successors may run into another cycle on the way back
+        if row in positions:
+            return path[positions[row]:]
+        positions[row] = len(path)
+        path.append(row)
+        row = int(next_hop[row, vertex])
+    return path
+
+
+def mark_negative_cycles(matrix: np.array):
+    """Set the weights of all the pairs with a path through a negative cycle
+    to -inf in place.
+
+    Run on the final matrix of an engine: every vertex on a negative cycle
+    has a negative weight on the diagonal by then, and the weights which
+    are not inf tell which vertex reaches which.
+
+    :param matrix: 2D float matrix of path weights
+    """
+    cycles = np.flatnonzero(matrix.diagonal() < 0)
+    if not len(cycles):
+        return
+    # a pair goes through a cycle if the source reaches a vertex on it which
+    # reaches the destination, the product counts such vertices
+    to_cycles = (matrix[:, cycles] != np.inf).astype(np.float32)
+    from_cycles = (matrix[cycles, :] != np.inf).astype(np.float32)
+    matrix[to_cycles @ from_cycles > 0] = -np.inf
+
+
+def _check_diagonal(matrix: np.array, start: int, diagonal: np.array,
+                    next_hop: np.array, mark_negative: bool):
+    """Stop the run at a negative cycle unless the pairs through the cycles
+    are marked at its end.
+
+    :param matrix: 2D matrix being relaxed
+    :param start: row of the first vertex of the diagonal part
+    :param diagonal: part of the diagonal of the matrix to check
+    :param next_hop: successor matrix if the run fills it
+    :param mark_negative: whether the pairs through the cycles are marked
+    :raise NegativeCycleError: if there is a negative weight on the diagonal
+    and the pairs are not marked (always for integer matrices)
+    """
+    if mark_negative and matrix.dtype.kind == "f":
+        return
+    found = np.flatnonzero(diagonal < 0)
+    if not len(found):
+        return
+    vertex = int(found[0]) + start
+    raise NegativeCycleError(negative_cycle(next_hop, vertex)
+                             if next_hop is not None else [vertex])
+
+
+def floyd_reference(matrix: np.array, round_pos: int,
+                    next_hop: np.array = None,
+                    mark_negative: bool = False) -> np.array:
+    """Run Floyd-Warshall as three nested Python loops.
+
+    Slow, kept as the reference every other engine is checked against.
+
+    :param matrix: 2D weight matrix, modified in place
+    :param round_pos: number of positions to round every sum to
+    :param next_hop: successor matrix to update in place if given
+    :param mark_negative: whether to mark the pairs through negative cycles
+    -inf instead of stopping
+    :return: the matrix of shortest path weights
+    :raise NegativeCycleError: if the graph has a negative cycle
+    """
+    vert_n = len(matrix)
+    no_edge = infinity(matrix.dtype)
+    exact = matrix.dtype.kind != "f"
+    for k in range(vert_n):
+        for i in range(vert_n):
+            for ii in range(vert_n):
+                via_col, via_row = matrix[i, k], matrix[k, ii]
+                if not exact:
+                    new_sum = round(via_col + via_row, round_pos)
+                elif no_edge in (via_col, via_row):
+                    new_sum = no_edge
+                else:
+                    new_sum = min(via_col + via_row, no_edge)
+                if matrix[i, ii] > new_sum:
+                    matrix[i, ii] = new_sum
+                    if next_hop is not None:
+                        next_hop[i, ii] = next_hop[i, k]
+        _check_diagonal(matrix, k, matrix[k, k:k + 1], next_hop,
+                        mark_negative)
+    if mark_negative and matrix.dtype.kind == "f":
+        mark_negative_cycles(matrix)
+    return matrix
+
+
+def _relax(target: np.array, via_col: np.array, via_row: np.array,
+           new_sums: np.array, round_pos: int, hops: np.array = None,
+           via_hops: np.array = None):
+    """Relax the target block through one vertex k.
+
+    :param target: block of the matrix to relax in place
+    :param via_col: weights from the block rows to k
+    :param via_row: weights from k to the block columns
+    :param new_sums: buffer of the target shape for the sums
+    :param round_pos: number of positions to round every sum to
+    :param hops: block of the successor matrix to update if given
+    :param via_hops: successors on the way to k, broadcastable to hops
+    """
+    via_col, via_row = via_col[:, np.newaxis], via_row[np.newaxis, :]
+    np.add(via_col, via_row, out=new_sums)
+    if new_sums.dtype.kind == "f":
+        np.round(new_sums, round_pos, out=new_sums)
+    else:
+        _saturate(new_sums, via_col, via_row)
+    if hops is None:
+        # fmin ignores nan (inf + -inf) just like the reference comparison
+        np.fmin(target, new_sums, out=target)
+    else:
+        improved = new_sums < target
+        np.copyto(target, new_sums, where=improved)
+        np.copyto(hops, via_hops, where=improved)
+
+
+def _saturate(new_sums: np.array, via_col: np.array, via_row: np.array):
+    """Set the integer sums through a missing connection or reaching the
+    infinity to the infinity in place.
+
+    :param new_sums: sums of via_col and via_row
+    :param via_col: weights from the block rows to k, broadcast along the
+    columns of new_sums
+    :param via_row: weights from k to the block columns, broadcast along the
+    rows of new_sums
+    """
+    no_edge = infinity(new_sums.dtype)
+    np.minimum(new_sums, no_edge, out=new_sums)
+    # with no negative weights a sum through the infinity is at least it
+    if new_sums.dtype.kind != "u":
+        np.copyto(new_sums, no_edge,
+                  where=(via_col == no_edge) | (via_row == no_edge))
+
+
+def floyd_vectorized(matrix: np.array, round_pos: int,
+                     next_hop: np.array = None,
+                     mark_negative: bool = False) -> np.array:
+    """Run Floyd-Warshall doing every k-step as one whole-array broadcast.
+
+    Row k and column k never change during step k (the diagonal is never
+    negative without a negative cycle), so relaxing all the pairs at once
+    gives the same result as the reference loop.
+
+    :param matrix: 2D weight matrix, modified in place
+    :param round_pos: number of positions to round every sum to
+    :param next_hop: successor matrix to update in place if given
+    :param mark_negative: whether to mark the pairs through negative cycles
+    -inf instead of stopping
+    :return: the matrix of shortest path weights
+    :raise NegativeCycleError: if the graph has a negative cycle
+    """
+    vert_n = len(matrix)
+    new_sums = np.empty_like(matrix)
+    for k in range(vert_n):
+        via_hops = None if next_hop is None else next_hop[:, k, np.newaxis]
+        _relax(matrix, matrix[:, k], matrix[k, :], new_sums, round_pos,
+               next_hop, via_hops)
+        # a cycle is on the diagonal of its last vertex after its step
+        if matrix[k, k] < 0:
+            _check_diagonal(matrix, k, matrix[k, k:k + 1], next_hop,
+                            mark_negative)
+    if mark_negative and matrix.dtype.kind == "f":
+        mark_negative_cycles(matrix)
+    return matrix
+
+
+def l2_cache_size() -> int:
+    """Return the size of the L2 cache in bytes (a guess if unknown)."""
+    try:
+        size = os.sysconf("SC_LEVEL2_CACHE_SIZE")
+        if size > 0:
+            return size
+    except (ValueError, OSError, AttributeError):
+        pass
+    try:
+        with open("/sys/devices/system/cpu/cpu0/cache/index2/size") as file:
+            size = file.read().strip()
+        multiplier = {"K": 1024, "M": 1024 * 1024}.get(size[-1], 1)
+        return int(size.rstrip("KM")) * multiplier
+    except (OSError, ValueError, IndexError):
+        return DEFAULT_L2_SIZE
+
+
+def tune_tile(itemsize: int = 8) -> int:
+    """Return the tile side so that three tiles (the target, the sums and
+    the panels) fit the L2 cache together.
+
+    :param itemsize: size of one matrix element in bytes
+    """
+    tile = int((l2_cache_size() / (3 * itemsize)) ** 0.5)
+    return max(MIN_TILE, tile - tile % 8)
+
+
+# tile side of the parallel engine for float64 matrices, tuned once at startup
+TILE = tune_tile()
+
+
+def band_rows(vert_n: int, itemsize: int = 8) -> int:
+    """Return the number of rows of a band of the blocked engine so that the
+    band, its sums and the kept rows fit the L2 cache together.
+
+    The band is at most the tile side and a multiple of 8 rows, it shrinks
+    with the rows as they get longer (8 rows of 8000 float64 weights with
+    a 2 MB cache) down to a single row.
+
+    :param vert_n: number of vertices
+    :param itemsize: size of one matrix element in bytes
+    """
+    rows = l2_cache_size() // (3 * itemsize * max(vert_n, 1))
+    if rows > 8:
+        rows -= rows % 8
+    return max(1, min(rows, tune_tile(itemsize)))
+
+
+def floyd_blocked(matrix: np.array, round_pos: int,
+                  next_hop: np.array = None, tile: int = None,
+                  mark_negative: bool = False) -> np.array:
+    """Run the blocked (tiled) Floyd-Warshall.
+
+    For every block K of tile vertices the work is done in two phases:
+    1. the row panel (K, :) is relaxed through the vertices of K in turn,
+    which needs nothing outside the panel, keeping the row of every k as it
+    was at its step;
+    2. every other band of tile rows (I, :) is relaxed through the vertices
+    of K, one broadcast against the kept row of k each, so the band stays in
+    the cache for all of them instead of streaming the whole matrix for
+    each k.
+    Every pair sees the same sums in the same order as in floyd_vectorized,
+    and gets the same successor on ties (a successor taken from a later
+    state could lead around a zero weight cycle).
+
+    :param matrix: 2D weight matrix, modified in place
+    :param round_pos: number of positions to round every sum to
+    :param next_hop: successor matrix to update in place if given
+    :param tile: number of vertices in a block and rows in a band, fit to
+    the L2 cache if not given (see band_rows)
+    :param mark_negative: whether to mark the pairs through negative cycles
+    -inf instead of stopping
+    :return: the matrix of shortest path weights
+    :raise NegativeCycleError: if the graph has a negative cycle
+    """
+    vert_n = len(matrix)
+    tile = tile or band_rows(vert_n, matrix.itemsize)
+    tile = max(1, min(tile, vert_n))
+    blocks = [slice(start, min(start + tile, vert_n))
+              for start in range(0, vert_n, tile)]
+    band_sums = np.empty((tile, vert_n), dtype=matrix.dtype)
+    # the row of every k of K at its step
+    rows = np.empty((tile, vert_n), dtype=matrix.dtype)
+
+    hops = next_hop is not None
+    marks = mark_negative and matrix.dtype.kind == "f"
+    for block_k in blocks:
+        size_k = block_k.stop - block_k.start
+        k_range = range(block_k.start, block_k.stop)
+        cycle = None
+        # phase 1: the row panel
+        panel = matrix[block_k]
+        panel_hops = next_hop[block_k] if hops else None
+        for k in k_range:
+            if matrix[k, k] < 0 and not marks:
+                # the rest is relaxed through the vertices before k only,
+                # so the successors from k lead around the cycle
+                cycle = k
+                k_range = range(block_k.start, k)
+                break
+            rows[k - block_k.start] = matrix[k]
+            _relax(panel, panel[:, k], matrix[k], band_sums[:size_k],
+                   round_pos, panel_hops,
+                   panel_hops[:, k, np.newaxis] if hops else None)
+
+        # phase 2: all the other bands of rows
+        for block_i in blocks:
+            if block_i is block_k:
+                continue
+            band = matrix[block_i]
+            band_hops = next_hop[block_i] if hops else None
+            for k in k_range:
+                _relax(band, band[:, k], rows[k - block_k.start],
+                       band_sums[:block_i.stop - block_i.start], round_pos,
+                       band_hops,
+                       band_hops[:, k, np.newaxis] if hops else None)
+        if cycle is not None:
+            _check_diagonal(matrix, cycle, matrix[cycle, cycle:cycle + 1],
+                            next_hop, False)
+    if marks:
+        mark_negative_cycles(matrix)
+    return matrix
+
+
+# state of a parallel engine worker process: the shared memory blocks, the
+# matrix, the successor matrix (or None) and the rows of the block of
+# vertices on them, the rounding and the tile
+_shared = None
+
+
+def _share(array: np.array) -> (SharedMemory, np.array):
+    """Copy the array into a new shared memory block.
+
+    :return: a tuple of the block and the array on it
+    """
+    memory = SharedMemory(create=True, size=max(1, array.nbytes))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)
+    shared[:] = array
+    return memory, shared
+
+
+def _attach_shared(specs: list, round_pos: int, tile: int):
+    """Attach a worker process to the shared distance and successor matrices
+    and the rows of the block of vertices.
+
+    :param specs: (name, shape, dtype) of every shared block, None for the
+    successor matrix if there is none
+    :param round_pos: number of positions to round every sum to
+    :param tile: number of rows in a strip
+    """
+    global _shared
+    blocks, arrays = [], []
+    for spec in specs:
+        if spec is None:
+            arrays.append(None)
+            continue
+        name, shape, dtype = spec
+        blocks.append(SharedMemory(name=name))
+        arrays.append(np.ndarray(shape, dtype=dtype, buffer=blocks[-1].buf))
+    _shared = blocks, *arrays, round_pos, tile
+
+
+def _relax_rows(task: (int, int, int, int)):
+    """Relax the rows [start, stop) of the shared matrix through the
+    vertices [k_start, k_stop), whose rows at their steps must already be
+    in the shared rows of the block.
+
+    The rows are processed by strips of tile rows so that a strip stays in
+    the cache for all the vertices.
+    """
+    start, stop, k_start, k_stop = task
+    _, matrix, next_hop, block_rows, round_pos, tile = _shared
+    hops = next_hop is not None
+    new_sums = np.empty((tile, len(matrix)), dtype=matrix.dtype)
+    # the sums around a negative cycle may overflow to -inf when it is
+    # marked, and inf + -inf is nan, which the relaxation skips
+    with np.errstate(invalid="ignore", over="ignore"):
+        for strip_start in range(start, stop, tile):
+            strip = slice(strip_start, min(strip_start + tile, stop))
+            strip_sums = new_sums[:strip.stop - strip.start]
+            for k in range(k_start, k_stop):
+                _relax(matrix[strip], matrix[strip, k],
+                       block_rows[k - k_start], strip_sums, round_pos,
+                       next_hop[strip] if hops else None,
+                       next_hop[strip, k, np.newaxis] if hops else None)
+
+
+def floyd_parallel(matrix: np.array, round_pos: int,
+                   next_hop: np.array = None, workers: int = None,
+                   tile: int = None, mark_negative: bool = False) -> np.array:
+    """Run Floyd-Warshall in a pool of processes over a shared matrix.
+
+    The matrix (and the successor matrix) is copied once into shared memory.
+    For every block K of tile vertices the row panel (K, :) is relaxed here,
+    then the rest of the rows are split between the workers, which relax
+    them through K in place. They take the row of every k as it was at its
+    step, so every pair sees the same sums as in floyd_vectorized and gets
+    the same successor on ties. Waiting for all the workers is the barrier
+    before the next block.
+
+    :param matrix: 2D weight matrix, modified in place
+    :param round_pos: number of positions to round every sum to
+    :param next_hop: successor matrix to update in place if given
+    :param workers: number of processes (the number of CPUs by default)
+    :param tile: number of vertices between barriers (and rows in a strip)
+    :param mark_negative: whether to mark the pairs through negative cycles
+    -inf instead of stopping
+    :return: the matrix of shortest path weights
+    :raise NegativeCycleError: if the graph has a negative cycle
+    """
+    vert_n = len(matrix)
+    workers = workers or os.cpu_count() or 1
+    if tile is None:
+        tile = TILE if matrix.itemsize == 8 else tune_tile(matrix.itemsize)
+    tile = max(1, min(tile, vert_n))
+    bounds = np.linspace(0, vert_n, workers + 1).astype(int)
+
+    hops = next_hop is not None
+    marks = mark_negative and matrix.dtype.kind == "f"
+    memory, shared = _share(matrix)
+    hops_memory, shared_hops = _share(next_hop) if hops else (None, None)
+    rows_memory, block_rows = _share(np.empty((tile, vert_n),
+                                              dtype=matrix.dtype))
+    specs = [(block.name, array.shape, array.dtype.str) if block else None
+             for block, array in ((memory, shared),
+                                  (hops_memory, shared_hops),
+                                  (rows_memory, block_rows))]
+    try:
+        panel_sums = np.empty((tile, vert_n), dtype=matrix.dtype)
+        with Pool(workers, initializer=_attach_shared,
+                  initargs=(specs, round_pos, tile)) as pool:
+            for k_start in range(0, vert_n, tile):
+                k_stop = min(k_start + tile, vert_n)
+                panel = slice(k_start, k_stop)
+                cycle, via_stop = None, k_stop
+                for k in range(k_start, k_stop):
+                    if shared[k, k] < 0 and not marks:
+                        # the other rows are relaxed through the vertices
+                        # before k only, so the successors from k lead
+                        # around the cycle
+                        cycle, via_stop = k, k
+                        break
+                    block_rows[k - k_start] = shared[k]
+                    _relax(shared[panel], shared[panel, k], shared[k],
+                           panel_sums[:k_stop - k_start], round_pos,
+                           shared_hops[panel] if hops else None,
+                           shared_hops[panel, k, np.newaxis] if hops
+                           else None)
+
+                # split the other rows between the workers
+                tasks = []
+                for start, stop in zip(bounds[:-1], bounds[1:]):
+                    for part in ((start, min(stop, k_start)),
+                                 (max(start, k_stop), stop)):
+                        if part[0] < part[1]:
+                            tasks.append((*part, k_start, via_stop))
+                pool.map(_relax_rows, tasks)
+                if cycle is not None:
+                    _check_diagonal(shared, cycle,
+                                    shared[cycle, cycle:cycle + 1],
+                                    shared_hops, False)
+        matrix[:] = shared
+        if hops:
+            next_hop[:] = shared_hops
+        if marks:
+            mark_negative_cycles(matrix)
+    finally:
+        # the views must be released before the memory is closed
+        shared = shared_hops = block_rows = None
+        for block in (memory, hops_memory, rows_memory):
+            if block is not None:
+                block.close()
+                block.unlink()
+    return matrix
+
+
+def stack_matrices(matrices: Iterable,
+                   dtype: np.dtype = np.float64) -> (np.array, list):
+    """Stack weight matrices of any sizes into one batch for floyd_batched.
+
+    The smaller matrices are padded with vertices with no connections, which
+    change no weight. The diagonal is set to 0, so the weight matrices of
+    the interactive input (no connection there) can be stacked as they are.
+
+    :param matrices: 2D weight matrices, the infinity of their dtypes for
+    no connection
+    :param dtype: one of DTYPES
+    :return: a tuple of the (B, V, V) batch, V being the largest size, and
+    the list of the sizes of the matrices
+    :raise ValueError: if a weight can not be represented in dtype
+    """
+    matrices = list(matrices)
+    sizes = [len(matrix) for matrix in matrices]
+    vert_n = max(sizes, default=0)
+    batch = np.full((len(matrices), vert_n, vert_n), infinity(dtype),
+                    dtype=dtype)
+    for graph, matrix in enumerate(matrices):
+        batch[graph, :len(matrix), :len(matrix)] = cast_matrix(matrix, dtype)
+    diagonal = np.arange(vert_n)
+    batch[:, diagonal, diagonal] = 0
+    return batch, sizes
+
+
+def batch_chunk(vert_n: int, itemsize: int = 8, budget: int = None) -> int:
+    """Return the number of graphs of vert_n vertices relaxed together so
+    that their matrices and sums fit the budget.
+
+    :param vert_n: number of vertices of every graph
+    :param itemsize: size of one matrix element in bytes
+    :param budget: memory of the matrices and the sums in bytes, half the
+    size of the L2 cache by default (chunks filling all of it are evicted
+    by the rows and columns of the step and run slower than the graphs one
+    by one)
+    :return: the number of graphs, less than 2 if the graphs are too large
+    to gain from being relaxed together
+    """
+    budget = budget or l2_cache_size() // 2
+    return budget // (2 * itemsize * max(vert_n, 1) ** 2)
+
+
+def _batch_cycle(weights: np.array, round_pos: int,
+                 graph: int) -> NegativeCycleError:
+    """Return the error of a graph of a batch with a negative cycle, the
+    cycle found again by the vectorized engine with the successors.
+
+    :param weights: 2D weight matrix of the graph, modified in place
+    :param round_pos: number of positions to round every sum to
+    :param graph: number of the graph in the batch
+    """
+    try:
+        floyd_vectorized(weights, round_pos, init_next_hop(weights))
+    except NegativeCycleError as error:
+        return NegativeCycleError(error.cycle, graph)
+    return NegativeCycleError(None, graph)
+
+
+def floyd_batched(batch: np.array, round_pos: int,
+                  chunk: int = None) -> np.array:
+    """Run Floyd-Warshall on a batch of graphs at once.
+
+    Every k-step is one broadcast over a chunk of graphs, so small graphs
+    share the Python overhead of a step instead of paying it one by one.
+    A chunk is relaxed through all its vertices before the next one, and
+    mostly stays in the cache meanwhile. Graphs too large for two of them
+    to fit the cache are relaxed one by one by the vectorized engine.
+
+    :param batch: (B, V, V) stack of weight matrices (see stack_matrices),
+    modified in place
+    :param round_pos: number of positions to round every sum to
+    :param chunk: number of graphs relaxed together, see batch_chunk if not
+    given
+    :return: the (B, V, V) stack of the shortest path weights
+    :raise NegativeCycleError: if a graph has a negative cycle, with the
+    number of the graph and the rows of its cycle
+    """
+    graph_n, vert_n = batch.shape[:2]
+    chunk = chunk or batch_chunk(vert_n, batch.itemsize)
+    if chunk < 2:
+        for graph, matrix in enumerate(batch):
+            weights = matrix.copy()
+            try:
+                floyd_vectorized(matrix, round_pos)
+            except NegativeCycleError:
+                raise _batch_cycle(weights, round_pos, graph)
+        return batch
+    exact = batch.dtype.kind != "f"
+    sums = np.empty((min(chunk, graph_n), vert_n, vert_n), dtype=batch.dtype)
+    # the weights of the chunk, to find the cycle of a graph again
+    weights = np.empty_like(sums)
+    for start in range(0, graph_n, chunk):
+        graphs = batch[start:start + chunk]
+        chunk_sums = sums[:len(graphs)]
+        weights[:len(graphs)] = graphs
+        for k in range(vert_n):
+            via_col = graphs[:, :, k, np.newaxis]
+            via_row = graphs[:, np.newaxis, k, :]
+            np.add(via_col, via_row, out=chunk_sums)
+            if not exact:
+                np.round(chunk_sums, round_pos, out=chunk_sums)
+            else:
+                _saturate(chunk_sums, via_col, via_row)
+            np.fmin(graphs, chunk_sums, out=graphs)
+            negative = np.flatnonzero(graphs[:, k, k] < 0)
+            if len(negative):
+                graph = int(negative[0])
+                raise _batch_cycle(weights[graph], round_pos, start + graph)
+    return batch
+
+
+def release_pages(array: np.array):
+    """Drop the pages of a memory-mapped array from the resident memory.
+
+    The changed pages stay in the page cache and are written to the file by
+    the system, so no data is lost. Does nothing for an in-memory array.
+    """
+    mapping = getattr(array, "_mmap", None)
+    if mapping is not None and hasattr(mmap, "MADV_DONTNEED"):
+        mapping.madvise(mmap.MADV_DONTNEED)
+
+
+def row_bands(matrix: np.array, budget: int = None) -> Iterator:
+    """Generate slices of consecutive rows of the matrix, a quarter of the
+    budget each (leaving room for temporary arrays). The pages of a
+    memory-mapped matrix are released after every band.
+
+    :param matrix: 2D matrix to go over
+    :param budget: memory to stay within in bytes, MEMORY_BUDGET by default
+    """
+    budget = budget or MEMORY_BUDGET
+    row_bytes = max(1, matrix.shape[1] * matrix.itemsize)
+    rows = max(1, budget // 4 // row_bytes)
+    for start in range(0, len(matrix), rows):
+        yield slice(start, min(start + rows, len(matrix)))
+        release_pages(matrix)
+
+
+def out_of_core_tile(budget: int, itemsize: int = 8,
+                     hop_itemsize: int = 0) -> int:
+    """Return the tile side of the out-of-core engine for the budget.
+
+    In memory are the diagonal, the target, the two panel tiles, the sums,
+    the comparison mask and the column and the row of the diagonal at every
+    step, plus six successor tiles; the rest is left for the MAPPED_ROWS
+    rows of a tile being copied.
+
+    :param budget: memory to stay within in bytes
+    :param itemsize: size of one matrix element in bytes
+    :param hop_itemsize: size of one successor matrix element in bytes, 0 if
+    there is no successor matrix
+    """
+    per_element = 9 * itemsize + 1 + 6 * hop_itemsize
+    tile = int((budget / per_element) ** 0.5)
+    return max(MIN_TILE, tile - tile % 8)
+
+
+def _scratch(shape: tuple, dtype: np.dtype, like: np.array) -> np.array:
+    """Return an uninitialized array, mapped to a temporary file next to the
+    one of like if that is a memory-mapped array.
+
+    :param shape: shape of the array
+    :param dtype: dtype of the array
+    :param like: array the scratch one goes with
+    """
+    if not isinstance(like, np.memmap):
+        return np.empty(shape, dtype=dtype)
+    directory = os.path.dirname(like.filename) if like.filename else None
+    # the mapping outlives the file, which is deleted on closing
+    with tempfile.TemporaryFile(dir=directory) as file:
+        return np.memmap(file, dtype=dtype, mode="w+", shape=shape)
+
+
+def _load_tile(array: np.array, block_i: slice, block_j: slice,
+               buffer: np.array) -> np.array:
+    """Copy the tile of the (possibly memory-mapped) array into the buffer.
+
+    :return: the part of the buffer holding the tile, None if there is no
+    array
+    """
+    if array is None:
+        return None
+    tile = buffer[:block_i.stop - block_i.start, :block_j.stop - block_j.start]
+    for start in range(0, len(tile), MAPPED_ROWS):
+        rows = slice(block_i.start + start,
+                     min(block_i.start + start + MAPPED_ROWS, block_i.stop))
+        np.copyto(tile[start:start + MAPPED_ROWS], array[rows, block_j])
+        release_pages(array)
+    return tile
+
+
+def _store_tile(array: np.array, block_i: slice, block_j: slice,
+                tile: np.array):
+    """Write the tile back to the (possibly memory-mapped) array if there
+    is one."""
+    if array is None:
+        return
+    for start in range(0, len(tile), MAPPED_ROWS):
+        rows = slice(block_i.start + start,
+                     min(block_i.start + start + MAPPED_ROWS, block_i.stop))
+        array[rows, block_j] = tile[start:start + MAPPED_ROWS]
+        release_pages(array)
+
+
+def _relax_tile(target: np.array, target_hops: np.array,
+                via_cols: np.array, via_rows: np.array, via_hops: np.array,
+                sums: np.array, round_pos: int, size: int = None,
+                stop_negative: bool = False, step_cols: np.array = None,
+                step_rows: np.array = None,
+                step_hops: np.array = None) -> int:
+    """Relax the target tile through the vertices of a block K.
+
+    The via tiles can be the target itself, then the column and the row of
+    every k can be kept as they were at its step.
+
+    :param target: tile to relax in place
+    :param target_hops: successor tile of the target to update, or None
+    :param via_cols: tile of weights from the target rows to K
+    :param via_rows: tile of weights from K to the target columns
+    :param via_hops: successor tile from the target rows to K, or None
+    :param sums: buffer of at least the target shape for the sums
+    :param round_pos: number of positions to round every sum to
+    :param size: number of the first vertices of K to relax through, all of
+    them if not given
+    :param stop_negative: whether to stop before the first vertex with a
+    negative weight on the diagonal of the target (the diagonal tile of K)
+    :param step_cols: tile to keep the column of via_cols of every k in
+    :param step_rows: tile to keep the row of via_rows of every k in
+    :param step_hops: tile to keep the column of via_hops of every k in
+    :return: the number of vertices relaxed through
+    """
+    target_sums = sums[:target.shape[0], :target.shape[1]]
+    size = via_cols.shape[1] if size is None else size
+    for k in range(size):
+        if stop_negative and target[k, k] < 0:
+            return k
+        if step_cols is not None:
+            step_cols[:, k] = via_cols[:, k]
+        if step_rows is not None:
+            step_rows[k] = via_rows[k]
+        if step_hops is not None:
+            step_hops[:, k] = via_hops[:, k]
+        _relax(target, via_cols[:, k], via_rows[k], target_sums, round_pos,
+               target_hops,
+               via_hops[:, k, np.newaxis] if via_hops is not None else None)
+    return size
+
+
+def floyd_out_of_core(matrix: np.array, round_pos: int,
+                      next_hop: np.array = None,
+                      budget: int = None) -> np.array:
+    """Run the blocked Floyd-Warshall on matrices larger than the memory.
+
+    The matrices are expected to be np.memmap arrays. The phases are those
+    of floyd_blocked, but every tile is copied into memory, relaxed there
+    and written back in place, after which its pages are released. So only
+    a few tiles are resident at a time, their side is chosen by the budget.
+    The columns and the rows of the vertices of K at their steps are kept
+    in temporary files next to the matrix for phase 3. Every block K reads
+    and writes the whole matrix about once.
+
+    :param matrix: 2D weight matrix, modified in place
+    :param round_pos: number of positions to round every sum to
+    :param next_hop: successor matrix to update in place if given
+    :param budget: memory to stay within in bytes, MEMORY_BUDGET by default
+    :return: the matrix of shortest path weights
+    :raise NegativeCycleError: if the graph has a negative cycle (the pairs
+    through it are never marked, the tiles in memory would miss the marks)
+    """
+    vert_n = len(matrix)
+    hop_itemsize = next_hop.itemsize if next_hop is not None else 0
+    tile = out_of_core_tile(budget or MEMORY_BUDGET, matrix.itemsize,
+                            hop_itemsize)
+    tile = max(1, min(tile, vert_n))
+    blocks = [slice(start, min(start + tile, vert_n))
+              for start in range(0, vert_n, tile)]
+    sums = np.empty((tile, tile), dtype=matrix.dtype)
+    # the diagonal, the row, the column and the target tiles are copied into
+    # the same buffers every time, the last one also holds the steps of the
+    # panel tiles on their way to the files
+    buffers = [np.empty((tile, tile), dtype=matrix.dtype) for _ in range(4)]
+    hop_buffers = [None] * 4 if next_hop is None else \
+        [np.empty((tile, tile), dtype=next_hop.dtype) for _ in range(4)]
+    # the column and the row of the diagonal tile at every step
+    diagonal_steps = [np.empty((tile, tile), dtype=matrix.dtype)
+                      for _ in range(2)]
+    diagonal_hop_steps = None if next_hop is None else \
+        np.empty((tile, tile), dtype=next_hop.dtype)
+    # the column and the row of every k of K at its step
+    step_cols = _scratch((vert_n, tile), matrix.dtype, matrix)
+    step_rows = _scratch((tile, vert_n), matrix.dtype, matrix)
+    step_hops = None if next_hop is None else \
+        _scratch((vert_n, tile), next_hop.dtype, next_hop)
+
+    for block_k in blocks:
+        steps = slice(0, block_k.stop - block_k.start)
+        # phase 1: the diagonal tile
+        diagonal = _load_tile(matrix, block_k, block_k, buffers[0])
+        diagonal_hops = _load_tile(next_hop, block_k, block_k,
+                                   hop_buffers[0])
+        diagonal_cols, diagonal_rows = (steps_tile[steps, steps]
+                                        for steps_tile in diagonal_steps)
+        diagonal_col_hops = None if next_hop is None else \
+            diagonal_hop_steps[steps, steps]
+        # the rest is relaxed through the vertices before a cycle only, so
+        # the successors from its last vertex lead around it
+        size = _relax_tile(diagonal, diagonal_hops, diagonal, diagonal,
+                           diagonal_hops, sums, round_pos, stop_negative=True,
+                           step_cols=diagonal_cols, step_rows=diagonal_rows,
+                           step_hops=diagonal_col_hops)
+        _store_tile(matrix, block_k, block_k, diagonal)
+        _store_tile(next_hop, block_k, block_k, diagonal_hops)
+
+        # phase 2: the tiles of the row and the column panels
+        for block in blocks:
+            if block is block_k:
+                continue
+            row = _load_tile(matrix, block_k, block, buffers[1])
+            row_hops = _load_tile(next_hop, block_k, block, hop_buffers[1])
+            row_steps = buffers[3][:row.shape[0], :row.shape[1]]
+            _relax_tile(row, row_hops, diagonal_cols, row, diagonal_col_hops,
+                        sums, round_pos, size, step_rows=row_steps)
+            _store_tile(matrix, block_k, block, row)
+            _store_tile(next_hop, block_k, block, row_hops)
+            _store_tile(step_rows, steps, block, row_steps)
+
+            column = _load_tile(matrix, block, block_k, buffers[2])
+            column_hops = _load_tile(next_hop, block, block_k,
+                                     hop_buffers[2])
+            column_steps = buffers[3][:column.shape[0], :column.shape[1]]
+            column_hop_steps = None if next_hop is None else \
+                hop_buffers[3][:column.shape[0], :column.shape[1]]
+            _relax_tile(column, column_hops, column, diagonal_rows,
+                        column_hops, sums, round_pos, size,
+                        step_cols=column_steps, step_hops=column_hop_steps)
+            _store_tile(matrix, block, block_k, column)
+            _store_tile(next_hop, block, block_k, column_hops)
+            _store_tile(step_cols, block, steps, column_steps)
+            _store_tile(step_hops, block, steps, column_hop_steps)
+
+        # phase 3: all the other tiles through the panels at every step
+        for block_i in blocks:
+            if block_i is block_k:
+                continue
+            column = _load_tile(step_cols, block_i, steps, buffers[2])
+            column_hops = _load_tile(step_hops, block_i, steps,
+                                     hop_buffers[2])
+            for block_j in blocks:
+                if block_j is block_k:
+                    continue
+                row = _load_tile(step_rows, steps, block_j, buffers[1])
+                target = _load_tile(matrix, block_i, block_j, buffers[3])
+                target_hops = _load_tile(next_hop, block_i, block_j,
+                                         hop_buffers[3])
+                _relax_tile(target, target_hops, column, row, column_hops,
+                            sums, round_pos, size)
+                _store_tile(matrix, block_i, block_j, target)
+                _store_tile(next_hop, block_i, block_j, target_hops)
+        _check_diagonal(matrix, block_k.start + size,
+                        diagonal.diagonal()[size:size + 1], next_hop, False)
+
+    for array in (matrix, next_hop):
+        if isinstance(array, np.memmap):
+            array.flush()
+    return matrix
+
+
+# engines available by name
+ENGINES = {
+    "vectorized": floyd_vectorized,
+    "blocked": floyd_blocked,
+    "parallel": floyd_parallel,
+    "reference": floyd_reference,
+    "out_of_core": floyd_out_of_core,
+}
+DEFAULT_ENGINE = "vectorized"
+# the engine for memory-mapped matrices
+OUT_OF_CORE_ENGINE = "out_of_core"
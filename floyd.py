@@ -1,11 +1,31 @@
 """Analyze the graph."""
 from graph import LinkedGraph, LinkedDirectedGraph
+from engines import (ENGINES, DEFAULT_ENGINE, OUT_OF_CORE_ENGINE, DTYPES,
+                     MEMORY_BUDGET, floyd_parallel, floyd_out_of_core,
+                     init_next_hop, out_of_core_tile, release_pages,
+                     row_bands, infinity, cast_matrix, NegativeCycleError,
+                     stack_matrices, floyd_batched)
+from allpairs import AllPairs, DynamicAllPairs
+from cache import ResultCache, fingerprint
+from closure import Reachability, transitive_closure
+from components import ComponentAllPairs
+from labelindex import LabelIndex
+from queries import single_source, point_to_point
+from sparse import (all_pairs_sparse, prefers_sparse, sparse_enough,
+                    csr_adjacency)
+from graphio import (NPY_EXT, CHUNK_EDGES, load_matrix, load_edge_list,
+                     load_graph, read_edges, create_matrix, save_matrix)
+import argparse
+import gc
+import os
+import sys
+import tempfile
+from itertools import chain
 import networkx as nx
 import matplotlib.pyplot as plt
 import numpy as np
-import random as rd
 from math import inf
-from typing import Any
+from typing import Any, Iterable, Iterator, Optional
 
 
 # colors used
@@ -19,6 +39,12 @@ NODE_SPACE = 10
 
 # always round to 2 positions for visual display
 DISPLAY_ROUND = 2
+# the most vertices of a matrix printed in full, bigger ones show the first
+# and the last DISPLAY_CORNER rows and columns
+DISPLAY_VERTICES = 20
+DISPLAY_CORNER = 5
+# escape sequence resetting the colors
+RESET = "\33[0m"
 
 # pool for weight generation
 MAX_WEIGHT = 10
@@ -30,83 +56,419 @@ USER_MATRIX = 1
 USER_EDGES = 2
 USER_RANDOM = 3
 
+# engines besides the dense ones of engines.ENGINES
+SPARSE_ENGINE = "sparse"
+AUTO_ENGINE = "auto"
 
-def print_matrix(matrix: np.array, label_map: dict):
+
+def _display_values(row: np.array) -> list:
+    """Return the values of the matrix row as they are displayed: rounded
+    to ROUND_POS positions, inf for no connection."""
+    no_edge = infinity(row.dtype)
+    if row.dtype.kind == "f":
+        values = np.round(row.astype(np.float64), ROUND_POS)
+        values[row == no_edge] = inf
+        return values.tolist()
+    return [inf if value == no_edge else value for value in row.tolist()]
+
+
+def print_matrix(matrix: np.array, labels: LabelIndex,
+                 limit: int = DISPLAY_VERTICES, stream: Any = None,
+                 color: bool = None):
     """Print out the matrix.
 
+    The rows are rendered into one buffer for every band of rows and
+    written at once.
+
     :param matrix: 2D weight matrix from the graph
-    :param label_map: map of how row numbers relate to node objects
+    :param labels: label index of the rows (or any map of the rows to the
+    labels), shown as their vertices are printed
+    :param limit: the most vertices to print in full, only the first and
+    the last DISPLAY_CORNER rows and columns of a bigger matrix are printed
+    (None for no limit)
+    :param stream: text stream to write to, sys.stdout by default
+    :param color: whether to color the output, by default only if the
+    stream is a terminal
     """
+    stream = stream or sys.stdout
+    color = use_color(stream) if color is None else color
+    reset = RESET if color else ""
+    source, destination, value = (color_code(fg) if color else ""
+                                  for fg in (BAD_COL, NEUT_COL, GOOD_COL))
     dimension = len(matrix)
-    color_print("Hint:", fg=UI_COL)
-    color_print("- color of destination nodes in directed graph", fg=NEUT_COL)
-    color_print("- color of source nodes in directed graph", fg=BAD_COL,
-                end="\n\n")
-
-    # print first row
-    print(" "*NODE_SPACE, end="")
-    for i in range(dimension):
-        color_print(f"{label_map[i]}".ljust(NODE_SPACE, " "), end="",
-                    fg=NEUT_COL)
-    print()
+    truncated = limit is not None and dimension > limit
+    if truncated:
+        columns = np.r_[:DISPLAY_CORNER, dimension-DISPLAY_CORNER:dimension]
+        bands = (range(DISPLAY_CORNER),
+                 range(dimension - DISPLAY_CORNER, dimension))
+    else:
+        columns = slice(None)
+        bands = (range(band.start, band.stop)
+                 for band in row_bands(matrix))
+
+    names = [f"v({labels[j]})"
+             for j in np.arange(dimension)[columns].tolist()]
+
+    def cells(texts: Any) -> str:
+        """Join the texts padded to NODE_SPACE, with a gap in the middle of
+        a truncated row."""
+        texts = [f"{text}".ljust(NODE_SPACE, " ") for text in texts]
+        if truncated:
+            texts.insert(DISPLAY_CORNER, "...".ljust(NODE_SPACE, " "))
+        return "".join(texts)
+
+    # print the hint and the first row
+    lines = [f"{color_code(UI_COL) if color else ''}Hint:{reset}",
+             f"{destination}- color of destination nodes in directed graph"
+             f"{reset}",
+             f"{source}- color of source nodes in directed graph{reset}",
+             "",
+             " "*NODE_SPACE + destination + cells(names) + reset]
 
     # print the actual matrix
-    for i in range(dimension):
-        color_print(f"{label_map[i]}".ljust(NODE_SPACE, " "), end="",
-                    fg=BAD_COL)
-        for ii in range(dimension):
-            color_print(f"{matrix[i, ii]}".ljust(NODE_SPACE, " "), fg=GOOD_COL,
-                        end="")
-        print()
-    print()
+    for number, band in enumerate(bands):
+        if truncated and number:
+            lines.append(f"{source}{'...'.ljust(NODE_SPACE, ' ')}{reset}")
+        for i in band:
+            lines.append(f"{source}{f'v({labels[i]})'.ljust(NODE_SPACE, ' ')}"
+                         f"{value}{cells(_display_values(matrix[i, columns]))}"
+                         f"{reset}")
+        stream.write("\n".join(lines) + "\n")
+        lines = []
+    if truncated:
+        lines.append(f"{dimension} x {dimension} matrix, the first and the "
+                     f"last {DISPLAY_CORNER} vertices shown")
+    stream.write("\n".join(lines + ["", ""]))
+    stream.flush()
+
+
+def graph_matrix(graph: LinkedGraph, backing_file: str = None,
+                 dtype: np.dtype = np.float64) -> (np.array, LabelIndex):
+    """Build the initial Floyd matrix of the graph.
+
+    :param graph: the graph to build the matrix of
+    :param backing_file: .npy file to map the matrix to instead of keeping it
+    in memory
+    :param dtype: one of engines.DTYPES
+    :return: a tuple of the 2D weight matrix (zeros on the diagonal, the
+    infinity of dtype for no connection) and the label index of the rows
+    :raise ValueError: if a weight can not be represented in dtype
+    """
+    # the rows of the edges are found for all of them at once
+    indptr, indices, weights, labels = csr_adjacency(graph)
+    vert_n = len(labels)
+
+    # create and fill the matrix according to Floyd
+    if backing_file is None:
+        matrix = np.empty((vert_n, vert_n), dtype=dtype)
+    else:
+        matrix = create_matrix(backing_file, vert_n, dtype)
+    row = np.empty(vert_n, dtype=np.float64)
+    for i in range(vert_n):
+        edges = slice(indptr[i], indptr[i + 1])
+        row.fill(inf)
+        row[indices[edges]] = weights[edges]
+        row[i] = 0
+        matrix[i] = cast_matrix(row, dtype)
+        release_pages(matrix)
+    return matrix, labels
+
+
+def check_engine(engine: str, workers: int = 1, out_of_core: bool = False):
+    """Check the name of the engine and the number of workers before any
+    work is done.
 
+    :param engine: name of the engine to run (see run_engine)
+    :param workers: number of processes
+    :param out_of_core: whether the matrix is memory-mapped or the run has a
+    memory budget
+    :raise ValueError: if there is no engine with such name, or more than
+    one worker is asked for out of core (the parallel engine keeps the
+    whole matrix in shared memory)
+    """
+    engines = (*ENGINES, SPARSE_ENGINE, AUTO_ENGINE)
+    if engine not in engines:
+        raise ValueError(f"Unknown engine {engine}, choose one of: "
+                         f"{', '.join(engines)}")
+    if workers > 1 and out_of_core:
+        raise ValueError("The parallel engine keeps the whole matrix in "
+                         "memory, use one worker for a memory-mapped "
+                         "matrix or a memory budget.")
+
+
+def run_engine(graph: LinkedGraph, matrix: np.array,
+               engine: str = AUTO_ENGINE, workers: int = 1,
+               next_hop: np.array = None, budget: int = None,
+               mark_negative: bool = False) -> np.array:
+    """Find all shortest path weights in the graph with the chosen engine.
+
+    :param graph: the graph to find the weights in
+    :param matrix: the initial matrix of the graph (see graph_matrix),
+    relaxed in place by the dense engines
+    :param engine: name of the engine to run: one of engines.ENGINES,
+    SPARSE_ENGINE (repeated Dijkstra) or AUTO_ENGINE to choose between the
+    sparse and the default dense engine by the graph density (the
+    out-of-core engine for a memory-mapped matrix)
+    :param workers: number of processes, more than one runs the parallel
+    engine instead of the chosen one (not for a memory-mapped matrix or
+    with a budget)
+    :param next_hop: successor matrix (see engines.init_next_hop) to fill if
+    given
+    :param budget: memory the out-of-core engine may use in bytes
+    (engines.MEMORY_BUDGET by default)
+    :param mark_negative: whether to set the weights of the pairs with a
+    path through a negative cycle to -inf instead of stopping (for float
+    matrices and the in-memory dense engines only, auto does not choose the
+    sparse engine then)
+    :return: the matrix of shortest path weights
+    :raise ValueError: if there is no engine with such name or more than one
+    worker is asked for a memory-mapped matrix or with a budget
+    :raise NegativeCycleError: if the graph has a negative cycle which is
+    not marked
+    """
+    check_engine(engine, workers,
+                 isinstance(matrix, np.memmap) or budget is not None)
+    if engine == AUTO_ENGINE:
+        if isinstance(matrix, np.memmap):
+            engine = OUT_OF_CORE_ENGINE
+        elif not mark_negative and prefers_sparse(graph):
+            engine = SPARSE_ENGINE
+        else:
+            engine = DEFAULT_ENGINE
+
+    # the sums around a negative cycle may overflow to -inf when it is
+    # marked, and inf + -inf is nan, which the relaxation skips
+    if workers > 1:
+        with np.errstate(invalid="ignore", over="ignore"):
+            return floyd_parallel(matrix, ROUND_POS, next_hop,
+                                  workers=workers,
+                                  mark_negative=mark_negative)
+    if engine == SPARSE_ENGINE:
+        return cast_matrix(all_pairs_sparse(graph, ROUND_POS, next_hop)[0],
+                           matrix.dtype)
+    if engine == OUT_OF_CORE_ENGINE:
+        return floyd_out_of_core(matrix, ROUND_POS, next_hop, budget)
+    with np.errstate(invalid="ignore", over="ignore"):
+        return ENGINES[engine](matrix, ROUND_POS, next_hop,
+                               mark_negative=mark_negative)
+
+
+def has_marked(matrix: np.array) -> bool:
+    """Return True if the weights of some pairs are marked -inf for a
+    negative cycle (such results are not cached), False otherwise."""
+    return matrix.dtype.kind == "f" and bool(np.isneginf(matrix).any())
 
-def floyd(graph: LinkedGraph) -> np.array:
+
+def floyd(graph: LinkedGraph, engine: str = AUTO_ENGINE,
+          workers: int = 1, backing_file: str = None,
+          dtype: np.dtype = np.float64, cache: ResultCache = None,
+          mark_negative: bool = False) -> np.array:
     """Find all shortest path weights in the graph and return them in the form
     of a matrix.
 
     :param graph: the graph to run Floyd algorithm on
+    :param engine: name of the engine to run (see run_engine)
+    :param workers: number of processes, more than one runs the parallel
+    engine instead of the chosen one (not with a backing file)
+    :param backing_file: .npy file to map the matrix to, the weights are then
+    found in place in it (by the out-of-core engine by default), or copied
+    into it from the cache
+    :param dtype: one of engines.DTYPES, the integer ones find the weights
+    exactly with no rounding
+    :param cache: cache to look the result up in and to keep it in, a
+    cached (read-only) result is printed only
+    :param mark_negative: whether to set the weights of the pairs with a
+    path through a negative cycle to -inf instead of stopping (see
+    run_engine)
+    :raise ValueError: if there is no engine with such name, more than one
+    worker is asked with a backing file or a weight can not be represented
+    in dtype
+    :raise NegativeCycleError: if the graph has a negative cycle which is
+    not marked
     """
-    vert_n = graph.size_vertices()
-    label_map = {}
-
-    # assign each matrix row a unique vertex object
-    for label, vert in enumerate(graph.vertices()):
-        label_map[label] = vert
+    check_engine(engine, workers, backing_file is not None)
+    if cache is not None:
+        key = fingerprint(graph, dtype)
+        result = cache.get(key)
+        if result is not None:
+            matrix = result[0]
+            if backing_file is not None:
+                matrix = create_matrix(backing_file, len(result[0]), dtype)
+                for band in row_bands(matrix):
+                    matrix[band] = result[0][band]
+            color_print(f"Resulting matrix of distance weights:",
+                        fg=GOOD_COL)
+            print_matrix(matrix, LabelIndex.from_graph(graph))
+            return matrix
 
-    # create and fill the matrix according to Floyd
-    matrix = np.empty((vert_n, vert_n), dtype=np.float)
-    for i in range(vert_n):
-        for ii in range(vert_n):
-            edge = graph.get_edge(label_map[i].get_label(),
-                                  label_map[ii].get_label())
-            if i == ii:
-                matrix[i, ii] = 0
-            elif edge is not None:
-                matrix[i, ii] = edge.get_weight()
-            else:
-                matrix[i, ii] = inf
+    matrix, labels = graph_matrix(graph, backing_file, dtype)
 
     color_print(f"Initial matrix:", fg=BAD_COL)
-    print_matrix(matrix, label_map)
+    print_matrix(matrix, labels)
 
     # run the Floyd-Warshall algorithm
-    for k in range(vert_n):
-        for i in range(vert_n):
-            for ii in range(vert_n):
-                new_sum = round(matrix[i, k] + matrix[k, ii], ROUND_POS)
-                if matrix[i, ii] > new_sum:
-                    matrix[i, ii] = new_sum
+    matrix = run_engine(graph, matrix, engine, workers,
+                        mark_negative=mark_negative)
+    if cache is not None and not has_marked(matrix):
+        cache.put(key, matrix)
 
     color_print(f"Resulting matrix of distance weights:", fg=GOOD_COL)
-    print_matrix(matrix, label_map)
+    print_matrix(matrix, labels)
     return matrix
 
 
+def all_pairs(graph: LinkedGraph, engine: str = AUTO_ENGINE,
+              workers: int = 1, dynamic: bool = False,
+              cache: ResultCache = None,
+              mark_negative: bool = False) -> AllPairs:
+    """Find all shortest path weights and paths in the graph.
+
+    The successor matrix is filled during the same relaxation pass, so the
+    paths are restored with no extra run.
+
+    :param graph: the graph to find the paths in
+    :param engine: name of the engine to run (see run_engine)
+    :param workers: number of processes, more than one runs the parallel
+    engine instead of the chosen one
+    :param dynamic: whether to return a DynamicAllPairs to change the edges
+    of the graph through
+    :param cache: cache to look the result up in and to keep it in
+    :param mark_negative: whether to set the weights of the pairs with a
+    path through a negative cycle to -inf instead of stopping (see
+    run_engine), restoring their paths raises ValueError
+    :return: the result to query the weights and the paths from
+    :raise ValueError: if there is no engine with such name
+    :raise NegativeCycleError: if the graph has a negative cycle which is
+    not marked, with the rows of the cycle
+    """
+    check_engine(engine)
+    result = None
+    if cache is not None:
+        key = fingerprint(graph)
+        result = cache.get(key, next_hop=True)
+    if result is not None:
+        matrix, next_hop = result
+        labels = LabelIndex.from_graph(graph)
+        if dynamic:
+            # the dynamic result changes its matrices
+            matrix, next_hop = np.array(matrix), np.array(next_hop)
+    else:
+        matrix, labels = graph_matrix(graph)
+        next_hop = init_next_hop(matrix)
+        matrix = run_engine(graph, matrix, engine, workers, next_hop,
+                            mark_negative=mark_negative)
+        if cache is not None and not has_marked(matrix):
+            cache.put(key, matrix, next_hop)
+    if dynamic:
+        return DynamicAllPairs(graph, matrix, next_hop, labels, ROUND_POS)
+    return AllPairs(matrix, next_hop, labels)
+
+
+def all_pairs_batch(matrices: Iterable,
+                    dtype: np.dtype = np.float64) -> np.array:
+    """Find all shortest path weights of many graphs at once, with no graph
+    objects built and no printing (see engines.floyd_batched).
+
+    :param matrices: weight matrices of any sizes, as get_weight_matrix
+    returns them
+    :param dtype: one of engines.DTYPES
+    :return: the (B, V, V) stack of the shortest path weights, V being the
+    largest size: those of a graph of n vertices are in [:n, :n] of its
+    matrix
+    :raise ValueError: if a weight can not be represented in dtype
+    :raise NegativeCycleError: if a graph has a negative cycle
+    """
+    batch_matrix, _ = stack_matrices(matrices, dtype)
+    if batch_matrix.dtype.kind == "f":
+        np.round(batch_matrix, ROUND_POS, out=batch_matrix)
+    return floyd_batched(batch_matrix, ROUND_POS)
+
+
+def decomposed_all_pairs(graph: LinkedGraph, engine: str = DEFAULT_ENGINE,
+                         workers: int = 1) -> ComponentAllPairs:
+    """Find all shortest path weights in the graph component by component
+    (see components.ComponentAllPairs).
+
+    :param graph: the graph to find the weights in
+    :param engine: name of one of engines.ENGINES to solve every component
+    with
+    :param workers: number of processes solving the components at once
+    :return: the result to query the weights from
+    :raise ValueError: if there is no engine with such name
+    :raise NegativeCycleError: if the graph has a negative cycle
+    """
+    return ComponentAllPairs(graph, ROUND_POS, engine, workers)
+
+
+def reachability(graph: LinkedGraph, condense: bool = False) -> Reachability:
+    """Find which vertices every vertex of the graph reaches, with no
+    distances (see closure.transitive_closure).
+
+    :param graph: the graph to find the closure of
+    :param condense: whether to condense the strongly connected components
+    first
+    :return: the closure to query
+    """
+    return transitive_closure(graph, condense)
+
+
+def shortest_paths_from(graph: LinkedGraph, label: Any,
+                        negative: bool = None) -> dict:
+    """Find the shortest path weights from one vertex with no all-pairs
+    run (see queries.single_source).
+
+    :param graph: the graph to search
+    :param label: label of the source vertex
+    :param negative: whether the graph has negative weights, None to check
+    :return: map of the labels of the reachable vertices to their weights
+    :raise AttributeError: if the vertex is not in the graph
+    :raise ValueError: if a negative cycle is reachable from the vertex
+    """
+    return single_source(graph, label, ROUND_POS, negative)
+
+
+def shortest_path(graph: LinkedGraph, from_label: Any, to_label: Any,
+                  negative: bool = None) -> (float, Optional[list]):
+    """Find the shortest path between two vertices with no all-pairs run
+    (see queries.point_to_point).
+
+    :param graph: the graph to search
+    :param from_label: label of the source vertex
+    :param to_label: label of the destination vertex
+    :param negative: whether the graph has negative weights, None to check
+    :return: a tuple of the weight of the path (inf if there is none) and
+    the list of labels on it (None if there is none)
+    :raise AttributeError: if a vertex is not in the graph
+    :raise ValueError: if a negative cycle is reachable from the source
+    """
+    return point_to_point(graph, from_label, to_label, ROUND_POS, negative)
+
+
+def color_code(fg: (int, int, int) = None,
+               bg: (int, int, int) = None) -> str:
+    """Return the escape sequence setting the colors (a tuple of three ints
+    in RGB format each), or resetting them if no color is given."""
+    color_map = f"\33["
+    if fg:
+        color_map += f"38;2;{fg[0]};{fg[1]};{fg[2]};"
+    if bg:
+        color_map += f"48;2;{bg[0]};{bg[1]};{bg[2]};"
+    if not(bg or fg):
+        color_map += "0;"
+    return color_map[:-1] + "m"
+
+
+def use_color(stream: Any = None) -> bool:
+    """Return True if the stream (sys.stdout by default) is a terminal, so
+    the output to it is colored, False otherwise."""
+    isatty = getattr(stream or sys.stdout, "isatty", None)
+    return bool(isatty and isatty())
+
+
 def color_print(*args: Any, fg: (int, int, int) = None,
                 bg: (int, int, int) = None, sep: Any = " ",
                 end: Any = "\n"):
-    """Print in color.
+    """Print in color if the standard output is a terminal.
 
     :param args: any args to print (as in normal print)
     :param fg: foreground color (a tuple of three ints in RGB format)
@@ -114,17 +476,10 @@ def color_print(*args: Any, fg: (int, int, int) = None,
     :param sep: separator as in normal print
     :param end: end as in normal print (is not in color)
     """
-    color_map = f"\33["
-    if fg:
-        color_map += f"38;2;{fg[0]};{fg[1]};{fg[2]};"
-    if bg:
-        color_map += f"48;2;{bg[0]};{bg[1]};{bg[2]};"
-    if not(bg or fg):
-        color_map += "0;"
-    color_map = color_map[:-1] + "m"
-    print(f"{color_map}", end="")
-    print(*args, sep=sep, end="")
-    print('\33[0m', end=end)
+    text = sep.join(map(str, args))
+    if use_color():
+        text = f"{color_code(fg, bg)}{text}{RESET}"
+    print(text, end=end)
 
 
 def color_input(prompt: Any, fg: (int, int, int) = None,
@@ -140,12 +495,183 @@ def color_input(prompt: Any, fg: (int, int, int) = None,
     return input()
 
 
-def get_weight_matrix(choice: int) -> (np.array, dict, bool):
+def _random_weights(uniform: np.array, exact: bool) -> np.array:
+    """Scale the uniform numbers in [0, 1) to weights in [MIN_WEIGHT,
+    MAX_WEIGHT), whole ones if exact or rounded down to ROUND_POS positions
+    otherwise."""
+    scale = 1 if exact else 10 ** ROUND_POS
+    return np.floor(uniform * ((MAX_WEIGHT - MIN_WEIGHT) * scale)) / scale \
+        + MIN_WEIGHT
+
+
+def random_weight_matrix(vert_n: int, connectivity: float,
+                         out: np.array = None, seed: int = None,
+                         symmetric: bool = False,
+                         budget: int = None) -> np.array:
+    """Generate a random weight matrix by bands of rows.
+
+    Every edge exists with the probability of the connectivity, the same
+    seed gives the same matrix for any budget.
+
+    :param vert_n: number of vertices
+    :param connectivity: probability (in percents) of an edge connecting two
+    vertices
+    :param out: matrix to fill instead of a new one, whole weights are
+    generated for an integer one
+    :param seed: seed of the random generator, None for a random one
+    :param symmetric: whether to generate an undirected graph, the weights
+    below the diagonal are then mirrored from the ones above it
+    :param budget: memory to stay within in bytes for a memory-mapped out
+    (engines.MEMORY_BUDGET by default)
+    :return: 2D weight matrix with weights in [MIN_WEIGHT, MAX_WEIGHT), the
+    infinity of its dtype for no connection
+    """
+    matrix = np.empty((vert_n, vert_n), dtype=np.float64) if out is None \
+        else out
+    no_edge = infinity(matrix.dtype)
+    exact = matrix.dtype.kind != "f"
+    rng = np.random.default_rng(seed)
+    probability = connectivity / 100
+    # the random arrays of a band are float64 whatever the dtype
+    budget = (budget or MEMORY_BUDGET) * matrix.itemsize // 8
+    for band in row_bands(matrix, budget):
+        # one number per cell: below the probability it is an edge and,
+        # divided by the probability, uniform again for the weight
+        uniform = rng.random((band.stop - band.start, vert_n))
+        weights = np.where(uniform < probability, _random_weights(
+            uniform / (probability or 1), exact), no_edge)
+        if not symmetric:
+            matrix[band] = weights
+            continue
+        # keep the weights above the diagonal and mirror them
+        rows = np.arange(band.start, band.stop)[:, np.newaxis]
+        upper = np.where(np.arange(band.start, vert_n) > rows,
+                         weights[:, band.start:], no_edge)
+        matrix[band, band.start:] = upper
+        block = matrix[band, band]
+        matrix[band, band] = np.where(block == no_edge, block.T, block)
+        matrix[band.stop:, band] = upper[:, band.stop - band.start:].T
+    return matrix
+
+
+def random_edges(vert_n: int, connectivity: float, seed: int = None,
+                 symmetric: bool = False) -> Iterator:
+    """Generate the edges of a random graph with no weight matrix, in time
+    proportional to the number of edges.
+
+    :param vert_n: number of vertices, labeled by 0 to vert_n - 1
+    :param connectivity: probability (in percents) of an edge connecting two
+    vertices
+    :param seed: seed of the random generator, None for a random one
+    :param symmetric: whether to generate an undirected graph, every edge is
+    then generated once from its smaller label
+    :return: generator of (from label, to label, weight) tuples with weights
+    in [MIN_WEIGHT, MAX_WEIGHT) and no self loops
+    """
+    probability = connectivity / 100
+    if probability <= 0 or vert_n < 2:
+        return
+    rng = np.random.default_rng(seed)
+    # number of the candidate targets of every vertex, itself skipped
+    lengths = np.arange(vert_n - 1, -1, -1) if symmetric else \
+        np.full(vert_n, vert_n - 1)
+    band_rows = max(1, int(CHUNK_EDGES / probability / (vert_n - 1)))
+    for start in range(0, vert_n, band_rows):
+        offsets = np.concatenate(
+            ([0], np.cumsum(lengths[start:start + band_rows])))
+        # the candidates of the band in a row, the gaps between two edges
+        # are geometric
+        positions = [np.array([-1])]
+        while positions[-1][-1] < offsets[-1]:
+            gaps = rng.geometric(probability,
+                                 int(offsets[-1] * probability * 1.1) + 16)
+            positions.append(positions[-1][-1] + np.cumsum(gaps))
+        positions = np.concatenate(positions[1:])
+        positions = positions[positions < offsets[-1]]
+
+        rows = np.searchsorted(offsets, positions, side="right") - 1
+        targets = positions - offsets[rows]
+        rows += start
+        targets += rows + 1 if symmetric else targets >= rows
+        weights = _random_weights(rng.random(len(positions)), False)
+        yield from zip(rows.tolist(), targets.tolist(), weights.tolist())
+
+
+def fill_diagonal(matrix: np.array, value: float, budget: int = None):
+    """Fill the diagonal of the matrix in place by bands of rows, so that
+    only a band of a memory-mapped matrix is resident at a time.
+
+    :param matrix: 2D matrix
+    :param value: value to fill the diagonal with
+    :param budget: memory to stay within in bytes (engines.MEMORY_BUDGET by
+    default)
+    """
+    for band in row_bands(matrix, budget):
+        rows = np.arange(band.start, band.stop)
+        matrix[rows, rows] = value
+
+
+def prepare_weight_matrix(matrix: np.array, budget: int = None) -> np.array:
+    """Round the weights to ROUND_POS positions and clear all connections
+    between a node and itself in place.
+
+    :param matrix: 2D weight matrix, the infinity of its dtype for no
+    connection
+    :param budget: memory to stay within in bytes for a memory-mapped matrix
+    (engines.MEMORY_BUDGET by default)
+    :return: the same matrix
+    """
+    if matrix.dtype.kind == "f":
+        for band in row_bands(matrix, budget):
+            np.round(matrix[band], ROUND_POS, out=matrix[band])
+    fill_diagonal(matrix, infinity(matrix.dtype), budget)
+    return matrix
+
+
+def prepare_edges(edges: Iterable) -> Iterator:
+    """Generate the (from label, to label, weight) edges with the weights
+    rounded to ROUND_POS positions."""
+    for from_label, to_label, weight in edges:
+        yield from_label, to_label, round(weight, ROUND_POS)
+
+
+def is_directed_matrix(matrix: np.array, budget: int = None) -> bool:
+    """Return True if the weight matrix is not symmetrical (the graph is
+    directed), False otherwise.
+
+    Compares the matrix with its transpose by pairs of tiles, so that only
+    two tiles of a memory-mapped matrix are resident at a time.
+
+    :param matrix: 2D weight matrix
+    :param budget: memory to stay within in bytes (engines.MEMORY_BUDGET by
+    default)
+    """
+    vert_n = len(matrix)
+    tile = out_of_core_tile(budget or MEMORY_BUDGET, matrix.itemsize)
+    for start_i in range(0, vert_n, tile):
+        block_i = slice(start_i, min(start_i + tile, vert_n))
+        for start_j in range(start_i, vert_n, tile):
+            block_j = slice(start_j, min(start_j + tile, vert_n))
+            symmetrical = np.array_equal(matrix[block_i, block_j],
+                                         matrix[block_j, block_i].T)
+            release_pages(matrix)
+            if not symmetrical:
+                return True
+    return False
+
+
+def get_weight_matrix(choice: int, backing_file: str = None,
+                      dtype: np.dtype = np.float64) -> (np.array, LabelIndex,
+                                                        bool):
     """Get weight matrix from the user's input.
 
     :param choice: user's choice for generation
-    :return: a tuple of the 2D weight matrix, map of rows to labels, whether
-    the graph is directed
+    :param backing_file: .npy file to map the matrix to instead of keeping it
+    in memory
+    :param dtype: one of engines.DTYPES, the integer ones accept only whole
+    weights
+    :return: a tuple of the 2D weight matrix, the label index of the rows,
+    whether the graph is directed
     """
     # get the number of vertices
     while True:
@@ -156,8 +682,11 @@ def get_weight_matrix(choice: int) -> (np.array, dict, bool):
         except ValueError:
             color_print("Number of vertices must be int value, try again.",
                         fg=BAD_COL)
-    matrix = np.empty((vert_n, vert_n), dtype=np.float)
-    label_map = {}
+    if backing_file is None:
+        matrix = np.empty((vert_n, vert_n), dtype=dtype)
+    else:
+        matrix = create_matrix(backing_file, vert_n, dtype)
+    labels = []
 
     color_print("\nNote: any connections of vertex to self will be ignored.",
                 fg=NEUT_COL)
@@ -181,6 +710,18 @@ def get_weight_matrix(choice: int) -> (np.array, dict, bool):
                 color_print(f"Connectivity is: {connectivity}%", fg=GOOD_COL,
                             end="\n\n")
                 break
+        while True:
+            try:
+                seed = color_input("Enter the seed to reproduce the graph "
+                                   "(int, empty for a random one): ",
+                                   fg=UI_COL)
+                seed = int(seed) if seed else None
+            except ValueError:
+                color_print("Bad seed value, try again!", fg=BAD_COL)
+            else:
+                break
+        symmetric = color_input("Generate an undirected graph? (y/n)\n",
+                                fg=UI_COL) == "y"
 
     # for every row of the future matrix
     for i in range(vert_n):
@@ -192,11 +733,13 @@ def get_weight_matrix(choice: int) -> (np.array, dict, bool):
                                     f"(0 < length < {NODE_SPACE-3})): ",
                                     fg=UI_COL)
                 assert 0 < len(label) < NODE_SPACE-3
+                assert label not in labels
             except AssertionError:
-                color_print("Bad label length, try again!", fg=BAD_COL)
+                color_print("Bad label length or the label is taken, "
+                            "try again!", fg=BAD_COL)
             else:
                 print()
-                label_map[i] = label
+                labels.append(label)
                 break
 
         # get the matrix row
@@ -206,10 +749,8 @@ def get_weight_matrix(choice: int) -> (np.array, dict, bool):
                     row_value = color_input(
                         f"Enter the {vert_n} weights of row {i}"
                         f"(using ' ' as separator): ", fg=UI_COL)
-                    row_value = map(float, row_value.split())
-                    matrix[i] = [round(value, ROUND_POS) if value != inf
-                                 else inf
-                                 for value in row_value]
+                    row_value = np.array(list(map(float, row_value.split())))
+                    matrix[i] = cast_matrix(row_value, dtype)
                 except ValueError:
                     color_print("Incorrect input, try again!", fg=BAD_COL)
                 else:
@@ -223,83 +764,64 @@ def get_weight_matrix(choice: int) -> (np.array, dict, bool):
                     continue
                 while True:
                     try:
-                        ij_weight = color_input(f"Enter the weight for "
-                                                f"({i}, {j}) edge: ",
-                                                fg=UI_COL)
-                        ij_weight = float(ij_weight)
-                        ij_weight = (round(ij_weight, ROUND_POS)
-                                     if ij_weight != inf else inf)
-                        matrix[i, j] = ij_weight
+                        ij_weight = float(color_input(
+                            f"Enter the weight for ({i}, {j}) edge: ",
+                            fg=UI_COL))
+                        matrix[i, j] = cast_matrix(np.array(ij_weight), dtype)
                     except ValueError:
                         color_print("A weight must be float value, try again.",
                                     fg=BAD_COL)
                     else:
                         break
 
-        # randomly generate the row according to connectivity and weight range
-        else:
-            for j in range(vert_n):
-                if rd.randint(0, 99) < connectivity:
-                    # get a random float between MIN_WEIGHT and MAX_WEIGHT
-                    val = rd.random() * rd.randint(MIN_WEIGHT, MAX_WEIGHT-1)
-                    val = round(val, ROUND_POS)
-                    matrix[i, j] = val
-                else:
-                    matrix[i, j] = inf
-
-    # clear all connections between a node and itself
-    for i in range(vert_n):
-        matrix[i, i] = inf
+    # randomly generate the matrix according to connectivity and weight range
+    if choice == USER_RANDOM:
+        random_weight_matrix(vert_n, connectivity, out=matrix, seed=seed,
+                             symmetric=symmetric)
 
-    # if matrix is symmetrical the graph is undirected, else directed
-    for i in range(vert_n):
-        for ii in range(vert_n):
-            if matrix[i, ii] != matrix[ii, i]:
-                return matrix, label_map, True
-    return matrix, label_map, False
+    prepare_weight_matrix(matrix)
+    return matrix, LabelIndex(labels), is_directed_matrix(matrix)
 
 
-def initialize_graph(weight_matrix: np.array, label_map: dict,
+def initialize_graph(weight_matrix: np.array, labels: LabelIndex,
                      directed: bool):
     """Create a graph out of weight matrix.
 
     :param weight_matrix: 2D matrix of weights
-    :param label_map: how each row of the matrix relates to node label
+    :param labels: label index of the rows of the matrix (or any map of the
+    rows to the labels)
     :param directed: whether the graph is directed
     :return: the generated graph
     """
+    if not isinstance(labels, LabelIndex):
+        labels = LabelIndex(labels[i] for i in range(len(weight_matrix)))
     if directed:
         graph = LinkedDirectedGraph()
     else:
         graph = LinkedGraph()
-    vert_n = len(weight_matrix)
+    no_edge = infinity(weight_matrix.dtype)
 
     # add all vertices
-    for i in range(vert_n):
-        graph.add_vertex(label_map[i])
+    for label in labels:
+        graph.add_vertex(label)
 
-    if directed:
-        # add necessary edges
-        for i in range(vert_n):
-            for ii in range(vert_n):
-                if weight_matrix[i, ii] != inf:
-                    try:
-                        graph.add_edge(label_map[i], label_map[ii],
-                                       weight_matrix[i, ii])
-                    except AttributeError:
-                        continue
-    else:
-        # add necessary edges with regard to symmetrical nature of the matrix
-        for i in range(vert_n):
-            for ii in range(i):
-                if weight_matrix[i, ii] != inf:
-                    try:
-                        graph.add_edge(label_map[i], label_map[ii],
-                                       weight_matrix[i, ii])
-                    except AttributeError:
-                        continue
-
-    print(graph)
+    # the edges and the vertices reference each other, so the cycle
+    # collector would scan the growing graph over and over for nothing
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        # add the edges of every row at once, the lower triangle only with
+        # regard to symmetrical nature of the matrix
+        for band in row_bands(weight_matrix):
+            for i in range(band.start, band.stop):
+                row = weight_matrix[i] if directed else weight_matrix[i, :i]
+                columns = np.flatnonzero(row != no_edge)
+                graph.add_edges_from(labels[i],
+                                     labels.labels_of(columns).tolist(),
+                                     row[columns].tolist())
+    finally:
+        if collecting:
+            gc.enable()
     return graph
 
 
@@ -343,7 +865,166 @@ def show_graph(graph: LinkedGraph, directed: bool):
     plt.show()
 
 
-def main():
+def batch(input_path: str, output_path: str, engine: str = AUTO_ENGINE,
+          workers: int = 1, edge_list: bool = False, directed: bool = False,
+          budget: int = None, dtype: np.dtype = np.float64,
+          cache: ResultCache = None, mark_negative: bool = False,
+          reachable: bool = False, condense: bool = False,
+          decompose: bool = False) -> np.array:
+    """Find all shortest path weights of the graph in the input file and
+    write them to the output file, with no prompts and no printing.
+
+    With a memory budget the weights are found in place in a memory-mapped
+    .npy file, by the out-of-core engine by default: the output file itself
+    or a temporary one streamed into a text output at the end. A .npy input
+    is then mapped too, so graphs larger than the memory can be processed.
+
+    :param input_path: weight matrix or edge list file (see graphio)
+    :param output_path: file to write the matrix of shortest path weights to
+    (.npy, .csv or whitespace separated text)
+    :param engine: name of the engine to run (see run_engine)
+    :param workers: number of processes, more than one runs the parallel
+    engine instead of the chosen one (not with a budget)
+    :param edge_list: whether the input is an edge list, not a weight matrix
+    :param directed: whether the edges of the edge list are directed (a
+    weight matrix is directed if it is not symmetrical)
+    :param budget: memory to stay within in bytes, None to keep the matrices
+    in memory
+    :param dtype: one of engines.DTYPES to find the weights in
+    :param cache: cache to look the result up in and to keep it in (not used
+    with a budget)
+    :param mark_negative: whether to set the weights of the pairs with a
+    path through a negative cycle to -inf instead of stopping (see
+    run_engine, not with a budget)
+    :param reachable: whether to find only which vertices every vertex
+    reaches (see reachability) and write it as a 0/1 matrix, the engine,
+    the budget, the dtype and the cache are not used then
+    :param condense: whether to condense the strongly connected components
+    first when finding the reachable vertices
+    :param decompose: whether to solve the graph component by component
+    (see decomposed_all_pairs) with the engine if it is a dense one (the
+    default one otherwise) and the workers solving the components, the
+    budget and the cache are not used then
+    :return: the matrix of shortest path weights (the bool reachability
+    matrix if reachable)
+    :raise ValueError: if there is no engine with such name, more than one
+    worker is asked with a budget, the input is malformed or a weight can
+    not be represented in dtype
+    :raise NegativeCycleError: if the graph has a negative cycle which is
+    not marked
+    """
+    if reachable or decompose:
+        if edge_list:
+            edges = chain.from_iterable(read_edges(input_path))
+            graph = load_graph(prepare_edges(edges), directed)
+        else:
+            weight_matrix = prepare_weight_matrix(load_matrix(input_path))
+            graph = initialize_graph(weight_matrix,
+                                     LabelIndex(range(len(weight_matrix))),
+                                     is_directed_matrix(weight_matrix))
+        if reachable:
+            matrix = reachability(graph, condense).get_matrix()
+            save_matrix(output_path, matrix.view(np.uint8))
+            return matrix
+        engine = engine if engine in ENGINES else DEFAULT_ENGINE
+        matrix = cast_matrix(
+            decomposed_all_pairs(graph, engine, workers).get_matrix(), dtype)
+        save_matrix(output_path, matrix)
+        return matrix
+
+    check_engine(engine, workers, budget is not None)
+    if budget is not None:
+        cache = None
+    if edge_list and budget is None and engine in (SPARSE_ENGINE,
+                                                   AUTO_ENGINE):
+        # stream the edges into a graph, the dense matrix is built only if
+        # the graph turns out too dense for the sparse engine
+        edges = chain.from_iterable(read_edges(input_path))
+        graph = load_graph(prepare_edges(edges), directed)
+        if engine == SPARSE_ENGINE or (not mark_negative and
+                                       prefers_sparse(graph)):
+            key = fingerprint(graph, dtype)
+            result = cache.get(key) if cache is not None else None
+            if result is not None:
+                matrix = result[0]
+            else:
+                matrix = cast_matrix(all_pairs_sparse(graph, ROUND_POS)[0],
+                                     dtype)
+                if cache is not None:
+                    cache.put(key, matrix)
+            save_matrix(output_path, matrix)
+            return matrix
+        engine = DEFAULT_ENGINE
+
+    if edge_list:
+        source, labels = load_edge_list(input_path, directed)
+    else:
+        source = load_matrix(input_path, mmap=budget is not None)
+        labels = LabelIndex(range(len(source)))
+
+    # with a budget the input is copied by bands into the output file (or a
+    # temporary .npy one for a text output)
+    backing_file = output_path
+    if budget is not None and \
+            os.path.splitext(output_path)[1].lower() != NPY_EXT:
+        handle, backing_file = tempfile.mkstemp(
+            NPY_EXT, dir=os.path.dirname(os.path.abspath(output_path)))
+        os.close(handle)
+    try:
+        if budget is None:
+            weight_matrix = source if source.dtype == dtype \
+                else cast_matrix(source, dtype)
+        else:
+            weight_matrix = create_matrix(backing_file, len(source), dtype)
+            for band in row_bands(weight_matrix, budget):
+                weight_matrix[band] = cast_matrix(source[band], dtype)
+                release_pages(source)
+        prepare_weight_matrix(weight_matrix, budget)
+        if not edge_list:
+            directed = is_directed_matrix(weight_matrix, budget)
+        if cache is not None:
+            key = fingerprint(weight_matrix, dtype)
+            result = cache.get(key)
+            if result is not None:
+                save_matrix(output_path, result[0])
+                return result[0]
+
+        # the graph is built only for the sparse engine
+        if engine == AUTO_ENGINE and budget is None:
+            edge_n = np.count_nonzero(weight_matrix !=
+                                      infinity(weight_matrix.dtype))
+            if not directed:
+                edge_n //= 2
+            use_sparse = (not mark_negative and
+                          sparse_enough(len(weight_matrix), edge_n) and
+                          (directed or not (weight_matrix < 0).any()))
+            engine = SPARSE_ENGINE if use_sparse else DEFAULT_ENGINE
+        graph = None
+        if engine == SPARSE_ENGINE:
+            graph = initialize_graph(weight_matrix, labels, directed)
+
+        # the weight matrix becomes the initial Floyd matrix
+        fill_diagonal(weight_matrix, 0, budget)
+        matrix = run_engine(graph, weight_matrix, engine, workers,
+                            budget=budget, mark_negative=mark_negative)
+        if budget is None:
+            if cache is not None and not has_marked(matrix):
+                cache.put(key, matrix)
+            save_matrix(output_path, matrix)
+        else:
+            if matrix is not weight_matrix:
+                weight_matrix[:] = matrix
+            weight_matrix.flush()
+            if backing_file != output_path:
+                save_matrix(output_path, weight_matrix, budget)
+        return matrix
+    finally:
+        # the temporary file goes whether the run succeeds or not
+        if backing_file != output_path:
+            os.remove(backing_file)
+
+
+def interactive():
     """Get the input, display the graph and analyze it."""
     # get the graph generation method
     while True:
@@ -362,8 +1043,9 @@ def main():
             break
 
     # generate the graph (added for scalability, uses LinkedGraph ADT)
-    weight_matrix, label_map, directed = get_weight_matrix(choice)
-    final_graph = initialize_graph(weight_matrix, label_map, directed)
+    weight_matrix, labels, directed = get_weight_matrix(choice)
+    final_graph = initialize_graph(weight_matrix, labels, directed)
+    print(final_graph)
 
     # display the graph or skip
     if color_input("Display the graph? (y/n)\n", fg=UI_COL) == "y":
@@ -372,7 +1054,84 @@ def main():
 
     # run the floyd algorithm for the graph
     color_print("Path finding...", fg=GOOD_COL, end="\n\n")
-    floyd(final_graph)
+    try:
+        floyd(final_graph)
+    except NegativeCycleError:
+        # floyd() fills no successors, the cycle is found again with them
+        try:
+            all_pairs(final_graph, DEFAULT_ENGINE)
+        except NegativeCycleError as error:
+            cycle = labels.labels_of(error.cycle).tolist()
+            color_print(f"The graph has a negative cycle: "
+                        f"{' -> '.join(map(str, cycle + cycle[:1]))}",
+                        fg=BAD_COL)
+
+
+def main(argv: list = None):
+    """Run the batch mode if an input file is given, the interactive one
+    otherwise."""
+    parser = argparse.ArgumentParser(
+        description="Find shortest path weights between every two nodes. "
+                    "With no arguments the graph is entered interactively.")
+    parser.add_argument("input", nargs="?",
+                        help="weight matrix (.npy, .csv or whitespace "
+                             "separated text, inf for no connection) or edge "
+                             "list with --edges (the rows of the output then "
+                             "follow the order the labels first appear in)")
+    parser.add_argument("output", nargs="?",
+                        help="file to write the distance matrix to (.npy, "
+                             ".csv or whitespace separated text)")
+    parser.add_argument("--edges", action="store_true",
+                        help="the input is an edge list of "
+                             "'from to weight' lines")
+    parser.add_argument("--directed", action="store_true",
+                        help="the edges of the edge list are directed")
+    parser.add_argument("--engine", default=AUTO_ENGINE,
+                        choices=(*ENGINES, SPARSE_ENGINE, AUTO_ENGINE))
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes for the parallel engine "
+                             "(not with --budget)")
+    parser.add_argument("--dtype", default="float64", choices=DTYPES,
+                        help="dtype of the distance matrix, the integer "
+                             "ones need whole weights and find the weights "
+                             "exactly")
+    parser.add_argument("--budget", type=int, metavar="MB",
+                        help="process the matrix out of core within this "
+                             "much memory (a text output is streamed from a "
+                             "temporary .npy file)")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="keep the results in this directory and reuse "
+                             "them for the same input (not with --budget)")
+    parser.add_argument("--mark-negative", action="store_true",
+                        help="write -inf for the pairs with a path through "
+                             "a negative cycle instead of stopping (not "
+                             "with --budget)")
+    parser.add_argument("--reachability", action="store_true",
+                        help="write only whether every node reaches every "
+                             "other one, as a 0/1 matrix")
+    parser.add_argument("--condense", action="store_true",
+                        help="with --reachability: condense the strongly "
+                             "connected components first")
+    parser.add_argument("--decompose", action="store_true",
+                        help="solve every strongly connected (connected if "
+                             "undirected) component on its own, with "
+                             "--workers solving them at once")
+    args = parser.parse_args(argv)
+
+    if args.input is None:
+        interactive()
+    elif args.output is None:
+        parser.error("the output file is required with an input file")
+    elif args.workers > 1 and args.budget and not (args.reachability or
+                                                   args.decompose):
+        parser.error("--workers is not supported with --budget")
+    else:
+        budget = args.budget * 1024 * 1024 if args.budget else None
+        cache = ResultCache(directory=args.cache) if args.cache else None
+        batch(args.input, args.output, args.engine, args.workers,
+              args.edges, args.directed, budget, DTYPES[args.dtype], cache,
+              args.mark_negative, args.reachability, args.condense,
+              args.decompose)
 
 
 if __name__ == '__main__':
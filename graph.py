@@ -12,34 +12,48 @@ recommendations
 """
 from __future__ import annotations
 from abstractcollection import AbstractCollection
-from typing import Union, Any, Iterator, Optional, Collection
+from itertools import repeat
+from types import MappingProxyType
+from typing import Union, Any, Iterator, Optional, Collection, Iterable
+
+
+# edge index of the vertices with no edges, shared and read-only
+NO_EDGES = MappingProxyType({})
 
 
 class LinkedEdge:
-    """Represent an undirected edge.
+    """Represent a view of an undirected edge.
 
-    An edge has two vertices, a weight, and a mark attribute.
+    An edge has two vertices, a weight, and a mark attribute. The weight is
+    kept in the edge indexes of the vertices and the mark by the graph, so
+    an edge is only built when it is asked for and is valid while it is in
+    the graph.
     """
 
-    def __init__(self, one_vertex: LinkedVertex, other_vertex: LinkedVertex,
-                 weight: Union[float, int] = None):
-        """Create an edge.
+    __slots__ = ("_vertex1", "_vertex2")
+
+    def __init__(self, one_vertex: LinkedVertex, other_vertex: LinkedVertex):
+        """Create an edge view.
 
         :param one_vertex: one of the vertices
         :param other_vertex: another vertex
-        :param weight: the weight of the edge
         """
         self._vertex1 = one_vertex
         self._vertex2 = other_vertex
-        self._weight = weight
-        self._mark = False
+
+    def _keys(self) -> tuple:
+        """Return the label pairs of the edge in the edge marks of the graph,
+        one for each direction it can be taken in."""
+        from_label, to_label = self._vertex1._label, self._vertex2._label
+        return (from_label, to_label), (to_label, from_label)
 
     def clear_mark(self):
         """Clears the mark on the edge."""
-        self._mark = False
+        self._vertex1._graph._edge_marks.difference_update(self._keys())
 
     def __hash__(self):
-        return (hash(self._vertex1) << int(self._weight)) ^ hash(self._vertex2)
+        # symmetric like __eq__, the weight is not part of the identity
+        return hash(self._vertex1) ^ hash(self._vertex2)
 
     def __eq__(self, other: LinkedEdge) -> bool:
         """Return True if vertices of the edges match, False otherwise."""
@@ -58,6 +72,8 @@ class LinkedEdge:
 
     def get_other_vertex(self, this_vertex: LinkedVertex) -> LinkedVertex:
         """Return the vertex opposite this_vertex."""
+        if this_vertex is self._vertex1:
+            return self._vertex2
         if this_vertex is None or this_vertex == self._vertex2:
             return self._vertex1
         else:
@@ -65,41 +81,43 @@ class LinkedEdge:
 
     def get_weight(self) -> Union[int, float]:
         """Return the edge's weight."""
-        return self._weight
+        return self._vertex1._edge_index[self._vertex2._label]
 
     def is_marked(self) -> bool:
         """Returns True if the edge is marked, False otherwise."""
-        return self._mark
+        return self._keys()[0] in self._vertex1._graph._edge_marks
 
     def set_mark(self):
         """Set the mark on the edge."""
-        self._mark = True
+        self._vertex1._graph._edge_marks.update(self._keys())
 
     def set_weight(self, weight: Union[int, float]):
         """Set the weight on the edge to given weight."""
-        self._weight = weight
+        self._vertex1._edge_index[self._vertex2._label] = weight
+        self._vertex2._edge_index[self._vertex1._label] = weight
 
     def __repr__(self) -> str:
         """Return the string representation of the edge."""
-        return f"{self._vertex1} -- {self._vertex2} : {self._weight}"
+        return f"{self._vertex1} -- {self._vertex2} : {self.get_weight()}"
 
 
 class LinkedDirectedEdge(LinkedEdge):
-    """Represent a directed edge.
+    """Represent a view of a directed edge.
 
     An edge has a source vertex, a destination vertex,
-    a weight, and a mark attribute.
+    a weight, and a mark attribute. It is created like an undirected one,
+    from the source vertex to the destination one.
     """
 
-    def __init__(self, from_vertex: LinkedVertex, to_vertex: LinkedVertex,
-                 weight: Union[float, int] = None):
-        """Create an edge.
+    __slots__ = ()
 
-        :param from_vertex: the source vertex
-        :param to_vertex: the destination vertex
-        :param weight: the weight of the edge
-        """
-        super().__init__(from_vertex, to_vertex, weight)
+    def _keys(self) -> tuple:
+        """Return the label pair of the edge in the edge marks of the
+        graph."""
+        return (self._vertex1._label, self._vertex2._label),
+
+    def __hash__(self):
+        return hash((self._vertex1, self._vertex2))
 
     def __eq__(self, other: LinkedDirectedEdge) -> bool:
         """Return True if vertices of the edges match, False otherwise."""
@@ -114,28 +132,48 @@ class LinkedDirectedEdge(LinkedEdge):
         """Return the edge's destination vertex."""
         return self._vertex2
 
+    def set_weight(self, weight: Union[int, float]):
+        """Set the weight on the edge to given weight."""
+        self._vertex1._edge_index[self._vertex2._label] = weight
+
     def __repr__(self) -> str:
         """Return the string representation of the edge."""
-        return f"{self._vertex1} -> {self._vertex2} : {self._weight}"
+        return f"{self._vertex1} -> {self._vertex2} : {self.get_weight()}"
 
 
 class LinkedVertex:
     """Represent a vertex.
 
-    A vertex has a label, a list of incident edges,
-    and a mark attribute.
+    A vertex has a label, a dictionary of the weights of the incident edges
+    by the label of the other vertex, its graph, and a mark attribute.
     """
 
-    def __init__(self, label: Any):
+    __slots__ = ("_label", "_edge_index", "_graph", "_mark")
+    # the views of the incident edges
+    _edge_type = LinkedEdge
+
+    def __init__(self, label: Any, graph: LinkedGraph):
         """Create a vertex.
 
         :param label: label of the vertex (can be its content)
+        :param graph: graph of the vertex, which finds the other vertices of
+        the edges by their labels and keeps the edge marks
         """
         self._label = label
-        self._edge_list = list()
+        # weights of the incident edges in the order of addition, by the
+        # label of the other vertex for O(1) lookup, shared and empty until
+        # the first edge
+        self._edge_index = NO_EDGES
+        self._graph = graph
         # whether it is marked
         self._mark = False
 
+    def _own_index(self) -> dict:
+        """Return the edge index of the vertex to add edges to."""
+        if self._edge_index is NO_EDGES:
+            self._edge_index = {}
+        return self._edge_index
+
     def __hash__(self):
         return (hash(self._label) << 5) ^ hash(self.__class__.__name__)
 
@@ -153,6 +191,13 @@ class LinkedVertex:
 
     def set_label(self, label: Any, g: LinkedGraph):
         """Set the vertex's label to label."""
+        # reindex the edges of the vertices pointing to this one
+        for vertex in g.vertices():
+            if self._label in vertex._edge_index:
+                vertex._edge_index[label] = vertex._edge_index.pop(
+                    self._label)
+        g._edge_marks = {tuple(label if end == self._label else end
+                               for end in key) for key in g._edge_marks}
         g._vertices.pop(self._label, None)
         g._vertices[label] = self
         self._label = label
@@ -181,90 +226,108 @@ class LinkedVertex:
         :param to_vertex: vertex to connect to
         :param weight: weight of the edge
         """
-        edge = LinkedEdge(self, to_vertex, weight)
-        self._edge_list.append(edge)
-        to_vertex._edge_list.append(edge)
+        self._own_index()[to_vertex._label] = weight
+        to_vertex._own_index()[self._label] = weight
+
+    def add_edges_to(self, to_vertices: list, weights: list):
+        """Connect the vertex with every vertex of the list, none of them
+        connected with it yet.
+
+        :param to_vertices: vertices to connect to
+        :param weights: weights of the edges in the same order
+        """
+        edge_index = self._own_index()
+        for to_vertex, weight in zip(to_vertices, weights):
+            edge_index[to_vertex._label] = weight
+            to_vertex._own_index()[self._label] = weight
 
     def get_edge_to(self, to_vertex: LinkedVertex) -> Optional[LinkedEdge]:
         """Return the connecting edge if it exists, None otherwise."""
-        edge = LinkedEdge(self, to_vertex)
-        try:
-            # Python in operator uses == operator
-            return self._edge_list[self._edge_list.index(edge)]
-        except ValueError:
+        if to_vertex._label not in self._edge_index:
             return None
+        return self._edge_type(self, to_vertex)
 
     def incident_edges(self) -> Iterator:
         """Generate the incident edges for this vertex."""
-        return iter(self._edge_list)
+        return map(self._edge_type, repeat(self),
+                   self.neighboring_vertices())
 
     def neighboring_vertices(self) -> Iterator:
         """Generate the neighboring vertices for this vertex."""
-        for edge in self._edge_list:
-            yield edge.get_other_vertex(self)
+        return map(self._graph._vertices.__getitem__, self._edge_index)
 
     def remove_edge_to(self, to_vertex: LinkedVertex):
         """Return True if the edge exists and is removed, False otherwise."""
-        edge = LinkedEdge(self, to_vertex)
-        try:
-            edge_i = self._edge_list.index(edge)
-            self._edge_list[edge_i]._edge_list.remove(self)
-            self._edge_list.pop(edge_i)
-            return True
-        except ValueError:
+        if to_vertex._label not in self._edge_index:
             return False
+        if self._graph._edge_marks:
+            self._edge_type(self, to_vertex).clear_mark()
+        del self._edge_index[to_vertex._label]
+        if to_vertex is not self:
+            del to_vertex._edge_index[self._label]
+        return True
 
 
 class LinkedDirectedVertex(LinkedVertex):
     """Represent a vertex in a directed graph.
 
-    A vertex has a label, a list of incident edges,
-    and a mark attribute.
+    A vertex has a label, a dictionary of the weights of the outgoing edges
+    by the label of the destination vertex, its graph, and a mark attribute.
     """
+
+    __slots__ = ()
+    _edge_type = LinkedDirectedEdge
+
     def add_edge_to(self, to_vertex: LinkedVertex, weight: Union[int, float]):
         """Connect two vertices with an edge.
 
         :param to_vertex: vertex to connect to
         :param weight: weight of the edge
         """
-        edge = LinkedDirectedEdge(self, to_vertex, weight)
-        self._edge_list.append(edge)
+        self._own_index()[to_vertex._label] = weight
 
-    def get_edge_to(self, to_vertex: LinkedVertex) -> Optional[LinkedEdge]:
-        """Return the connecting edge if it exists, None otherwise."""
-        edge = LinkedDirectedEdge(self, to_vertex)
-        try:
-            # Python in operator uses == operator
-            return self._edge_list[self._edge_list.index(edge)]
-        except ValueError:
-            return None
+    def add_edges_to(self, to_vertices: list, weights: list):
+        """Connect the vertex to every vertex of the list, none of them
+        connected to yet.
+
+        :param to_vertices: vertices to connect to
+        :param weights: weights of the edges in the same order
+        """
+        self._own_index().update(
+            zip([to_vertex._label for to_vertex in to_vertices], weights))
 
     def remove_edge_to(self, to_vertex: LinkedVertex):
         """Return True if the edge exists and is removed, False otherwise."""
-        edge = LinkedDirectedEdge(self, to_vertex)
-        try:
-            self._edge_list.remove(edge)
-            return True
-        except ValueError:
+        if to_vertex._label not in self._edge_index:
             return False
+        if self._graph._edge_marks:
+            self._edge_type(self, to_vertex).clear_mark()
+        del self._edge_index[to_vertex._label]
+        return True
 
 
 class LinkedGraph(AbstractCollection):
     """Represent an undirected graph.
 
     A graph has a count of vertices, a count of edges,
-    and a dictionary of label/vertex pairs.
+    a dictionary of label/vertex pairs, and the set of the label pairs of
+    the marked edges.
     """
 
     def __init__(self, source_collection: Collection = None):
         self._edge_count = 0
         self._vertices = {}
+        self._edge_marks = set()
         AbstractCollection.__init__(self, source_collection)
 
     def __len__(self) -> int:
         """Return number of the vertices."""
         return self._size
 
+    def is_directed(self) -> bool:
+        """Return True if the edges of the graph are directed."""
+        return False
+
     # Methods for clearing, marks, sizes, string rep
 
     def clear(self):
@@ -272,11 +335,11 @@ class LinkedGraph(AbstractCollection):
         self._size = 0
         self._edge_count = 0
         self._vertices = {}
+        self._edge_marks = set()
 
     def clear_edge_marks(self):
         """Clear all the edge marks."""
-        for edge in self.edges():
-            edge.clear_mark()
+        self._edge_marks.clear()
 
     def clear_vertex_marks(self):
         """Clear all the vertex marks."""
@@ -313,7 +376,7 @@ class LinkedGraph(AbstractCollection):
         is already in the graph."""
         if self.contains_vertex(label):
             raise AttributeError(f"Label {label} already in the graph.")
-        self._vertices[label] = LinkedVertex(label)
+        self._vertices[label] = LinkedVertex(label, self)
         self._size += 1
 
     def contains_vertex(self, label: Any) -> bool:
@@ -339,6 +402,8 @@ class LinkedGraph(AbstractCollection):
         # Examine all other vertices to remove edges directed at the removed
         # vertex
         # In the undirected graph these edges are counted once this way
+        if removed_vertex.remove_edge_to(removed_vertex):
+            self._edge_count -= 1
         for vertex in self.vertices():
             if vertex.remove_edge_to(removed_vertex):
                 self._edge_count -= 1
@@ -366,6 +431,49 @@ class LinkedGraph(AbstractCollection):
         from_vertex.add_edge_to(to_vertex, weight)
         self._edge_count += 1
 
+    def add_edges(self, edges: Iterable):
+        """Connect the vertices of every edge, adding the vertices which are
+        not in the graph yet.
+
+        :param edges: iterable of (from label, to label, weight) tuples
+        :raise AttributeError: if the vertices of an edge are already
+        connected (the edges before it stay added).
+        """
+        vertices = self._vertices
+        for from_label, to_label, weight in edges:
+            if from_label not in vertices:
+                self.add_vertex(from_label)
+            if to_label not in vertices:
+                self.add_vertex(to_label)
+            from_vertex = vertices[from_label]
+            if to_label in from_vertex._edge_index:
+                raise AttributeError(f"An edge already connects "
+                                     f"{from_label} and {to_label}")
+            from_vertex.add_edge_to(vertices[to_label], weight)
+            self._edge_count += 1
+
+    def add_edges_from(self, from_label: Any, to_labels: list,
+                       weights: list):
+        """Connect a vertex with every vertex of the list at once.
+
+        :param from_label: label of the vertex to connect
+        :param to_labels: distinct labels of the vertices to connect with
+        :param weights: weights of the edges in the same order
+        :raise AttributeError: if a vertex is not in the graph or is already
+        connected with the vertex (no edge is added then).
+        """
+        vertices = self._vertices
+        try:
+            from_vertex = vertices[from_label]
+            to_vertices = [vertices[label] for label in to_labels]
+        except KeyError as error:
+            raise AttributeError(f"Label {error.args[0]} not in the graph.")
+        if not from_vertex._edge_index.keys().isdisjoint(to_labels):
+            raise AttributeError(f"An edge already connects {from_label} "
+                                 f"and one of the vertices")
+        from_vertex.add_edges_to(to_vertices, weights)
+        self._edge_count += len(to_vertices)
+
     def contains_edge(self, from_label: Any, to_label: Any) -> bool:
         """Return True if an edge connects the vertices, False otherwise."""
         return self.get_edge(from_label, to_label) is not None
@@ -399,11 +507,15 @@ class LinkedGraph(AbstractCollection):
         return self.vertices()
 
     def edges(self) -> Iterator:
-        """Iterate over the edges in the graph."""
-        result = set()
+        """Iterate over the edges in the graph (each one once)."""
+        # an edge is in the indexes of both vertices, it is yielded from the
+        # vertex which comes first
+        done = set()
         for vertex in self.vertices():
-            result |= set(vertex.incident_edges())
-        return iter(result)
+            for edge in vertex.incident_edges():
+                if edge._vertex2._label not in done:
+                    yield edge
+            done.add(vertex._label)
 
     def vertices(self) -> Iterator:
         """Iterate over the vertices in the graph."""
@@ -433,6 +545,10 @@ class LinkedDirectedGraph(LinkedGraph):
     and a dictionary of label/vertex pairs.
     """
 
+    def is_directed(self) -> bool:
+        """Return True if the edges of the graph are directed."""
+        return True
+
     # Vertex related methods
 
     def add_vertex(self, label: Any):
@@ -443,7 +559,7 @@ class LinkedDirectedGraph(LinkedGraph):
         is already in the graph."""
         if self.contains_vertex(label):
             raise AttributeError(f"Label {label} already in the graph.")
-        self._vertices[label] = LinkedDirectedVertex(label)
+        self._vertices[label] = LinkedDirectedVertex(label, self)
         self._size += 1
 
     def remove_vertex(self, label: Any) -> bool:
@@ -459,8 +575,10 @@ class LinkedDirectedGraph(LinkedGraph):
                 self._edge_count -= 1
 
         # Examine all edges from the removed vertex to others
-        for edge in removed_vertex.incident_edges():
-            self._edge_count -= 1
+        self._edge_count -= len(removed_vertex._edge_index)
+        if self._edge_marks:
+            self._edge_marks = {key for key in self._edge_marks
+                                if key[0] != label}
         self._size -= 1
         return True
 
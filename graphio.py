@@ -0,0 +1,247 @@
+"""Bulk reading and writing of weight matrices and edge lists.
+
+The format is chosen by the extension of the file: .npy for numpy arrays,
+.csv for comma separated values and whitespace separated text otherwise.
+"""
+import os
+import numpy as np
+from itertools import islice
+from math import inf
+from typing import Any, Iterable, Iterator, Union
+from engines import cast_matrix, row_bands
+from graph import LinkedGraph, LinkedDirectedGraph
+from labelindex import LabelIndex
+
+NPY_EXT = ".npy"
+CSV_EXT = ".csv"
+# edges read and added to a graph at a time
+CHUNK_EDGES = 100000
+
+
+def _delimiter(path: str) -> str:
+    """Return the delimiter of the text file (None for whitespace)."""
+    return "," if os.path.splitext(path)[1].lower() == CSV_EXT else None
+
+
+def load_matrix(path: str, mmap: bool = False) -> np.array:
+    """Read a square weight matrix in one bulk read.
+
+    inf (or a missing edge written as "inf") represents no connection.
+
+    :param path: .npy, .csv or whitespace separated text file
+    :param mmap: whether to map a .npy file read-only instead of reading it,
+    its dtype is then kept
+    :return: 2D float matrix
+    :raise ValueError: if the matrix is not square
+    """
+    if os.path.splitext(path)[1].lower() == NPY_EXT:
+        if mmap:
+            matrix = np.load(path, mmap_mode="r")
+        else:
+            matrix = np.load(path).astype(np.float64)
+    else:
+        matrix = np.loadtxt(path, dtype=np.float64, delimiter=_delimiter(path),
+                            ndmin=2)
+    if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+        raise ValueError(f"The matrix in {path} is not square.")
+    return matrix
+
+
+def load_edge_list(path: str, directed: bool) -> (np.array, LabelIndex):
+    """Read an edge list in one bulk read and build its weight matrix.
+
+    Every line is "<from label> <to label> <weight>" (comma separated in
+    .csv files). The rows of the matrix follow the order the labels first
+    appear in, like the vertices of a graph made by load_graph.
+
+    :param path: .csv or whitespace separated text file
+    :param directed: whether the edges are directed, undirected edges are
+    set in both directions
+    :return: a tuple of the 2D weight matrix (inf for no connection) and the
+    label index of the rows
+    :raise ValueError: if a line is not an edge or an edge is repeated
+    """
+    edges = np.loadtxt(path, dtype=str, delimiter=_delimiter(path), ndmin=2)
+    if edges.size and edges.shape[1] != 3:
+        raise ValueError(f"The lines of {path} must be: from to weight.")
+    edges = edges.reshape(-1, 3)
+    labels, first, rows = np.unique(edges[:, :2], return_index=True,
+                                    return_inverse=True)
+    # renumber the sorted labels by their first appearance
+    order = np.argsort(first)
+    renumber = np.empty(len(labels), dtype=np.int64)
+    renumber[order] = np.arange(len(labels))
+    labels = labels[order]
+    rows = renumber[rows].reshape(-1, 2)
+    weights = edges[:, 2].astype(np.float64)
+
+    # an undirected edge may be listed in both directions with one weight
+    pairs = rows if directed else np.sort(rows, axis=1)
+    keys = pairs[:, 0] * len(labels) + pairs[:, 1]
+    unique = np.unique(np.column_stack((keys, weights)), axis=0)
+    if len(np.unique(unique[:, 0])) != len(unique) or (
+            directed and len(unique) != len(keys)):
+        raise ValueError(f"An edge is repeated in {path}.")
+
+    matrix = np.full((len(labels), len(labels)), inf)
+    matrix[rows[:, 0], rows[:, 1]] = weights
+    if not directed:
+        matrix[rows[:, 1], rows[:, 0]] = weights
+    return matrix, LabelIndex(labels.tolist())
+
+
+def read_edges(path: str, chunk_size: int = CHUNK_EDGES) -> Iterator:
+    """Read an edge list file by chunks.
+
+    Every line is "<from label> <to label> <weight>" (comma separated in
+    .csv files), empty lines and lines starting with # are skipped.
+
+    :param path: .csv or whitespace separated text file
+    :param chunk_size: number of lines in a chunk
+    :return: generator of the lists of (from label, to label, weight) of
+    every chunk, the labels are strings
+    :raise ValueError: if a line is not an edge
+    """
+    delimiter = _delimiter(path)
+    with open(path) as file:
+        while True:
+            lines = list(islice(file, chunk_size))
+            if not lines:
+                return
+            chunk = []
+            for line in lines:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                fields = line.split(delimiter)
+                if len(fields) != 3:
+                    raise ValueError(f"The lines of {path} must be: "
+                                     f"from to weight, not: {line}")
+                chunk.append((fields[0].strip(), fields[1].strip(),
+                              float(fields[2])))
+            yield chunk
+
+
+def _chunks(edges: Iterable, chunk_size: int) -> Iterator:
+    """Generate the lists of chunk_size edges of the iterable."""
+    edges = iter(edges)
+    while True:
+        chunk = list(islice(edges, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _listed_reverse(graph: LinkedGraph, from_label: Any, to_label: Any,
+                    weight: Union[int, float]) -> bool:
+    """Return True if the undirected graph has the edge with the weight
+    already, False otherwise."""
+    if not (graph.contains_vertex(from_label) and
+            graph.contains_vertex(to_label)):
+        return False
+    edge = graph.get_edge(from_label, to_label)
+    return edge is not None and edge.get_weight() == weight
+
+
+def load_graph(source: Union[str, Iterable], directed: bool = None,
+               chunk_size: int = CHUNK_EDGES) -> LinkedGraph:
+    """Build a graph from an edge list, streaming the edges into it by
+    chunks with no dense matrix, so the memory grows with the edges only.
+
+    :param source: edge list file (see read_edges) or an iterable of
+    (from label, to label, weight) tuples
+    :param directed: whether the edges are directed (an undirected edge may
+    be listed in both directions), None to find it out while reading: the
+    graph is undirected if every edge but the self loops comes with the
+    reverse one of the same weight
+    :param chunk_size: number of edges added at a time
+    :return: the graph, its vertices are in the order their labels first
+    appear in
+    :raise ValueError: if a line of the file is not an edge
+    :raise AttributeError: if an edge is repeated
+    """
+    if isinstance(source, str):
+        chunks = read_edges(source, chunk_size)
+    else:
+        chunks = _chunks(source, chunk_size)
+    graph = LinkedGraph() if directed is False else LinkedDirectedGraph()
+
+    # edges with no reverse one seen yet, None once it is known to be
+    # directed
+    unmatched = {} if directed is None else None
+    for chunk in chunks:
+        if directed is False:
+            # filtered lazily to see the reverse edges of the same chunk
+            graph.add_edges(edge for edge in chunk
+                            if not _listed_reverse(graph, *edge))
+        else:
+            graph.add_edges(chunk)
+        if unmatched is None:
+            continue
+        for from_label, to_label, weight in chunk:
+            if from_label == to_label:
+                continue
+            reverse_weight = unmatched.pop((to_label, from_label), None)
+            if reverse_weight is None:
+                unmatched[from_label, to_label] = weight
+            elif reverse_weight != weight:
+                unmatched = None
+                break
+    if directed is not None or unmatched is None or unmatched:
+        return graph
+
+    # every edge came with its reverse one: keep them once
+    undirected = LinkedGraph()
+    for vertex in graph.vertices():
+        undirected.add_vertex(vertex.get_label())
+    for edge in graph.edges():
+        from_label, to_label = (vertex.get_label()
+                                for vertex in edge.get_vertices())
+        if not undirected.contains_edge(from_label, to_label):
+            undirected.add_edge(from_label, to_label, edge.get_weight())
+    return undirected
+
+
+def create_matrix(path: str, vert_n: int,
+                  dtype: np.dtype = np.float64) -> np.memmap:
+    """Create a .npy file backing a square matrix and map it.
+
+    :param path: .npy file to create (overwritten if it exists)
+    :param vert_n: number of rows and columns
+    :param dtype: dtype of the matrix
+    :return: the writable memory-mapped matrix (not initialized)
+    :raise ValueError: if the file is not a .npy one
+    """
+    if os.path.splitext(path)[1].lower() != NPY_EXT:
+        raise ValueError(f"A backing file must be a {NPY_EXT} file: {path}")
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype,
+                                     shape=(vert_n, vert_n))
+
+
+def save_matrix(path: str, matrix: np.array, budget: int = None):
+    """Write the matrix by bands of rows, so that only a band of a
+    memory-mapped matrix is resident at a time.
+
+    A .npy file keeps the dtype, in a text file no connection is inf for any
+    dtype.
+
+    :param path: .npy, .csv or whitespace separated text file
+    :param matrix: 2D matrix to write
+    :param budget: memory to stay within in bytes (engines.MEMORY_BUDGET by
+    default)
+    """
+    if os.path.splitext(path)[1].lower() == NPY_EXT:
+        with open(path, "wb") as file:
+            np.lib.format.write_array_header_1_0(file, {
+                "descr": np.lib.format.dtype_to_descr(matrix.dtype),
+                "fortran_order": False, "shape": matrix.shape})
+            for band in row_bands(matrix, budget):
+                file.write(np.ascontiguousarray(matrix[band]).data)
+    else:
+        delimiter = _delimiter(path) or " "
+        with open(path, "w") as file:
+            for band in row_bands(matrix, budget):
+                rows = matrix[band]
+                if rows.dtype.kind != "f":
+                    rows = cast_matrix(rows, np.float64)
+                np.savetxt(file, rows, delimiter=delimiter, fmt="%.15g")
@@ -0,0 +1,89 @@
+"""Two-way index of the rows of the matrices and the labels of the vertices.
+
+The rows follow the order of the vertices of the graph. The labels of the
+rows are kept in an object array, so the labels of many rows are taken by
+a single indexing, and the rows of the labels in a dict, which is looked up
+for many labels at once by mapping it over them with no Python loop.
+"""
+from __future__ import annotations
+import numpy as np
+from typing import Any, Iterable, Iterator
+from graph import LinkedGraph
+
+
+class LabelIndex:
+    """Represent the rows of the vertices of a graph both ways: the label of
+    every row and the row of every label.
+    """
+
+    def __init__(self, labels: Iterable):
+        """Create the index.
+
+        :param labels: labels of the rows in order
+        :raise ValueError: if a label is repeated
+        """
+        labels = list(labels)
+        # filled from an iterator, so that labels which are tuples are not
+        # taken for rows of a 2D array
+        self._labels = np.fromiter(labels, dtype=object, count=len(labels))
+        self._labels.flags.writeable = False
+        self._rows = {label: row for row, label in enumerate(labels)}
+        if len(self._rows) != len(labels):
+            raise ValueError("The labels of the rows must be unique.")
+
+    @staticmethod
+    def from_graph(graph: LinkedGraph) -> LabelIndex:
+        """Index the labels of the graph (linked or compact) in the order
+        of its vertices."""
+        return LabelIndex(vertex.get_label() for vertex in graph.vertices())
+
+    def __len__(self) -> int:
+        """Return the number of rows."""
+        return len(self._labels)
+
+    def __iter__(self) -> Iterator:
+        """Iterate over the labels in the order of the rows."""
+        return iter(self._labels.tolist())
+
+    def __getitem__(self, row: int) -> Any:
+        """Return the label of the row."""
+        return self._labels[row]
+
+    def __contains__(self, label: Any) -> bool:
+        """Return True if a row has the label, False otherwise."""
+        return label in self._rows
+
+    def get_labels(self) -> np.array:
+        """Return the read-only array of the labels of the rows."""
+        return self._labels
+
+    def get_row(self, label: Any) -> int:
+        """Return the row of the label.
+
+        :raise AttributeError: if there is no vertex with label.
+        """
+        if label not in self._rows:
+            raise AttributeError(f"Label {label} not in the graph.")
+        return self._rows[label]
+
+    def rows_of(self, labels: Iterable) -> np.array:
+        """Return the rows of the labels.
+
+        :param labels: labels to translate
+        :return: 1D int64 array of their rows, in the same order
+        :raise AttributeError: if a vertex is not in the graph.
+        """
+        try:
+            return np.fromiter(map(self._rows.__getitem__, labels),
+                               dtype=np.int64)
+        except KeyError as error:
+            raise AttributeError(f"Label {error.args[0]} not in the "
+                                 f"graph.") from None
+
+    def labels_of(self, rows: Iterable) -> np.array:
+        """Return the labels of the rows.
+
+        :param rows: rows to translate
+        :return: 1D object array of their labels, in the same order
+        """
+        return self._labels[np.asarray(rows, dtype=np.int64)]
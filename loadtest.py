@@ -0,0 +1,132 @@
+"""Load test of the shortest path query service (see server.py).
+
+Every connection keeps a number of requests in flight, sending the next one
+as soon as a response comes, and the time from sending a request to its
+response is its latency.
+"""
+import argparse
+import asyncio
+import json
+import random as rd
+import time
+import numpy as np
+from server import DEFAULT_HOST, DEFAULT_PORT, LINE_LIMIT
+
+# ops queried by default
+QUERY_OPS = ("dist", "path", "k_nearest", "row")
+# k of the k_nearest queries
+NEAREST_K = 10
+
+
+def random_request(labels: list, ops: tuple, generator: rd.Random) -> dict:
+    """Return a query of one of the ops between random vertices."""
+    op = generator.choice(ops)
+    request = {"op": op, "u": generator.choice(labels)}
+    if op in ("dist", "path"):
+        request["v"] = generator.choice(labels)
+    elif op == "k_nearest":
+        request["k"] = NEAREST_K
+    return request
+
+
+async def _open(host: str, port: int, path: str = None) -> tuple:
+    """Return the reader and the writer of a new connection."""
+    if path is not None:
+        return await asyncio.open_unix_connection(path, limit=LINE_LIMIT)
+    return await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+
+
+async def _run_connection(reader: asyncio.StreamReader,
+                          writer: asyncio.StreamWriter, requests: list,
+                          pipeline: int, latencies: list):
+    """Send the requests keeping pipeline of them in flight and keep their
+    latencies in seconds."""
+    sent = {}
+
+    def send(number: int):
+        sent[number] = time.perf_counter()
+        writer.write(json.dumps({"id": number, **requests[number]}).encode()
+                     + b"\n")
+
+    for number in range(min(pipeline, len(requests))):
+        send(number)
+    following = len(sent)
+    while sent:
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - sent.pop(response["id"]))
+        if "error" in response:
+            raise ValueError(response["error"])
+        if following < len(requests):
+            send(following)
+            following += 1
+        await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+
+async def load_test(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                    path: str = None, connections: int = 8,
+                    requests: int = 10000, pipeline: int = 16,
+                    ops: tuple = QUERY_OPS, seed: int = 0) -> dict:
+    """Query the service from many connections at once.
+
+    :param host: address of the service
+    :param port: TCP port of the service
+    :param path: Unix socket of the service instead of the TCP port
+    :param connections: number of connections querying at once
+    :param requests: number of requests of every connection
+    :param pipeline: number of requests in flight on every connection
+    :param ops: ops to choose the queries from at random
+    :param seed: seed of the random queries
+    :return: map of "requests", "seconds", "qps", "p50" and "p99" (the
+    latencies in seconds)
+    :raise ValueError: if a query fails
+    """
+    generator = rd.Random(seed)
+    reader, writer = await _open(host, port, path)
+    writer.write(b'{"op": "labels"}\n')
+    labels = json.loads(await reader.readline())["result"]
+    writer.close()
+    plans = [[random_request(labels, ops, generator)
+              for _ in range(requests)] for _ in range(connections)]
+    streams = [await _open(host, port, path) for _ in range(connections)]
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _run_connection(reader, writer, plan, pipeline, latencies)
+        for (reader, writer), plan in zip(streams, plans)))
+    seconds = time.perf_counter() - start
+    p50, p99 = np.percentile(latencies, (50, 99)).tolist()
+    return {"requests": len(latencies), "seconds": seconds,
+            "qps": len(latencies) / seconds, "p50": p50, "p99": p99}
+
+
+def main(argv: list = None):
+    """Load test a running service and print the results."""
+    parser = argparse.ArgumentParser(
+        description="Load test the shortest path query service.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH",
+                        help="connect to this Unix socket instead")
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=10000,
+                        help="number of requests of every connection")
+    parser.add_argument("--pipeline", type=int, default=16,
+                        help="number of requests in flight on every "
+                             "connection")
+    parser.add_argument("--ops", default=",".join(QUERY_OPS),
+                        help="comma separated ops to query")
+    args = parser.parse_args(argv)
+
+    stats = asyncio.run(load_test(args.host, args.port, args.unix,
+                                  args.connections, args.requests,
+                                  args.pipeline, tuple(args.ops.split(","))))
+    print(f"{stats['requests']} requests in {stats['seconds']:.2f} s: "
+          f"{stats['qps']:.0f} QPS, p50 {stats['p50'] * 1000:.3f} ms, "
+          f"p99 {stats['p99'] * 1000:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""Single-source and point-to-point shortest paths over the graph adjacency.
+
+The queries walk the incident edges of the vertices from the source only,
+so they never build a V×V matrix: Dijkstra with a binary heap when no
+weight is negative (stopping at the target if there is one), Bellman-Ford
+otherwise. A point-to-point query on an undirected graph searches from both
+ends at once; the linked directed graphs keep no incoming edges, so it
+searches from the source only there.
+"""
+from heapq import heappush, heappop
+from itertools import count
+from math import inf
+from typing import Any, Optional
+from compactgraph import CompactGraph
+from engines import NegativeCycleError
+from graph import LinkedGraph
+
+
+def has_negative_weights(graph: LinkedGraph) -> bool:
+    """Return True if an edge of the graph has a negative weight, False
+    otherwise (in O(E))."""
+    if isinstance(graph, CompactGraph):
+        weights = graph.csr()[2]
+        return bool(len(weights) and weights.min() < 0)
+    return any(edge.get_weight() < 0 for vertex in graph.vertices()
+               for edge in vertex.incident_edges())
+
+
+def restore_path(previous: dict, from_label: Any, to_label: Any) -> list:
+    """Return the labels on the path from one vertex to another.
+
+    :param previous: map of the labels to the labels before them on their
+    paths
+    :param from_label: label of the first vertex of the path
+    :param to_label: label of the last vertex of the path
+    :return: the list of labels from from_label to to_label inclusive
+    """
+    path = [to_label]
+    while path[-1] != from_label:
+        path.append(previous[path[-1]])
+    path.reverse()
+    return path
+
+
+def dijkstra_from(graph: LinkedGraph, label: Any, round_pos: int,
+                  target: Any = None) -> (dict, dict):
+    """Find the shortest path weights from the vertex with Dijkstra.
+
+    All the weights must be non-negative.
+
+    :param graph: the graph to search
+    :param label: label of the source vertex
+    :param round_pos: number of positions to round every sum to
+    :param target: label of the vertex to stop at once its weight is final,
+    None to find all of them
+    :return: a tuple of the maps of the labels of the reached vertices to
+    their weights and to the labels before them on their paths
+    :raise AttributeError: if a vertex is not in the graph
+    """
+    source = graph.get_vertex(label)
+    if target is not None:
+        graph.get_vertex(target)
+    distances = {label: 0}
+    previous = {}
+    done = set()
+    # the counter breaks the ties of the weights, labels may not compare
+    order = count()
+    heap = [(0, next(order), source)]
+    while heap:
+        distance, _, vertex = heappop(heap)
+        vertex_label = vertex.get_label()
+        if vertex_label in done:
+            continue
+        done.add(vertex_label)
+        if vertex_label == target:
+            break
+        for edge in vertex.incident_edges():
+            other = edge.get_other_vertex(vertex)
+            other_label = other.get_label()
+            new_distance = round(distance + edge.get_weight(), round_pos)
+            if new_distance < distances.get(other_label, inf):
+                distances[other_label] = new_distance
+                previous[other_label] = vertex_label
+                heappush(heap, (new_distance, next(order), other))
+    if target is not None:
+        # the weights of the vertices left in the heap are not final
+        distances = {key: distances[key] for key in done}
+    return distances, previous
+
+
+def bellman_ford_from(graph: LinkedGraph, label: Any,
+                      round_pos: int) -> (dict, dict):
+    """Find the shortest path weights from the vertex with Bellman-Ford.
+
+    The weights may be negative.
+
+    :param graph: the graph to search
+    :param label: label of the source vertex
+    :param round_pos: number of positions to round every sum to
+    :return: a tuple of the maps of the labels of the reached vertices to
+    their weights and to the labels before them on their paths
+    :raise AttributeError: if the vertex is not in the graph
+    :raise NegativeCycleError: if a negative cycle is reachable from the
+    vertex (any negative edge of an undirected graph is one)
+    """
+    distances = {label: 0}
+    previous = {}
+    vertices = {label: graph.get_vertex(label)}
+    # only the vertices relaxed in a pass can relax others in the next one
+    changed = [label]
+    for _ in range(graph.size_vertices()):
+        relaxed = {}
+        for vertex_label in changed:
+            vertex = vertices[vertex_label]
+            distance = distances[vertex_label]
+            for edge in vertex.incident_edges():
+                other = edge.get_other_vertex(vertex)
+                other_label = other.get_label()
+                new_distance = round(distance + edge.get_weight(), round_pos)
+                if new_distance < distances.get(other_label, inf):
+                    distances[other_label] = new_distance
+                    previous[other_label] = vertex_label
+                    vertices[other_label] = other
+                    relaxed[other_label] = None
+        if not relaxed:
+            return distances, previous
+        changed = list(relaxed)
+    raise NegativeCycleError()
+
+
+def bidirectional_dijkstra(graph: LinkedGraph, from_label: Any,
+                           to_label: Any, round_pos: int) -> (float,
+                                                              Optional[list]):
+    """Find the shortest path between the vertices of an undirected graph
+    with Dijkstra from both of them at once.
+
+    All the weights must be non-negative. The searches stop when the
+    weights at the tops of their heaps add up to at least the best path met.
+
+    :param graph: the undirected graph to search
+    :param from_label: label of the source vertex
+    :param to_label: label of the destination vertex
+    :param round_pos: number of positions to round every sum to
+    :return: a tuple of the weight of the path (inf if there is none) and
+    the list of labels on it (None if there is none)
+    :raise AttributeError: if a vertex is not in the graph
+    """
+    ends = (graph.get_vertex(from_label), graph.get_vertex(to_label))
+    if from_label == to_label:
+        return 0, [from_label]
+    order = count()
+    distances = ({from_label: 0}, {to_label: 0})
+    previous = ({}, {})
+    done = (set(), set())
+    heaps = ([(0, next(order), ends[0])], [(0, next(order), ends[1])])
+    best, meeting = inf, None
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        # expand the side with the closer top
+        side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        distance, _, vertex = heappop(heaps[side])
+        vertex_label = vertex.get_label()
+        if vertex_label in done[side]:
+            continue
+        done[side].add(vertex_label)
+        for edge in vertex.incident_edges():
+            other = edge.get_other_vertex(vertex)
+            other_label = other.get_label()
+            new_distance = round(distance + edge.get_weight(), round_pos)
+            if new_distance < distances[side].get(other_label, inf):
+                distances[side][other_label] = new_distance
+                previous[side][other_label] = vertex_label
+                heappush(heaps[side], (new_distance, next(order), other))
+            # a path through the edge joins the two searches
+            if other_label in distances[1 - side]:
+                through = round(distances[side][other_label] +
+                                distances[1 - side][other_label], round_pos)
+                if through < best:
+                    best, meeting = through, other_label
+    if meeting is None:
+        return inf, None
+    path = restore_path(previous[0], from_label, meeting)
+    backward = restore_path(previous[1], to_label, meeting)
+    return best, path + backward[-2::-1]
+
+
+def single_source(graph: LinkedGraph, label: Any, round_pos: int,
+                  negative: bool = None) -> dict:
+    """Find the shortest path weights from the vertex to all the vertices
+    reachable from it.
+
+    :param graph: the graph to search
+    :param label: label of the source vertex
+    :param round_pos: number of positions to round every sum to
+    :param negative: whether the graph has negative weights (Bellman-Ford
+    is run then, Dijkstra otherwise), None to check it in O(E)
+    :return: map of the labels of the reachable vertices to their weights
+    :raise AttributeError: if the vertex is not in the graph
+    :raise NegativeCycleError: if a negative cycle is reachable from the
+    vertex
+    """
+    if negative is None:
+        negative = has_negative_weights(graph)
+    if negative:
+        return bellman_ford_from(graph, label, round_pos)[0]
+    return dijkstra_from(graph, label, round_pos)[0]
+
+
+def point_to_point(graph: LinkedGraph, from_label: Any, to_label: Any,
+                   round_pos: int, negative: bool = None) -> (float,
+                                                              Optional[list]):
+    """Find the shortest path between the vertices.
+
+    :param graph: the graph to search
+    :param from_label: label of the source vertex
+    :param to_label: label of the destination vertex
+    :param round_pos: number of positions to round every sum to
+    :param negative: whether the graph has negative weights (Bellman-Ford
+    is run then, Dijkstra otherwise), None to check it in O(E)
+    :return: a tuple of the weight of the path (inf if there is none) and
+    the list of labels on it (None if there is none)
+    :raise AttributeError: if a vertex is not in the graph
+    :raise NegativeCycleError: if a negative cycle is reachable from the
+    source
+    """
+    if negative is None:
+        negative = has_negative_weights(graph)
+    if negative:
+        graph.get_vertex(to_label)
+        distances, previous = bellman_ford_from(graph, from_label, round_pos)
+    elif not graph.is_directed():
+        return bidirectional_dijkstra(graph, from_label, to_label, round_pos)
+    else:
+        distances, previous = dijkstra_from(graph, from_label, round_pos,
+                                            to_label)
+    if to_label not in distances:
+        return inf, None
+    return distances[to_label], restore_path(previous, from_label, to_label)
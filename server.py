@@ -0,0 +1,405 @@
+"""Shortest path queries served over a socket from a precomputed result.
+
+The weights and the successors between all the vertices are found once
+(or loaded from a result cache) and the queries are answered from them over
+a TCP or a Unix socket, with a JSON object per line both ways:
+
+    {"id": 1, "op": "dist", "u": "a", "v": "b"}     -> weight or null
+    {"id": 2, "op": "row", "u": "a"}                -> [[label, weight], ..]
+    {"id": 3, "op": "k_nearest", "u": "a", "k": 5}  -> [[label, weight], ..]
+    {"id": 4, "op": "path", "u": "a", "v": "b"}     -> {"dist": .., "path": ..}
+    {"id": 5, "op": "labels"}                       -> [label, ..]
+    {"id": 6, "op": "version"}                      -> number of updates
+    {"id": 7, "op": "update", "edges": [["a", "b", 2.5], ["b", "c", null]]}
+                                                    -> the new version
+
+Every response is {"id": .., "result": ..} or {"id": .., "error": ".."},
+the id is echoed only if the request has one. null stands for no
+connection (inf) and, in an update, for removing the edge.
+
+A client may send many requests without waiting for the responses. The
+queries are answered in order as they are read, against the result in use
+at that moment, which is never changed in place. An update sets the weights
+of the edges (the vertices are fixed) and is recomputed from scratch in a
+pool of processes; its response comes when the new result is in use, so it
+may come after those of the queries sent after it. Updates are applied one
+at a time in the order they arrive.
+"""
+import argparse
+import asyncio
+import json
+import signal
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from math import inf
+from typing import Any, Optional
+from cache import ResultCache, fingerprint
+from engines import ENGINES, DEFAULT_ENGINE, init_next_hop, walk_path
+from floyd import ROUND_POS, prepare_weight_matrix, is_directed_matrix
+from graphio import load_matrix, load_edge_list
+from labelindex import LabelIndex
+
+# largest request line in bytes
+LINE_LIMIT = 16 * 1024 * 1024
+# bytes of unsent responses over which a connection stops reading until
+# the client takes them
+WRITE_BUFFER = 256 * 1024
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+def solve(weights: np.array, engine: str = DEFAULT_ENGINE) -> (np.array,
+                                                               np.array):
+    """Find the shortest path weights and the successors of the weights.
+
+    :param weights: 2D weight matrix (see load_weights), not changed
+    :param engine: name of one of engines.ENGINES
+    :return: a tuple of the matrix of shortest path weights and the
+    successor matrix
+    :raise NegativeCycleError: if the graph has a negative cycle
+    """
+    matrix = np.array(weights)
+    np.fill_diagonal(matrix, 0)
+    next_hop = init_next_hop(matrix)
+    return ENGINES[engine](matrix, ROUND_POS, next_hop), next_hop
+
+
+def load_weights(input_path: str, edge_list: bool = False,
+                 directed: bool = False) -> (np.array, LabelIndex, bool):
+    """Read the graph to serve.
+
+    :param input_path: weight matrix or edge list file (see graphio)
+    :param edge_list: whether the input is an edge list
+    :param directed: whether the edges of the edge list are directed (a
+    weight matrix is directed if it is not symmetrical)
+    :return: a tuple of the weight matrix (rounded, inf on the diagonal),
+    the label index of its rows and whether the graph is directed
+    :raise ValueError: if the input is malformed
+    """
+    if edge_list:
+        weights, labels = load_edge_list(input_path, directed)
+    else:
+        weights = load_matrix(input_path)
+        labels = LabelIndex(range(len(weights)))
+    prepare_weight_matrix(weights)
+    if not edge_list:
+        directed = is_directed_matrix(weights)
+    return weights, labels, directed
+
+
+def _weight(value: float) -> Optional[float]:
+    """Return the weight as JSON has it, None for inf."""
+    return None if value == inf else float(value)
+
+
+class QueryService:
+    """Represent the shortest path result of a graph answering the queries
+    of the clients, kept up to date with the updates of its edges.
+    """
+
+    def __init__(self, weights: np.array, labels: LabelIndex, directed: bool,
+                 engine: str = DEFAULT_ENGINE, workers: int = 1,
+                 cache: ResultCache = None):
+        """Create the service, start must be awaited before serving.
+
+        :param weights: 2D weight matrix (see load_weights)
+        :param labels: label index of the rows
+        :param directed: whether the graph is directed
+        :param engine: name of one of engines.ENGINES to find the results
+        with
+        :param workers: number of processes finding the results
+        :param cache: cache to look the results up in and to keep them in
+        :raise ValueError: if there is no engine with such name
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine}, choose one of: "
+                             f"{', '.join(ENGINES)}")
+        self._weights = weights
+        self._labels = labels
+        self._directed = directed
+        self._engine = engine
+        self._cache = cache
+        self._pool = ProcessPoolExecutor(workers)
+        self._updating = asyncio.Lock()
+        # the matrices of the result in use, replaced as a whole
+        self._result = None
+        self._version = 0
+
+    def get_version(self) -> int:
+        """Return the number of updates in the result in use."""
+        return self._version
+
+    def get_row(self, label: Any) -> int:
+        """Return the row of the vertex with label.
+
+        :raise AttributeError: if there is no vertex with label.
+        """
+        return self._labels.get_row(label)
+
+    async def _solve(self, weights: np.array) -> (np.array, np.array):
+        """Find the result of the weights in the pool (or in the cache)."""
+        loop = asyncio.get_running_loop()
+        if self._cache is None:
+            return await loop.run_in_executor(self._pool, solve, weights,
+                                              self._engine)
+        # hashing the weights and reading or writing the files of the cache
+        # take long for a large graph, they are done in the default thread
+        # pool so that the queries are answered meanwhile
+        key = await loop.run_in_executor(None, fingerprint, weights)
+        result = await loop.run_in_executor(None, self._cache.get, key, True)
+        if result is None:
+            result = await loop.run_in_executor(self._pool, solve, weights,
+                                                self._engine)
+            await loop.run_in_executor(None, self._cache.put, key, *result)
+        return result
+
+    async def start(self):
+        """Find the first result.
+
+        :raise NegativeCycleError: if the graph has a negative cycle
+        """
+        self._result = await self._solve(self._weights)
+
+    def close(self):
+        """Stop the processes of the pool, dropping the pending updates."""
+        self._pool.shutdown(cancel_futures=True)
+
+    # Queries, answered from the result in use
+
+    def distance(self, from_label: Any, to_label: Any) -> float:
+        """Return the shortest path weight between the vertices.
+
+        :raise AttributeError: if the vertices are not in the graph.
+        """
+        return self._result[0][self.get_row(from_label),
+                               self.get_row(to_label)]
+
+    def row(self, label: Any) -> list:
+        """Return the (label, weight) pairs of the vertices the vertex
+        reaches, in the order of the rows.
+
+        :raise AttributeError: if the vertex is not in the graph.
+        """
+        row = self._result[0][self.get_row(label)]
+        columns = np.flatnonzero(row != inf)
+        return list(zip(self._labels.labels_of(columns).tolist(),
+                        row[columns].tolist()))
+
+    def k_nearest(self, label: Any, k: int) -> list:
+        """Return the (label, weight) pairs of at most k other vertices the
+        vertex reaches closest, the closest first.
+
+        Selects them with a partition in O(V + k log k).
+        :raise AttributeError: if the vertex is not in the graph.
+        :raise ValueError: if k is negative.
+        """
+        if k < 0:
+            raise ValueError(f"k must not be negative, not {k}.")
+        source = self.get_row(label)
+        row = self._result[0][source]
+        columns = np.flatnonzero(row != inf)
+        columns = columns[columns != source]
+        if k < len(columns):
+            columns = columns[np.argpartition(row[columns], k)[:k]]
+        columns = columns[np.argsort(row[columns], kind="stable")]
+        return list(zip(self._labels.labels_of(columns).tolist(),
+                        row[columns].tolist()))
+
+    def path(self, from_label: Any, to_label: Any) -> Optional[list]:
+        """Return the labels on the shortest path between the vertices,
+        None if there is no path.
+
+        :raise AttributeError: if the vertices are not in the graph.
+        """
+        rows = walk_path(self._result[1], self.get_row(from_label),
+                         self.get_row(to_label))
+        if not rows:
+            return None
+        return self._labels.labels_of(rows).tolist()
+
+    def answer(self, request: dict) -> Any:
+        """Return the JSON result of a query (not of an update).
+
+        :raise AttributeError: if a vertex is not in the graph
+        :raise ValueError: if the request is malformed
+        """
+        op = request.get("op")
+        try:
+            if op == "dist":
+                return _weight(self.distance(request["u"], request["v"]))
+            if op == "row":
+                return self.row(request["u"])
+            if op == "k_nearest":
+                return self.k_nearest(request["u"], int(request["k"]))
+            if op == "path":
+                return {"dist": _weight(self.distance(request["u"],
+                                                      request["v"])),
+                        "path": self.path(request["u"], request["v"])}
+        except KeyError as error:
+            raise ValueError(f"The {op} request needs {error}.")
+        if op == "labels":
+            return self._labels.get_labels().tolist()
+        if op == "version":
+            return self._version
+        raise ValueError(f"Unknown op {op}.")
+
+    async def update(self, edges: list) -> int:
+        """Set the weights of the edges and find the new result in the
+        pool, the queries are answered from the old one meanwhile.
+
+        :param edges: (from label, to label, weight) lists, a None weight
+        removes the edge
+        :return: the version of the new result
+        :raise AttributeError: if a vertex is not in the graph
+        :raise ValueError: if an edge is malformed or a loop
+        :raise NegativeCycleError: if the edges make a negative cycle, the
+        result is then not changed
+        """
+        changes = []
+        for edge in edges:
+            if len(edge) != 3:
+                raise ValueError(f"An edge must be: from, to, weight, "
+                                 f"not {edge}.")
+            tail, head = self.get_row(edge[0]), self.get_row(edge[1])
+            if tail == head:
+                raise ValueError(f"An edge must not be a loop: {edge}.")
+            weight = inf if edge[2] is None else round(float(edge[2]),
+                                                       ROUND_POS)
+            changes.append((tail, head, weight))
+        async with self._updating:
+            weights = np.array(self._weights)
+            for tail, head, weight in changes:
+                weights[tail, head] = weight
+                if not self._directed:
+                    weights[head, tail] = weight
+            result = await self._solve(weights)
+            self._weights, self._result = weights, result
+            self._version += 1
+            return self._version
+
+    # Serving the connections
+
+    async def _answer_update(self, request: dict,
+                             writer: asyncio.StreamWriter):
+        """Write the response of the update once its result is in use."""
+        response = {"id": request["id"]} if "id" in request else {}
+        try:
+            response["result"] = await self.update(request.get("edges", []))
+        except (AttributeError, ValueError, TypeError) as error:
+            response["error"] = str(error)
+        if not writer.is_closing():
+            writer.write(json.dumps(response).encode() + b"\n")
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter):
+        """Answer the requests of a connection until it is closed."""
+        updates = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = {}
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("A request must be an object.")
+                    if "id" in request:
+                        response["id"] = request["id"]
+                    if request.get("op") == "update":
+                        task = asyncio.create_task(
+                            self._answer_update(request, writer))
+                        updates.add(task)
+                        task.add_done_callback(updates.discard)
+                        continue
+                    response["result"] = self.answer(request)
+                except (AttributeError, ValueError, TypeError) as error:
+                    response["error"] = str(error)
+                writer.write(json.dumps(response).encode() + b"\n")
+                if writer.transport.get_write_buffer_size() > WRITE_BUFFER:
+                    await writer.drain()
+            if updates:
+                await asyncio.gather(*updates)
+            await writer.drain()
+        except (ConnectionError, ValueError):
+            # closed by the client or a line over LINE_LIMIT
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(service: QueryService, host: str = DEFAULT_HOST,
+                port: int = DEFAULT_PORT, path: str = None):
+    """Find the first result of the service and serve it until cancelled.
+
+    :param service: the service to answer the queries
+    :param host: address to listen on
+    :param port: TCP port to listen on
+    :param path: Unix socket to listen on instead of the TCP port
+    :raise NegativeCycleError: if the graph has a negative cycle
+    """
+    await service.start()
+    if path is not None:
+        server = await asyncio.start_unix_server(service.handle, path,
+                                                 limit=LINE_LIMIT)
+    else:
+        server = await asyncio.start_server(service.handle, host, port,
+                                            limit=LINE_LIMIT)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: list = None):
+    """Serve the graph in the input file."""
+    parser = argparse.ArgumentParser(
+        description="Answer shortest path queries over a socket, a JSON "
+                    "object per line.")
+    parser.add_argument("input",
+                        help="weight matrix (.npy, .csv or whitespace "
+                             "separated text, inf for no connection) or edge "
+                             "list with --edges")
+    parser.add_argument("--edges", action="store_true",
+                        help="the input is an edge list of "
+                             "'from to weight' lines")
+    parser.add_argument("--directed", action="store_true",
+                        help="the edges of the edge list are directed")
+    parser.add_argument("--engine", default=DEFAULT_ENGINE, choices=ENGINES)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes finding the results of "
+                             "the updates")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="keep the results in this directory and reuse "
+                             "them for the same graph")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH",
+                        help="listen on this Unix socket instead")
+    args = parser.parse_args(argv)
+
+    weights, labels, directed = load_weights(args.input, args.edges,
+                                             args.directed)
+    cache = ResultCache(directory=args.cache) if args.cache else None
+
+    async def run():
+        service = QueryService(weights, labels, directed, args.engine,
+                               args.workers, cache)
+        task = asyncio.current_task()
+        # stop as on an interrupt, so that the processes of the pool are
+        # stopped too instead of outliving the server
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM,
+                                                      task.cancel)
+        try:
+            await serve(service, args.host, args.port, args.unix)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            service.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""All-pairs shortest path weights for sparse graphs.
+
+Runs Dijkstra with a binary heap from every vertex over a compact (CSR)
+export of the graph adjacency, O(V·E·log V) instead of Floyd's O(V³).
+Negative weights of directed graphs are handled by Johnson reweighting.
+"""
+import numpy as np
+from heapq import heappush, heappop
+from math import inf
+from graph import LinkedGraph
+from compactgraph import CompactGraph
+from engines import NO_HOP, NegativeCycleError
+from labelindex import LabelIndex
+
+# below this edges / vertices² ratio repeated Dijkstra beats Floyd
+DENSITY_THRESHOLD = 0.004
+
+
+def csr_adjacency(graph: LinkedGraph) -> (np.array, np.array, np.array,
+                                          LabelIndex):
+    """Export the adjacency of the graph in the CSR form.
+
+    The edges leaving the vertex of row i are at positions
+    indptr[i]:indptr[i + 1] of indices (the rows of the other vertices) and
+    weights. Undirected edges are exported in both directions.
+
+    :param graph: the graph to export
+    :return: a tuple of indptr, indices, weights and the label index of the
+    rows (in the order of graph.vertices(), like floyd uses)
+    """
+    if isinstance(graph, CompactGraph):
+        indptr, indices, weights = graph.csr()
+        return (indptr.copy(), indices.astype(np.int64),
+                weights.astype(np.float64), LabelIndex.from_graph(graph))
+
+    vertices = list(graph.vertices())
+    labels = LabelIndex(vertex.get_label() for vertex in vertices)
+    indptr = np.zeros(len(vertices) + 1, dtype=np.int64)
+    others = []
+    weights = []
+    for row, vertex in enumerate(vertices):
+        for edge in vertex.incident_edges():
+            others.append(edge.get_other_vertex(vertex).get_label())
+            weights.append(edge.get_weight())
+        indptr[row + 1] = len(others)
+    return (indptr, labels.rows_of(others),
+            np.array(weights, dtype=np.float64), labels)
+
+
+def dijkstra(indptr: list, indices: list, weights: list, source: int,
+             round_pos: int, hops: list = None) -> list:
+    """Find the shortest path weights from the source with Dijkstra.
+
+    The CSR arrays are given as lists, which Python indexes much faster.
+    All the weights must be non-negative.
+
+    :param indptr: CSR row pointers
+    :param indices: CSR column indices
+    :param weights: CSR edge weights
+    :param source: row of the source vertex
+    :param round_pos: number of positions to round every sum to
+    :param hops: list to fill with the successor of the source on the path to
+    every vertex if given
+    :return: the list of weights from the source to every vertex
+    """
+    distances = [inf] * (len(indptr) - 1)
+    distances[source] = 0
+    heap = [(0, source)]
+    while heap:
+        distance, vertex = heappop(heap)
+        if distance > distances[vertex]:
+            continue
+        for pos in range(indptr[vertex], indptr[vertex + 1]):
+            new_sum = round(distance + weights[pos], round_pos)
+            other = indices[pos]
+            if new_sum < distances[other]:
+                distances[other] = new_sum
+                heappush(heap, (new_sum, other))
+                if hops is not None:
+                    hops[other] = other if vertex == source else hops[vertex]
+    return distances
+
+
+def johnson_potentials(indptr: np.array, indices: np.array,
+                       weights: np.array, round_pos: int) -> np.array:
+    """Find the Johnson vertex potentials with Bellman-Ford.
+
+    The potentials are the shortest path weights from a virtual vertex
+    connected to every vertex by a zero edge, so that
+    weight + potential[from] - potential[to] is never negative.
+
+    :param indptr: CSR row pointers
+    :param indices: CSR column indices
+    :param weights: CSR edge weights
+    :param round_pos: number of positions to round every sum to
+    :return: the array of potentials
+    :raise NegativeCycleError: if the graph has a negative cycle (with no
+    rows on it)
+    """
+    vert_n = len(indptr) - 1
+    sources = np.repeat(np.arange(vert_n), np.diff(indptr))
+    potentials = np.zeros(vert_n, dtype=np.float64)
+    for _ in range(vert_n + 1):
+        new_sums = np.round(potentials[sources] + weights, round_pos)
+        relaxed = potentials.copy()
+        np.minimum.at(relaxed, indices, new_sums)
+        if np.array_equal(relaxed, potentials):
+            return potentials
+        potentials = relaxed
+    raise NegativeCycleError()
+
+
+def dijkstra_adjacency(graph: LinkedGraph,
+                       round_pos: int) -> (tuple, np.array, dict):
+    """Export the adjacency of the graph for repeated Dijkstra.
+
+    Negative weights of a directed graph are reweighted with the Johnson
+    potentials.
+
+    :param graph: the graph to export
+    :param round_pos: number of positions to round every sum to
+    :return: a tuple of the CSR lists (indptr, indices, weights) with no
+    negative weights, the potentials (None if no reweighting was needed)
+    and the label index of the rows
+    :raise NegativeCycleError: if the graph has a negative cycle (any
+    negative edge of an undirected graph is one)
+    """
+    indptr, indices, weights, labels = csr_adjacency(graph)
+    potentials = None
+    if len(weights) and weights.min() < 0:
+        if not graph.is_directed():
+            edge = int(weights.argmin())
+            row = int(np.searchsorted(indptr, edge, side="right")) - 1
+            raise NegativeCycleError([row, int(indices[edge])])
+        potentials = johnson_potentials(indptr, indices, weights, round_pos)
+        sources = np.repeat(np.arange(len(labels)), np.diff(indptr))
+        weights = np.round(weights + potentials[sources] -
+                           potentials[indices], round_pos)
+    adjacency = indptr.tolist(), indices.tolist(), weights.tolist()
+    return adjacency, potentials, labels
+
+
+def dijkstra_rows(adjacency: tuple, potentials: np.array, sources: list,
+                  round_pos: int, next_hop: np.array = None) -> np.array:
+    """Find the shortest path weights from the given rows with Dijkstra.
+
+    :param adjacency: the CSR lists made by dijkstra_adjacency
+    :param potentials: the potentials made by dijkstra_adjacency
+    :param sources: rows of the source vertices
+    :param round_pos: number of positions to round every sum to
+    :param next_hop: successor rows of the sources (see
+    engines.init_next_hop) to fill if given
+    :return: the rows of shortest path weights from the sources
+    """
+    vert_n = len(adjacency[0]) - 1
+    matrix = np.empty((len(sources), vert_n), dtype=np.float64)
+    for row, source in enumerate(sources):
+        hops = None
+        if next_hop is not None:
+            hops = [NO_HOP] * vert_n
+            hops[source] = source
+        matrix[row] = dijkstra(*adjacency, source, round_pos, hops)
+        if next_hop is not None:
+            next_hop[row] = hops
+
+    # undo the reweighting
+    if potentials is not None:
+        matrix -= potentials[sources, np.newaxis]
+        matrix += potentials[np.newaxis, :]
+        np.round(matrix, round_pos, out=matrix)
+    return matrix
+
+
+def all_pairs_sparse(graph: LinkedGraph, round_pos: int,
+                     next_hop: np.array = None) -> (np.array, dict):
+    """Find all shortest path weights in the graph with repeated Dijkstra.
+
+    :param graph: the graph to find the weights in
+    :param round_pos: number of positions to round every sum to
+    :param next_hop: successor matrix (see engines.init_next_hop) to fill if
+    given
+    :return: a tuple of the matrix of shortest path weights and the label
+    index of its rows
+    :raise NegativeCycleError: if the graph has a negative cycle (any
+    negative edge of an undirected graph is one)
+    """
+    adjacency, potentials, labels = dijkstra_adjacency(graph, round_pos)
+    matrix = dijkstra_rows(adjacency, potentials, list(range(len(labels))),
+                           round_pos, next_hop)
+    return matrix, labels
+
+
+def sparse_enough(vert_n: int, edge_n: int) -> bool:
+    """Return True if a graph with so many vertices and edges is sparse
+    enough for repeated Dijkstra to beat Floyd."""
+    return bool(vert_n) and edge_n / vert_n ** 2 < DENSITY_THRESHOLD
+
+
+def prefers_sparse(graph: LinkedGraph) -> bool:
+    """Return True if repeated Dijkstra should be faster than Floyd.
+
+    That is if the graph is sparse enough and repeated Dijkstra can handle
+    it (an undirected graph has no negative edges).
+    """
+    if not sparse_enough(graph.size_vertices(), graph.size_edges()):
+        return False
+    if graph.is_directed():
+        return True
+    return all(edge.get_weight() >= 0 for edge in graph.edges())
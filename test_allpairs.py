@@ -0,0 +1,69 @@
+"""Tests of the all-pairs results kept up to date with their graphs."""
+import random as rd
+import numpy as np
+import pytest
+from graph import LinkedGraph, LinkedDirectedGraph
+from floyd import all_pairs
+
+# weights of the random edges, zeros and sums which are not exact in binary
+WEIGHTS = (0, 0, 0.1, 0.2, 0.3, 0.7, 1.5, 2)
+# negative weights of the random edges of the directed graphs
+NEGATIVE_WEIGHTS = (-0.1, -0.3)
+
+
+def random_graph(generator: rd.Random, directed: bool) -> LinkedGraph:
+    """Return a random sparse graph of a few vertices."""
+    graph = LinkedDirectedGraph() if directed else LinkedGraph()
+    vert_n = generator.randrange(2, 10)
+    for label in range(vert_n):
+        graph.add_vertex(label)
+    for _ in range(vert_n * 2):
+        from_label, to_label = generator.sample(range(vert_n), 2)
+        if not graph.contains_edge(from_label, to_label):
+            graph.add_edge(from_label, to_label, generator.choice(WEIGHTS))
+    return graph
+
+
+def random_update(result, graph: LinkedGraph, generator: rd.Random,
+                  directed: bool):
+    """Add, reweight or remove a random edge through the result."""
+    from_label, to_label = generator.sample(range(len(graph)), 2)
+    weights = WEIGHTS + NEGATIVE_WEIGHTS if directed else WEIGHTS
+    weight = generator.choice(weights)
+    try:
+        if not graph.contains_edge(from_label, to_label):
+            result.add_edge(from_label, to_label, weight)
+        elif generator.random() < 0.3:
+            result.remove_edge(from_label, to_label)
+        else:
+            result.set_weight(from_label, to_label, weight)
+    except ValueError:
+        # the edge would make a negative cycle, nothing changed
+        pass
+
+
+@pytest.mark.parametrize("directed", (True, False))
+@pytest.mark.parametrize("seed", range(100))
+def test_dynamic_matches_full_run(seed, directed):
+    generator = rd.Random(seed)
+    graph = random_graph(generator, directed)
+    result = all_pairs(graph, "vectorized", dynamic=True)
+    for update in range(60):
+        random_update(result, graph, generator, directed)
+        # read rows now and then, so that the stale rows are recomputed
+        # between the updates as well as all at once
+        if update % 3:
+            result.distance(generator.randrange(len(graph)), 0)
+            continue
+        expected = all_pairs(graph, "vectorized")
+        assert np.array_equal(result.get_matrix(), expected.get_matrix())
+        for from_label in range(len(graph)):
+            for to_label in range(len(graph)):
+                path = result.path(from_label, to_label)
+                if path is None:
+                    assert result.distance(from_label, to_label) == np.inf
+                    continue
+                weight = sum(graph.get_edge(tail, head).get_weight()
+                             for tail, head in zip(path, path[1:]))
+                assert round(weight, 6) == result.distance(from_label,
+                                                           to_label)
@@ -0,0 +1,39 @@
+"""Tests of the files of the result cache."""
+import os
+import numpy as np
+from cache import ResultCache
+
+# size of the files of an entry of the tests, in bytes (with the headers)
+ENTRY_BYTES = 2 * (4 * 4 * 8 + 128)
+
+
+def put_result(cache: ResultCache, key: str):
+    """Cache a 4x4 result with its successor matrix."""
+    cache.put(key, np.zeros((4, 4)), np.zeros((4, 4), dtype=np.int64))
+
+
+def test_trim_removes_whole_entries(tmp_path):
+    cache = ResultCache(directory=str(tmp_path),
+                        disk_bytes=3 * ENTRY_BYTES)
+    # the successor matrix of a was used after its weights
+    for key, last_uses in (("a", (1, 5)), ("b", (2, 2)), ("c", (3, 3))):
+        put_result(cache, key)
+        for suffix, last_use in zip((".npy", ".next.npy"), last_uses):
+            os.utime(tmp_path / f"{key}{suffix}", (last_use, last_use))
+    put_result(cache, "d")
+    assert sorted(path.name for path in tmp_path.iterdir()) == \
+        ["a.next.npy", "a.npy", "c.next.npy", "c.npy", "d.next.npy",
+         "d.npy"]
+
+
+def test_memory_hit_refreshes_files(tmp_path):
+    cache = ResultCache(directory=str(tmp_path),
+                        disk_bytes=2 * ENTRY_BYTES)
+    put_result(cache, "a")
+    put_result(cache, "b")
+    for path in tmp_path.iterdir():
+        os.utime(path, (0, 0))
+    assert cache.get("a", next_hop=True) is not None
+    put_result(cache, "c")
+    assert sorted(path.name for path in tmp_path.iterdir()) == \
+        ["a.next.npy", "a.npy", "c.next.npy", "c.npy"]
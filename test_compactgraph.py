@@ -0,0 +1,24 @@
+"""Tests of the conversions between the linked and the compact graphs."""
+import pytest
+from graph import LinkedGraph, LinkedDirectedGraph
+from compactgraph import CompactGraph
+
+
+@pytest.mark.parametrize("graph_type", (LinkedGraph, LinkedDirectedGraph))
+def test_round_trip_keeps_weight_types(graph_type):
+    graph = graph_type()
+    for label in "abcd":
+        graph.add_vertex(label)
+    edges = [("a", "b", 1), ("b", "c", -2), ("c", "c", 3), ("d", "a", 0)]
+    for edge in edges:
+        graph.add_edge(*edge)
+    compact = CompactGraph.from_linked(graph)
+    assert compact.csr()[2].dtype.kind == "i"
+    result = compact.to_linked()
+    for from_label, to_label, weight in edges:
+        result_weight = result.get_edge(from_label, to_label).get_weight()
+        assert result_weight == weight and type(result_weight) is int
+
+    compact.get_edge("a", "b").set_weight(1.5)
+    assert compact.get_edge("a", "b").get_weight() == 1.5
+    assert compact.get_edge("b", "c").get_weight() == -2
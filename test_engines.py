@@ -0,0 +1,201 @@
+"""Tests of the Floyd-Warshall engines against brute force on small graphs."""
+import numpy as np
+import pytest
+from engines import (NegativeCycleError, floyd_reference, floyd_vectorized,
+                     floyd_blocked, floyd_parallel, floyd_out_of_core,
+                     floyd_batched, stack_matrices, init_next_hop,
+                     walk_path)
+from floyd import ROUND_POS
+
+inf = np.inf
+
+# engines by name, every one called as (matrix, next_hop, mark_negative)
+MARKING_ENGINES = {
+    "reference": lambda matrix, hops, marks: floyd_reference(
+        matrix, ROUND_POS, hops, mark_negative=marks),
+    "vectorized": lambda matrix, hops, marks: floyd_vectorized(
+        matrix, ROUND_POS, hops, mark_negative=marks),
+    "blocked": lambda matrix, hops, marks: floyd_blocked(
+        matrix, ROUND_POS, hops, mark_negative=marks),
+    "blocked_tiles": lambda matrix, hops, marks: floyd_blocked(
+        matrix, ROUND_POS, hops, tile=2, mark_negative=marks),
+    "parallel": lambda matrix, hops, marks: floyd_parallel(
+        matrix, ROUND_POS, hops, workers=2, tile=2, mark_negative=marks),
+}
+ENGINES = {
+    **MARKING_ENGINES,
+    "out_of_core": lambda matrix, hops, marks: floyd_out_of_core(
+        matrix, ROUND_POS, hops, budget=1),
+}
+# graphs of up to 40 vertices span two tiles of the out-of-core engine
+SEEDS = range(40)
+
+
+def random_weights(seed: int) -> np.array:
+    """Return a random sparse weight matrix with some negative weights."""
+    generator = np.random.default_rng(seed)
+    vert_n = int(generator.integers(2, 9 if seed % 8 else 40))
+    matrix = np.full((vert_n, vert_n), inf)
+    edges = generator.random((vert_n, vert_n)) < 2.5 / vert_n
+    matrix[edges] = generator.integers(-4, 10, size=edges.sum())
+    np.fill_diagonal(matrix, 0)
+    return matrix
+
+
+def zero_weights(seed: int) -> np.array:
+    """Return a random weight matrix with many zero weights and zero weight
+    cycles, but no negative cycle."""
+    generator = np.random.default_rng(seed)
+    vert_n = int(generator.integers(3, 12 if seed % 4 else 45))
+    matrix = np.full((vert_n, vert_n), inf)
+    edges = generator.random((vert_n, vert_n)) < 4 / vert_n
+    matrix[edges] = generator.choice([0, 0, 0, 0.5, 1.25, 2],
+                                     size=edges.sum())
+    np.fill_diagonal(matrix, 0)
+    return matrix
+
+
+def min_plus_closure(matrix: np.array) -> np.array:
+    """Return the least weights of the walks of up to len(matrix) edges."""
+    closure = matrix.copy()
+    for _ in range(len(matrix)):
+        walks = (closure[:, :, np.newaxis] + matrix[np.newaxis, :, :]).min(
+            axis=1)
+        np.minimum(closure, walks, out=closure)
+    return closure
+
+
+def brute_force(matrix: np.array) -> (np.array, np.array):
+    """Return the matrix of the pairs with a path through a negative cycle
+    and the weights of the shortest walks of the other pairs."""
+    edges = matrix.copy()
+    np.fill_diagonal(edges, inf)
+    # a vertex on a negative cycle closes a negative walk of at most V edges
+    on_cycle = min_plus_closure(edges).diagonal() < 0
+    reaches = min_plus_closure(matrix) != inf
+    unbounded = (reaches[:, on_cycle, np.newaxis] &
+                 reaches[np.newaxis, on_cycle, :]).any(axis=1)
+    return unbounded, min_plus_closure(matrix)
+
+
+def assert_negative_cycle(matrix: np.array, cycle: list):
+    """Check that the rows are a simple cycle of negative weight."""
+    weights = [matrix[tail, head]
+               for tail, head in zip(cycle, cycle[1:] + cycle[:1])]
+    assert len(cycle) > 1 and len(set(cycle)) == len(cycle)
+    assert inf not in weights and sum(weights) < 0
+
+
+def run(engine: str, matrix: np.array, hops: np.array = None,
+        marks: bool = False) -> np.array:
+    """Run the engine by name on a copy of the matrix."""
+    with np.errstate(invalid="ignore", over="ignore"):
+        return ENGINES[engine](matrix.copy(), hops, marks)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_detection(engine, seed):
+    matrix = random_weights(seed)
+    unbounded, weights = brute_force(matrix)
+    if unbounded.any():
+        with pytest.raises(NegativeCycleError):
+            run(engine, matrix)
+    else:
+        assert np.array_equal(run(engine, matrix), weights)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_reported_cycle(engine, seed):
+    matrix = random_weights(seed)
+    if not brute_force(matrix)[0].any():
+        return
+    with pytest.raises(NegativeCycleError) as error:
+        run(engine, matrix, init_next_hop(matrix))
+    assert_negative_cycle(matrix, error.value.cycle)
+
+
+@pytest.mark.parametrize("engine", MARKING_ENGINES)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_marked_pairs(engine, seed):
+    matrix = random_weights(seed)
+    unbounded, weights = brute_force(matrix)
+    result = run(engine, matrix, marks=True)
+    assert np.array_equal(result == -inf, unbounded)
+    assert np.array_equal(result[~unbounded], weights[~unbounded])
+
+
+@pytest.mark.parametrize("engine", MARKING_ENGINES)
+def test_marked_pairs_spread_past_the_step(engine):
+    # the cycle 1-2 is found at step 2, before 4 and 0 lead from 3 to it
+    matrix = np.array([[0, 7, inf, inf, inf],
+                       [inf, 0, -2, inf, 7],
+                       [inf, -1, 0, inf, 0],
+                       [inf, inf, inf, 0, 2],
+                       [3, inf, -3, inf, 0]])
+    result = run(engine, matrix, marks=True)
+    assert np.array_equal(result == -inf, brute_force(matrix)[0])
+    assert result[3, 0] == -inf
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_paths_match_weights(engine, seed):
+    matrix = zero_weights(seed)
+    next_hop = init_next_hop(matrix)
+    result = run(engine, matrix, next_hop)
+    for source in range(len(matrix)):
+        for destination in range(len(matrix)):
+            path = walk_path(next_hop, source, destination)
+            if result[source, destination] == inf:
+                assert path == []
+                continue
+            weight = sum(matrix[tail, head]
+                         for tail, head in zip(path, path[1:]))
+            assert round(weight, ROUND_POS) == result[source, destination]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_successors_match_vectorized(engine, seed):
+    matrix = zero_weights(seed)
+    expected, next_hop = init_next_hop(matrix), init_next_hop(matrix)
+    run("vectorized", matrix, expected)
+    run(engine, matrix, next_hop)
+    assert np.array_equal(next_hop, expected)
+
+
+def test_paths_around_a_zero_weight_cycle():
+    matrix = np.array([[0, 0, inf, inf],
+                       [inf, 0, 0, 0],
+                       [inf, 0, 0, inf],
+                       [1, 2, 3, 0]])
+    next_hop = init_next_hop(matrix)
+    floyd_blocked(matrix.copy(), ROUND_POS, next_hop, tile=2)
+    assert walk_path(next_hop, 2, 0) == [2, 1, 3, 0]
+
+
+@pytest.mark.parametrize("chunk", (None, 1))
+@pytest.mark.parametrize("seed", SEEDS)
+def test_batched_detection(seed, chunk):
+    matrices = [random_weights(seed), random_weights(seed + len(SEEDS))]
+    unbounded = [brute_force(matrix)[0].any() for matrix in matrices]
+    batch = stack_matrices(matrices)[0]
+    if not any(unbounded):
+        floyd_batched(batch, ROUND_POS, chunk)
+        for graph, matrix in enumerate(matrices):
+            size = len(matrix)
+            assert np.array_equal(batch[graph, :size, :size],
+                                  brute_force(matrix)[1])
+        return
+    with pytest.raises(NegativeCycleError) as error:
+        floyd_batched(batch, ROUND_POS, chunk)
+    assert unbounded[error.value.graph]
+    assert_negative_cycle(matrices[error.value.graph], error.value.cycle)
+
+
+def test_integer_matrix_never_marked():
+    matrix = np.array([[0, 1], [-2, 0]], dtype=np.int32)
+    with pytest.raises(NegativeCycleError):
+        floyd_vectorized(matrix, ROUND_POS, mark_negative=True)
@@ -0,0 +1,56 @@
+"""Tests of the batch runs of floyd.py."""
+import numpy as np
+import pytest
+from cache import ResultCache
+from engines import NegativeCycleError
+from floyd import batch, floyd, initialize_graph
+from labelindex import LabelIndex
+
+inf = np.inf
+# budget of the out-of-core runs, in bytes
+BUDGET = 1024 * 1024
+
+
+def test_batch_text_output_with_budget(tmp_path):
+    np.save(tmp_path / "weights.npy", np.array([[0, 2, inf],
+                                                [inf, 0, 3],
+                                                [1, inf, 0]]))
+    batch(str(tmp_path / "weights.npy"), str(tmp_path / "distances.csv"),
+          budget=BUDGET)
+    assert sorted(path.name for path in tmp_path.iterdir()) == \
+        ["distances.csv", "weights.npy"]
+    assert np.array_equal(np.loadtxt(tmp_path / "distances.csv",
+                                     delimiter=","),
+                          [[0, 2, 5], [4, 0, 3], [1, 3, 0]])
+
+
+def test_batch_removes_temporary_file_on_error(tmp_path):
+    np.save(tmp_path / "weights.npy", np.array([[0, 2, inf],
+                                                [inf, 0, -3],
+                                                [-1, inf, 0]]))
+    with pytest.raises(NegativeCycleError):
+        batch(str(tmp_path / "weights.npy"), str(tmp_path / "distances.csv"),
+              budget=BUDGET)
+    assert [path.name for path in tmp_path.iterdir()] == ["weights.npy"]
+
+
+def test_cache_hit_fills_backing_file(tmp_path):
+    matrix = np.array([[inf, 2, inf], [inf, inf, 3], [1, inf, inf]])
+    graph = initialize_graph(matrix, LabelIndex(range(3)), True)
+    cache = ResultCache()
+    expected = floyd(graph, cache=cache)
+    result = floyd(graph, backing_file=str(tmp_path / "result.npy"),
+                   cache=cache)
+    assert cache.get_hits() == 1
+    assert np.array_equal(np.load(tmp_path / "result.npy"), expected)
+    assert np.array_equal(result, expected)
+    with pytest.raises(ValueError):
+        floyd(graph, engine="unknown", cache=cache)
+
+
+def test_batch_refuses_workers_with_budget(tmp_path):
+    np.save(tmp_path / "weights.npy", np.array([[0, 2], [inf, 0]]))
+    with pytest.raises(ValueError):
+        batch(str(tmp_path / "weights.npy"), str(tmp_path / "distances.csv"),
+              workers=2, budget=BUDGET)
+    assert [path.name for path in tmp_path.iterdir()] == ["weights.npy"]
@@ -0,0 +1,46 @@
+"""Tests of the memory of the linked graphs."""
+import tracemalloc
+import numpy as np
+from typing import Callable, Any
+from graph import LinkedDirectedGraph
+
+# bytes a vertex and an edge of a linked directed graph of 1M edges took
+# before the slots and the edge views
+BASELINE_VERTEX_BYTES = 290
+BASELINE_EDGE_BYTES = 149
+
+
+def traced_call(func: Callable, *args) -> (Any, int):
+    """Return the result of func(*args) and the bytes it left allocated."""
+    tracemalloc.start()
+    result = func(*args)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, allocated
+
+
+def linked_graph(vert_n: int, edges: list) -> LinkedDirectedGraph:
+    """Build a directed graph with vert_n vertices and the (from, to,
+    weight) edges."""
+    graph = LinkedDirectedGraph()
+    for label in range(vert_n):
+        graph.add_vertex(label)
+    for from_label, to_label, weight in edges:
+        graph.add_edge(from_label, to_label, weight)
+    return graph
+
+
+def test_linked_graph_memory():
+    vert_n = 2000
+    generator = np.random.default_rng(0)
+    connected = generator.random((vert_n, vert_n)) < 0.25
+    np.fill_diagonal(connected, False)
+    rows, columns = np.nonzero(connected)
+    # the same weight object everywhere, so that the weights are not counted
+    edges = list(zip(rows.tolist(), columns.tolist(), [1.5] * len(rows)))
+    vertices_bytes = traced_call(linked_graph, vert_n, [])[1]
+    graph, graph_bytes = traced_call(linked_graph, vert_n, edges)
+    assert graph.size_edges() == len(edges) > 990000
+    assert vertices_bytes / vert_n <= BASELINE_VERTEX_BYTES / 2
+    assert (graph_bytes - vertices_bytes) / len(edges) <= \
+        BASELINE_EDGE_BYTES / 2